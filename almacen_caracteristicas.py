@@ -0,0 +1,130 @@
+"""
+Almacén de características para el modelo de inmuebles
+Construye una sola vez la matriz codificada que comparten entrenamiento, clustering, similitud e inferencia
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Any
+
+
+def codificar_caracteristicas(datos: pd.DataFrame, columnas: List[str],
+                              label_encoders: Dict[str, Any] = None) -> np.ndarray:
+    """
+    Construye la matriz de características (sin escalar) en el orden indicado,
+    como float32 contiguo
+
+    Las columnas '_encoded' ausentes en los datos se calculan con los
+    label_encoders; las categorías no vistas y los valores faltantes quedan en
+    -1. Los numéricos faltantes quedan como NaN (ver imputar_medias).
+    """
+    label_encoders = label_encoders or {}
+    X = np.empty((len(datos), len(columnas)), dtype=np.float32)
+
+    for j, col in enumerate(columnas):
+        base = col[:-len('_encoded')] if col.endswith('_encoded') else None
+        if base in label_encoders and col not in datos.columns:
+            if base in datos.columns:
+                clases = pd.Index(label_encoders[base].classes_)
+                codigos = clases.get_indexer(datos[base].astype(str))
+                codigos[datos[base].isna().to_numpy()] = -1
+                X[:, j] = codigos
+            else:
+                X[:, j] = -1
+        elif col in datos.columns:
+            X[:, j] = pd.to_numeric(datos[col], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            X[:, j] = np.nan
+
+    return X
+
+
+def imputar_medias(X: np.ndarray, medias: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Reemplaza en sitio los NaN de cada columna por su media (o por 0 sin medias)
+    """
+    filas, columnas = np.nonzero(np.isnan(X))
+    if len(filas):
+        X[filas, columnas] = medias[columnas] if medias is not None else 0.0
+    return X
+
+
+class AlmacenCaracteristicas:
+    """
+    Matriz de características codificada, compartida por todos los modelos
+
+    Convierte el DataFrame preprocesado a NumPy una sola vez: una matriz
+    float32 contigua con las columnas numéricas y '_encoded'. Cada modelo la
+    escala con su propio scaler y la matriz escalada se guarda por nombre,
+    de modo que la similitud y el clustering reutilizan la misma sin volver a
+    recorrer el DataFrame.
+    """
+
+    def __init__(self, df: pd.DataFrame, columnas: List[str]):
+        self.df = df
+        self.columnas = list(columnas)
+        self.n_filas = len(df)
+        self.matriz = codificar_caracteristicas(df, self.columnas)
+        self._posicion = {col: j for j, col in enumerate(self.columnas)}
+        self._escaladas = {}
+
+    def vigente(self, df: pd.DataFrame, columnas: List[str]) -> bool:
+        """
+        Indica si el almacén corresponde a este DataFrame y columnas
+        """
+        return df is self.df and len(df) == self.n_filas and list(columnas) == self.columnas
+
+    def seleccionar(self, columnas: List[str], filas: np.ndarray = None) -> np.ndarray:
+        """
+        Retorna la submatriz sin escalar de las columnas (y filas) indicadas
+
+        Con todas las columnas en el orden del almacén y sin filas no se copia.
+        """
+        X = self.matriz
+        if list(columnas) != self.columnas:
+            faltantes = [col for col in columnas if col not in self._posicion]
+            if faltantes:
+                raise ValueError(f"El almacén no contiene las características: {faltantes}")
+            X = X[:, [self._posicion[col] for col in columnas]]
+        if filas is not None:
+            X = X[filas]
+        return X
+
+    def escalar(self, nombre: str, scaler: Any, columnas: List[str], ajustar: bool = False) -> np.ndarray:
+        """
+        Escala la matriz con el scaler de un modelo y la guarda con su nombre
+
+        Args:
+            nombre: Clave de la matriz escalada (ej. 'clustering')
+            scaler: Scaler del modelo
+            columnas: Columnas de entrada del scaler, en su orden
+            ajustar: Si es True el scaler se ajusta sobre la matriz
+        """
+        X = self.seleccionar(columnas)
+        X_scaled = scaler.fit_transform(X) if ajustar else scaler.transform(X)
+        X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        self._escaladas[nombre] = (scaler, X_scaled)
+        return X_scaled
+
+    def escalada(self, nombre: str, scaler: Any = None) -> Optional[np.ndarray]:
+        """
+        Retorna la matriz escalada guardada, o None si no existe o se escaló
+        con otro scaler
+        """
+        guardada = self._escaladas.get(nombre)
+        if guardada is None or (scaler is not None and guardada[0] is not scaler):
+            return None
+        return guardada[1]
+
+    def descartar(self, nombre: str):
+        """
+        Libera la matriz escalada guardada con ese nombre (si existe)
+        """
+        self._escaladas.pop(nombre, None)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memoria ocupada por la matriz codificada y las escaladas
+        """
+        return self.matriz.nbytes + sum(X.nbytes for _, X in self._escaladas.values())
@@ -7,6 +7,7 @@ Requiere: pip install flask flask-cors
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from modelo_inmuebles import ModeloInmuebles
+from coalescedor import Coalescedor
 import pandas as pd
 import os
 
@@ -15,14 +16,22 @@ CORS(app)  # Permitir CORS para desarrollo
 
 # Inicializar modelo global
 modelo = None
+coalescedor = None
 
 
 def inicializar_modelo():
     """
     Inicializa el modelo al arrancar la aplicación
     """
-    global modelo
-    modelo = ModeloInmuebles()
+    global modelo, coalescedor
+    # BUSQUEDA_HILOS > 1 activa el filtrado paralelo por particiones
+    # SIMILITUD_APROXIMADA=1 usa el índice IVF aproximado en /similares
+    # CLASIFICADOR_BACKEND elige el clasificador al entrenar (un modelo
+    # guardado conserva el backend con el que se entrenó)
+    modelo = ModeloInmuebles(n_hilos_busqueda=int(os.environ.get('BUSQUEDA_HILOS', 1)),
+                             similitud_aproximada=os.environ.get('SIMILITUD_APROXIMADA') == '1',
+                             n_sondas=int(os.environ.get('SIMILITUD_SONDAS', 1)),
+                             backend_clasificacion=os.environ.get('CLASIFICADOR_BACKEND', 'random_forest'))
     
     # Verificar si existe dataset
     if not os.path.exists('dataset_inmuebles.csv'):
@@ -33,6 +42,7 @@ def inicializar_modelo():
     # Cargar dataset
     modelo.cargar_dataset('dataset_inmuebles.csv')
     modelo.preprocesar_datos()
+    modelo.construir_indice_rango()
     
     # Cargar o entrenar modelo
     if os.path.exists('modelo_inmuebles.pkl'):
@@ -45,6 +55,12 @@ def inicializar_modelo():
         modelo.entrenar_clustering(n_clusters=5)
         modelo.guardar_modelo('modelo_inmuebles.pkl')
     
+    # Las predicciones concurrentes se agrupan en lotes de hasta
+    # PREDECIR_LOTE_MAX filas o PREDECIR_ESPERA_MS milisegundos de espera
+    coalescedor = Coalescedor(modelo.predecir,
+                              espera_max_ms=float(os.environ.get('PREDECIR_ESPERA_MS', 5)),
+                              lote_max=int(os.environ.get('PREDECIR_LOTE_MAX', 256)))
+    
     print("✓ Modelo listo para recibir peticiones")
 
 
@@ -60,9 +76,15 @@ def home():
             '/': 'Información de la API',
             '/estadisticas': 'Estadísticas del dataset',
             '/buscar': 'Buscar inmuebles (POST)',
+            '/buscar-lote': 'Varias búsquedas en una sola pasada (POST)',
+            '/skyline': 'Inmuebles que ningún otro supera en todas las dimensiones (POST)',
+            '/predecir': 'Categoría y cluster de inmuebles nuevos (POST)',
+            '/what-if': 'Categoría de un inmueble bajo una grilla de cambios (POST)',
+            '/metricas-predecir': 'Métricas de los lotes de predicción',
             '/similares/<id>': 'Inmuebles similares',
             '/tipos': 'Tipos de inmuebles disponibles',
-            '/ubicaciones': 'Ubicaciones disponibles'
+            '/ubicaciones': 'Ubicaciones disponibles',
+            '/histogramas': 'Histogramas numéricos bajo criterios (GET/POST)'
         }
     })
 
@@ -97,11 +119,10 @@ def tipos():
     GET /tipos
     """
     try:
-        tipos_disponibles = modelo.df['tipo'].unique().tolist()
-        conteo = modelo.df['tipo'].value_counts().to_dict()
+        conteo = modelo.calcular_facetas(['tipo'])['tipo']
         
         return jsonify({
-            'tipos': tipos_disponibles,
+            'tipos': list(conteo),
             'conteo': conteo
         })
     except Exception as e:
@@ -115,12 +136,11 @@ def ubicaciones():
     GET /ubicaciones
     """
     try:
-        ubicaciones_disponibles = modelo.df['ubicacion'].unique().tolist()
-        conteo = modelo.df['ubicacion'].value_counts().to_dict()
-        precio_promedio = modelo.df.groupby('ubicacion')['precio'].mean().to_dict()
+        conteo = modelo.calcular_facetas(['ubicacion'])['ubicacion']
+        precio_promedio = modelo.promedios_faceta('ubicacion', 'precio')
         
         return jsonify({
-            'ubicaciones': ubicaciones_disponibles,
+            'ubicaciones': list(conteo),
             'conteo': conteo,
             'precio_promedio': precio_promedio
         })
@@ -142,6 +162,21 @@ def buscar():
         "ubicacion": "Centro",
         "tiene_jardin": true
     }
+    
+    También acepta expresiones combinadas con "o", "y" y "no":
+    {
+        "o": [
+            {"tipo": "Casa", "ubicacion": "Norte"},
+            {"tipo": "Apartamento", "ubicacion": "Centro"}
+        ],
+        "precio": {"entre": [100000, 300000]}
+    }
+    
+    Parámetros de consulta opcionales:
+        ordenar_por: columna de orden (ej. ?ordenar_por=precio)
+        ascendente: true/false (default: true)
+        limite: máximo de resultados retornados (default: 100)
+        facetas: columnas a contar sobre todo el resultado (ej. ?facetas=tipo,ubicacion)
     """
     try:
         criterios = request.get_json()
@@ -149,28 +184,222 @@ def buscar():
         if not criterios:
             return jsonify({'error': 'No se proporcionaron criterios de búsqueda'}), 400
         
-        # Realizar búsqueda
-        resultado = modelo.categorizar_inmuebles(criterios)
+        ordenar_por = request.args.get('ordenar_por')
+        ascendente = request.args.get('ascendente', default='true').lower() != 'false'
+        limite = request.args.get('limite', default=100, type=int)
+        columnas_facetas = [col for col in request.args.get('facetas', default='').split(',') if col]
+        
+        # Realizar búsqueda; solo se materializan los resultados retornados
+        posiciones = modelo.filtrar_posiciones(criterios)
+        resultado = modelo.materializar(posiciones, ordenar_por=ordenar_por,
+                                        ascendente=ascendente, limite=limite)
+        
+        respuesta = {
+            'total_encontrados': len(posiciones),
+            'total_retornados': len(resultado),
+            'criterios': criterios,
+            'resultados': resultado.to_dict('records')
+        }
+        if columnas_facetas:
+            respuesta['facetas'] = modelo.calcular_facetas(columnas_facetas, posiciones)
+        
+        return jsonify(respuesta)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/buscar-lote', methods=['POST'])
+def buscar_lote():
+    """
+    Ejecuta muchas búsquedas en una sola pasada por el dataset
+    POST /buscar-lote
+    Body (JSON):
+    {
+        "busquedas": [
+            {"tipo": "Casa", "precio_max": 300000},
+            {"ubicacion": "Norte", "habitaciones_min": 3}
+        ],
+        "solo_conteo": false
+    }
+    
+    Parámetros de consulta opcionales:
+        limite: máximo de resultados retornados por búsqueda (default: 100)
+    """
+    try:
+        datos = request.get_json()
+        
+        if not datos or not datos.get('busquedas'):
+            return jsonify({'error': 'No se proporcionaron búsquedas'}), 400
+        
+        busquedas = datos['busquedas']
+        limite = request.args.get('limite', default=100, type=int)
         
-        # Convertir resultado a formato JSON
-        if len(resultado) > 0:
-            # Limitar a 100 resultados
-            resultado_limitado = resultado.head(100)
-            
+        if datos.get('solo_conteo', False):
+            conteos = modelo.categorizar_lote(busquedas, solo_conteo=True)
             return jsonify({
-                'total_encontrados': len(resultado),
-                'total_retornados': len(resultado_limitado),
-                'criterios': criterios,
-                'resultados': resultado_limitado.to_dict('records')
+                'total_busquedas': len(busquedas),
+                'conteos': conteos
             })
-        else:
-            return jsonify({
-                'total_encontrados': 0,
-                'total_retornados': 0,
-                'criterios': criterios,
-                'resultados': []
+        
+        lote = modelo.filtrar_posiciones_lote(busquedas)
+        resultados = []
+        for posiciones in lote:
+            resultado = modelo.materializar(posiciones, limite=limite)
+            resultados.append({
+                'total_encontrados': len(posiciones),
+                'total_retornados': len(resultado),
+                'resultados': resultado.to_dict('records')
             })
+        
+        return jsonify({
+            'total_busquedas': len(busquedas),
+            'busquedas': resultados
+        })
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/skyline', methods=['POST'])
+def skyline():
+    """
+    Inmuebles del skyline: ningún otro es igual o mejor en todas las
+    dimensiones y mejor en alguna
+    POST /skyline
+    Body (JSON, opcional):
+    {
+        "dimensiones": {"precio": "min", "area_m2": "max", "score_amenidades": "max"},
+        "criterios": {"tipo": "Casa", "precio_max": 400000}
+    }
+    
+    Sin dimensiones se usa precio mínimo, área máxima, antigüedad mínima y
+    más amenidades.
+    
+    Parámetros de consulta opcionales:
+        ordenar_por: columna de orden (ej. ?ordenar_por=precio)
+        ascendente: true/false (default: true)
+        limite: máximo de resultados retornados (default: 100)
+    """
+    try:
+        datos = request.get_json(silent=True) or {}
+        dimensiones = datos.get('dimensiones')
+        criterios = datos.get('criterios')
+        
+        ordenar_por = request.args.get('ordenar_por')
+        ascendente = request.args.get('ascendente', default='true').lower() != 'false'
+        limite = request.args.get('limite', default=100, type=int)
+        
+        # Solo se materializan los inmuebles retornados
+        posiciones = modelo.posiciones_skyline(dimensiones, criterios)
+        resultado = modelo.materializar_skyline(posiciones, dimensiones, ordenar_por=ordenar_por,
+                                                ascendente=ascendente, limite=limite)
+        
+        return jsonify({
+            'total_encontrados': len(posiciones),
+            'total_retornados': len(resultado),
+            'dimensiones': dimensiones,
+            'criterios': criterios,
+            'resultados': resultado.to_dict('records')
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/predecir', methods=['POST'])
+def predecir():
+    """
+    Predice categoría de precio, probabilidades y cluster de inmuebles nuevos
+    POST /predecir
+    Body (JSON): un inmueble o una lista de inmuebles con las columnas del dataset
+    {
+        "tipo": "Casa",
+        "ubicacion": "Norte",
+        "habitaciones": 3,
+        "banos": 2,
+        "area_m2": 150,
+        ...
+    }
+    
+    Las solicitudes concurrentes se agrupan en una sola inferencia por lotes.
+    """
+    try:
+        datos = request.get_json()
+        
+        if not datos:
+            return jsonify({'error': 'No se proporcionaron inmuebles'}), 400
+        
+        inmuebles = pd.DataFrame(datos if isinstance(datos, list) else [datos])
+        predicciones = coalescedor.enviar(inmuebles)
+        
+        return jsonify({
+            'total': len(predicciones),
+            'predicciones': predicciones.to_dict('records')
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/what-if', methods=['POST'])
+def what_if():
+    """
+    Predice la categoría de un inmueble bajo una grilla de cambios
+    POST /what-if
+    Body (JSON):
+    {
+        "inmueble_id": 42,            (o "inmueble": {...} con sus características)
+        "variaciones": {
+            "area_m2": [120, 150],
+            "estacionamientos": [2, 3, 4],
+            "estado": ["Excelente"]
+        }
+    }
+    """
+    try:
+        datos = request.get_json()
+        
+        if not datos or 'variaciones' not in datos:
+            return jsonify({'error': 'Se requieren "variaciones" y "inmueble" o "inmueble_id"'}), 400
+        
+        if 'inmueble_id' in datos:
+            inmueble = int(datos['inmueble_id'])
+        elif isinstance(datos.get('inmueble'), dict):
+            inmueble = datos['inmueble']
+        else:
+            return jsonify({'error': 'Se requiere "inmueble" o "inmueble_id"'}), 400
+        
+        resultado = modelo.analisis_what_if(inmueble, datos['variaciones'])
+        
+        return jsonify({
+            'total_variantes': len(resultado) - 1,
+            'categoria_base': resultado['categoria_predicha'].iloc[0],
+            'variantes': resultado.to_dict('records')
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metricas-predecir', methods=['GET'])
+def metricas_predecir():
+    """
+    Métricas del agrupamiento de predicciones (tamaños de lote, esperas)
+    GET /metricas-predecir
+    """
+    try:
+        return jsonify(coalescedor.metricas())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -178,11 +407,15 @@ def buscar():
 @app.route('/similares/<int:inmueble_id>', methods=['GET'])
 def similares(inmueble_id):
     """
-    Encuentra inmuebles similares
-    GET /similares/<id>?n=5
+    Encuentra los inmuebles más cercanos, ordenados por distancia
+    GET /similares/<id>?n=5&mismo_cluster=false&n_sondas=2
+    
+    n_sondas solo aplica con el índice aproximado (SIMILITUD_APROXIMADA=1)
     """
     try:
         n_similares = request.args.get('n', default=5, type=int)
+        mismo_cluster = request.args.get('mismo_cluster', default='false').lower() == 'true'
+        n_sondas = request.args.get('n_sondas', default=None, type=int)
         
         if inmueble_id < 0 or inmueble_id >= len(modelo.df):
             return jsonify({'error': 'ID de inmueble inválido'}), 400
@@ -191,7 +424,8 @@ def similares(inmueble_id):
         inmueble_ref = modelo.df.iloc[inmueble_id].to_dict()
         
         # Buscar similares
-        similares_df = modelo.buscar_similares(inmueble_id, n_similares)
+        similares_df = modelo.buscar_similares(inmueble_id, n_similares, mismo_cluster=mismo_cluster,
+                                              n_sondas=n_sondas)
         
         return jsonify({
             'inmueble_referencia': inmueble_ref,
@@ -242,6 +476,28 @@ def rango_precios():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/histogramas', methods=['GET', 'POST'])
+def histogramas():
+    """
+    Histogramas de precio, área y antigüedad bajo los criterios activos
+    GET /histogramas
+    POST /histogramas?columnas=precio,area_m2
+    Body (JSON, opcional): los mismos criterios que /buscar
+    """
+    try:
+        criterios = request.get_json(silent=True) or None
+        columnas = [col for col in request.args.get('columnas', default='').split(',') if col]
+        
+        return jsonify({
+            'criterios': criterios,
+            'histogramas': modelo.histogramas(criterios, columnas=columnas or None)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/filtros-disponibles', methods=['GET'])
 def filtros_disponibles():
     """
@@ -301,11 +557,17 @@ if __name__ == '__main__':
     print("  GET  http://localhost:5000/")
     print("  GET  http://localhost:5000/estadisticas")
     print("  POST http://localhost:5000/buscar")
+    print("  POST http://localhost:5000/buscar-lote")
+    print("  POST http://localhost:5000/skyline")
+    print("  POST http://localhost:5000/predecir")
+    print("  POST http://localhost:5000/what-if")
+    print("  GET  http://localhost:5000/metricas-predecir")
     print("  GET  http://localhost:5000/similares/<id>")
     print("  GET  http://localhost:5000/tipos")
     print("  GET  http://localhost:5000/ubicaciones")
     print("  GET  http://localhost:5000/inmueble/<id>")
     print("  GET  http://localhost:5000/rango-precios")
+    print("  POST http://localhost:5000/histogramas")
     print("  GET  http://localhost:5000/filtros-disponibles")
     print("\nEjemplo de búsqueda con curl:")
     print('  curl -X POST http://localhost:5000/buscar \\')
@@ -0,0 +1,80 @@
+"""
+Benchmark de inferencia del clasificador
+Compara la latencia p50/p99 de sklearn y del bosque aplanado (NumPy)
+"""
+
+import argparse
+import time
+import numpy as np
+from modelo_inmuebles import ModeloInmuebles
+from generar_dataset import generar_dataset_inmuebles
+from inferencia_arboles import BosqueAplanado
+
+
+def medir_latencias(funcion, filas) -> np.ndarray:
+    """
+    Ejecuta la función una vez por fila y retorna las latencias en milisegundos
+    """
+    latencias = np.empty(len(filas))
+    for i, fila in enumerate(filas):
+        inicio = time.perf_counter()
+        funcion(fila)
+        latencias[i] = (time.perf_counter() - inicio) * 1000
+    return latencias
+
+
+def benchmark_inferencia(n_inmuebles: int = 5000, n_consultas: int = 500, tamano_lote: int = 10000):
+    """
+    Mide la latencia por inmueble (p50/p99) y el rendimiento por lotes de
+    sklearn y del bosque aplanado, y verifica que las probabilidades coinciden
+    """
+    print("="*70)
+    print("BENCHMARK DE INFERENCIA DEL CLASIFICADOR")
+    print("="*70)
+
+    df = generar_dataset_inmuebles(n_inmuebles=n_inmuebles, guardar=False)
+    modelo = ModeloInmuebles()
+    modelo.cargar_dataset(dataframe=df)
+    modelo.preprocesar_datos()
+    modelo.crear_categorias_precio('precio')
+    modelo.entrenar_modelo_clasificacion('categoria_precio')
+
+    sklearn_rf = modelo.modelo_clasificacion
+    bosque = BosqueAplanado(sklearn_rf)
+    X = modelo.matriz_escalada('clasificacion')
+    rng = np.random.default_rng(42)
+    filas = [X[i:i + 1] for i in rng.integers(0, len(X), n_consultas)]
+    lote = X[rng.integers(0, len(X), tamano_lote)]
+
+    iguales = np.array_equal(bosque.predict_proba(lote), sklearn_rf.predict_proba(lote))
+    print(f"\nÁrboles: {bosque.n_arboles}, nodos: {bosque.n_nodos}, profundidad: {bosque.profundidad}")
+    print(f"Probabilidades idénticas a sklearn: {'sí' if iguales else 'NO'}")
+
+    print(f"\n{'motor':<12}{'p50 ms':>10}{'p99 ms':>10}{'lote filas/s':>16}")
+    resultados = {}
+    for nombre, funcion in [('sklearn', sklearn_rf.predict_proba), ('aplanado', bosque.predict_proba)]:
+        funcion(filas[0])
+        latencias = medir_latencias(funcion, filas)
+        inicio = time.perf_counter()
+        funcion(lote)
+        filas_por_segundo = len(lote) / (time.perf_counter() - inicio)
+
+        resultados[nombre] = {
+            'p50_ms': float(np.percentile(latencias, 50)),
+            'p99_ms': float(np.percentile(latencias, 99)),
+            'filas_por_segundo': filas_por_segundo
+        }
+        print(f"{nombre:<12}{resultados[nombre]['p50_ms']:>10.3f}{resultados[nombre]['p99_ms']:>10.3f}"
+              f"{filas_por_segundo:>16,.0f}")
+
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inmuebles', type=int, default=5000)
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--lote', type=int, default=10000)
+    args = parser.parse_args()
+
+    benchmark_inferencia(n_inmuebles=args.inmuebles, n_consultas=args.consultas, tamano_lote=args.lote)
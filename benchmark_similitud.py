@@ -0,0 +1,72 @@
+"""
+Benchmark del índice de similitud aproximado (IVF)
+Compara recall@k y latencia frente a la búsqueda exacta con KDTree
+"""
+
+import argparse
+import time
+import numpy as np
+from modelo_inmuebles import ModeloInmuebles
+from generar_dataset import generar_dataset_inmuebles
+from indice_similitud import IndiceVecinos, IndiceIVF
+
+
+def benchmark_similitud(n_inmuebles: int = 20000, n_clusters: int = 5, k: int = 10,
+                        n_consultas: int = 200, sondas=(1, 2, 3)):
+    """
+    Mide recall@k y latencia por consulta del índice IVF para varios n_sondas
+
+    El recall@k es la fracción de los k vecinos exactos (KDTree) que aparece
+    entre los k vecinos retornados por el índice aproximado.
+    """
+    print("="*70)
+    print("BENCHMARK DE SIMILITUD APROXIMADA (IVF)")
+    print("="*70)
+
+    df = generar_dataset_inmuebles(n_inmuebles=n_inmuebles, guardar=False)
+    modelo = ModeloInmuebles()
+    modelo.cargar_dataset(dataframe=df)
+    modelo.preprocesar_datos()
+    modelo.entrenar_clustering(n_clusters=n_clusters)
+
+    X = modelo.matriz_escalada('clustering')
+    grupos = modelo.df['cluster'].to_numpy()
+    consultas = np.random.default_rng(42).choice(len(X), size=min(n_consultas, len(X)), replace=False)
+
+    exacto = IndiceVecinos(X, grupos)
+    inicio = time.perf_counter()
+    vecinos_exactos = [exacto.vecinos(int(i), k)[0] for i in consultas]
+    latencia_exacta = (time.perf_counter() - inicio) / len(consultas) * 1000
+
+    ivf = IndiceIVF(X, modelo.modelo_clustering.cluster_centers_, grupos)
+    print(f"\nDataset: {len(X)} inmuebles, {X.shape[1]} características, k={k}")
+    print(f"Memoria por inmueble: {X.itemsize * X.shape[1]} bytes (exacto) "
+          f"vs {ivf.bytes_por_vector} bytes (IVF)")
+    print(f"\n{'modo':<12}{'recall@k':>10}{'ms/consulta':>14}")
+    print(f"{'exacto':<12}{1.0:>10.3f}{latencia_exacta:>14.3f}")
+
+    resultados = []
+    for n_sondas in sondas:
+        inicio = time.perf_counter()
+        aproximados = [ivf.vecinos(int(i), k, n_sondas=n_sondas, punto=X[i])[0] for i in consultas]
+        latencia = (time.perf_counter() - inicio) / len(consultas) * 1000
+        recall = np.mean([
+            len(np.intersect1d(a, e)) / max(len(e), 1)
+            for a, e in zip(aproximados, vecinos_exactos)
+        ])
+        resultados.append({'n_sondas': n_sondas, 'recall': recall, 'ms_por_consulta': latencia})
+        print(f"{'ivf/' + str(n_sondas):<12}{recall:>10.3f}{latencia:>14.3f}")
+
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inmuebles', type=int, default=20000)
+    parser.add_argument('--clusters', type=int, default=5)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--consultas', type=int, default=200)
+    args = parser.parse_args()
+
+    benchmark_similitud(n_inmuebles=args.inmuebles, n_clusters=args.clusters, k=args.k,
+                        n_consultas=args.consultas, sondas=range(1, args.clusters + 1))
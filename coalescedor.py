@@ -0,0 +1,213 @@
+"""
+Coalescedor de solicitudes de predicción
+Agrupa solicitudes concurrentes en lotes para aprovechar la inferencia vectorizada
+"""
+
+import queue
+import threading
+import time
+import pandas as pd
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable, Dict, Any, List
+
+
+class Coalescedor:
+    """
+    Agrupa solicitudes concurrentes en una sola llamada por lotes
+
+    Un hilo de fondo toma la primera solicitud pendiente y espera hasta
+    espera_max_ms a que lleguen más, o hasta reunir lote_max filas. Luego
+    ejecuta funcion_lote una vez sobre todas las filas y reparte el resultado
+    a cada solicitud, con el índice de sus propias filas. La función debe
+    tratar cada fila de forma independiente (como predecir()). Si la llamada
+    por lotes lanza una excepción, cada solicitud se reintenta por separado
+    y solo fallan las que vuelven a lanzarla. Las solicitudes canceladas
+    antes de ejecutarse se descartan.
+    """
+
+    def __init__(self, funcion_lote: Callable[[pd.DataFrame], pd.DataFrame],
+                 espera_max_ms: float = 5.0, lote_max: int = 256):
+        if espera_max_ms < 0:
+            raise ValueError("espera_max_ms debe ser mayor o igual que cero")
+        if lote_max < 1:
+            raise ValueError("lote_max debe ser mayor o igual que 1")
+
+        self.funcion_lote = funcion_lote
+        self.espera_max_ms = espera_max_ms
+        self.lote_max = lote_max
+        self._cola = queue.Queue()
+        self._bloqueo = threading.Lock()
+        self._reiniciar_metricas()
+
+        self._hilo = threading.Thread(target=self._bucle, name='coalescedor', daemon=True)
+        self._hilo.start()
+
+    def enviar(self, filas: pd.DataFrame, timeout: float = None) -> pd.DataFrame:
+        """
+        Encola filas y espera su resultado (bloqueante)
+        """
+        return self.enviar_async(filas).result(timeout=timeout)
+
+    def enviar_async(self, filas: pd.DataFrame) -> Future:
+        """
+        Encola filas y retorna un Future con su resultado
+        """
+        futuro = Future()
+        if len(filas) == 0:
+            futuro.set_result(self.funcion_lote(filas))
+            return futuro
+        self._cola.put((filas, futuro, time.perf_counter()))
+        return futuro
+
+    def cerrar(self):
+        """
+        Detiene el hilo de fondo después de atender las solicitudes pendientes
+        """
+        self._cola.put(None)
+        self._hilo.join()
+
+    def metricas(self) -> Dict[str, Any]:
+        """
+        Retorna métricas acumuladas de los lotes ejecutados
+
+        'distribucion_lotes' cuenta los lotes por tamaño en filas, agrupados
+        en potencias de dos (ej. '5-8' son lotes de 5 a 8 filas). 'errores'
+        cuenta las solicitudes que fallaron.
+        """
+        with self._bloqueo:
+            lotes = self._lotes
+            return {
+                'espera_max_ms': self.espera_max_ms,
+                'lote_max': self.lote_max,
+                'lotes': lotes,
+                'solicitudes': self._solicitudes,
+                'filas': self._filas,
+                'filas_por_lote_promedio': self._filas / lotes if lotes else 0.0,
+                'solicitudes_por_lote_promedio': self._solicitudes / lotes if lotes else 0.0,
+                'filas_por_lote_max': self._filas_max,
+                'espera_promedio_ms': self._espera_total / self._solicitudes * 1000 if self._solicitudes else 0.0,
+                'inferencia_promedio_ms': self._inferencia_total / lotes * 1000 if lotes else 0.0,
+                'errores': self._errores,
+                'distribucion_lotes': {
+                    (f'{cota // 2 + 1}-{cota}' if cota > 2 else str(cota)): conteo
+                    for cota, conteo in sorted(self._distribucion.items())
+                }
+            }
+
+    def reiniciar_metricas(self):
+        """
+        Pone a cero las métricas acumuladas
+        """
+        with self._bloqueo:
+            self._reiniciar_metricas()
+
+    def _reiniciar_metricas(self):
+        self._lotes = 0
+        self._solicitudes = 0
+        self._filas = 0
+        self._filas_max = 0
+        self._espera_total = 0.0
+        self._inferencia_total = 0.0
+        self._errores = 0
+        self._distribucion = {}
+
+    def _bucle(self):
+        cerrar = False
+        while not cerrar:
+            pendiente = self._cola.get()
+            if pendiente is None:
+                break
+
+            lote = [pendiente]
+            n_filas = len(pendiente[0])
+            limite = time.perf_counter() + self.espera_max_ms / 1000
+            while n_filas < self.lote_max:
+                restante = limite - time.perf_counter()
+                try:
+                    pendiente = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if pendiente is None:
+                    cerrar = True
+                    break
+                lote.append(pendiente)
+                n_filas += len(pendiente[0])
+
+            try:
+                self._ejecutar(lote, n_filas)
+            except Exception as e:
+                # Un error inesperado no debe detener el hilo: las solicitudes
+                # del lote que siguen pendientes reciben la excepción
+                for _, futuro, _ in lote:
+                    self._fallar(futuro, e)
+
+    def _ejecutar(self, lote, n_filas: int):
+        inicio = time.perf_counter()
+        # Las solicitudes canceladas mientras esperaban en la cola se descartan;
+        # las demás ya no se pueden cancelar
+        vigentes = [solicitud for solicitud in lote if solicitud[1].set_running_or_notify_cancel()]
+        errores = 0
+        if vigentes:
+            try:
+                datos = pd.concat([filas for filas, _, _ in vigentes], ignore_index=True)
+                partes = self._repartir(self.funcion_lote(datos), vigentes)
+            except Exception as e:
+                # Un lote que falla se reintenta solicitud por solicitud, para que
+                # solo fallen las que contienen filas inválidas
+                if len(vigentes) > 1:
+                    errores = self._ejecutar_por_separado(vigentes)
+                else:
+                    self._fallar(vigentes[0][1], e)
+                    errores = 1
+            else:
+                for (_, futuro, _), parte in zip(vigentes, partes):
+                    futuro.set_result(parte)
+        fin = time.perf_counter()
+
+        with self._bloqueo:
+            self._lotes += 1
+            self._solicitudes += len(lote)
+            self._filas += n_filas
+            self._filas_max = max(self._filas_max, n_filas)
+            self._espera_total += sum(inicio - encolado for _, _, encolado in lote)
+            self._inferencia_total += fin - inicio
+            self._errores += errores
+            cota = 1 << (n_filas - 1).bit_length()
+            self._distribucion[cota] = self._distribucion.get(cota, 0) + 1
+
+    def _ejecutar_por_separado(self, lote) -> int:
+        errores = 0
+        for solicitud in lote:
+            filas, futuro, _ = solicitud
+            try:
+                parte, = self._repartir(self.funcion_lote(filas.reset_index(drop=True)), [solicitud])
+            except Exception as e:
+                self._fallar(futuro, e)
+                errores += 1
+                continue
+            futuro.set_result(parte)
+        return errores
+
+    @staticmethod
+    def _repartir(resultado: pd.DataFrame, lote) -> List[pd.DataFrame]:
+        """
+        Divide el resultado de funcion_lote en una parte por solicitud, con el
+        índice de sus filas; falla antes de resolver cualquier Future
+        """
+        esperadas = sum(len(filas) for filas, _, _ in lote)
+        if len(resultado) != esperadas:
+            raise ValueError(f"funcion_lote retornó {len(resultado)} filas para {esperadas}")
+        partes = []
+        desplazamiento = 0
+        for filas, _, _ in lote:
+            parte = resultado.iloc[desplazamiento:desplazamiento + len(filas)]
+            partes.append(parte.set_axis(filas.index, axis=0))
+            desplazamiento += len(filas)
+        return partes
+
+    @staticmethod
+    def _fallar(futuro: Future, error: Exception):
+        try:
+            futuro.set_exception(error)
+        except InvalidStateError:
+            pass  # Cancelado o ya resuelto
@@ -0,0 +1,127 @@
+"""
+Monitor de deriva del clustering incremental
+Compara los inmuebles nuevos con la línea base del último entrenamiento completo
+"""
+
+import numpy as np
+from typing import Dict, Any
+
+
+# Filas procesadas por trozo al calcular distancias a los centroides
+TAMANO_TROZO = 65536
+
+# Evita divisiones por cero y logaritmos de cero en el PSI
+EPSILON_PSI = 1e-4
+
+
+def distancias_cuadradas(X: np.ndarray, centroides: np.ndarray, etiquetas: np.ndarray) -> np.ndarray:
+    """
+    Distancia euclídea al cuadrado de cada fila a su centroide asignado
+    """
+    distancias = np.empty(len(X), dtype=np.float64)
+    for inicio in range(0, len(X), TAMANO_TROZO):
+        fin = inicio + TAMANO_TROZO
+        diferencia = X[inicio:fin] - centroides[etiquetas[inicio:fin]]
+        distancias[inicio:fin] = np.einsum('ij,ij->i', diferencia, diferencia)
+    return distancias
+
+
+class MonitorDeriva:
+    """
+    Acumula estadísticas de los lotes nuevos frente a una línea base
+
+    La línea base se toma al entrenar el clustering: centroides, proporción de
+    inmuebles por cluster, distancia media al centroide (inercia por
+    inmueble) y media de cada característica escalada. Cada lote absorbido
+    con partial_fit suma sus estadísticas sin guardar las filas, de modo que
+    la memoria no crece con los datos.
+    """
+
+    def __init__(self, X: np.ndarray, centroides: np.ndarray, etiquetas: np.ndarray):
+        centroides = np.asarray(centroides, dtype=np.float64)
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)
+        self.n_clusters, self.dimension = centroides.shape
+        self.centroides_base = centroides.copy()
+        self.n_base = len(X)
+        self.conteos_base = np.bincount(etiquetas, minlength=self.n_clusters)
+        self.inercia_media_base = float(distancias_cuadradas(X, centroides, etiquetas).mean()) if len(X) else 0.0
+        self.media_base = np.asarray(X).mean(axis=0, dtype=np.float64) if len(X) else np.zeros(self.dimension)
+        self.reiniciar()
+
+    def reiniciar(self):
+        """
+        Descarta los lotes acumulados (mantiene la línea base)
+        """
+        self.n_nuevos = 0
+        self.lotes = 0
+        self.conteos_nuevos = np.zeros(self.n_clusters, dtype=np.int64)
+        self.inercia_nuevos = 0.0
+        self.suma_nuevos = np.zeros(self.dimension)
+
+    def registrar(self, X: np.ndarray, centroides: np.ndarray, etiquetas: np.ndarray):
+        """
+        Suma las estadísticas de un lote ya asignado a los centroides actuales
+        """
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)
+        self.n_nuevos += len(X)
+        self.lotes += 1
+        self.conteos_nuevos += np.bincount(etiquetas, minlength=self.n_clusters)
+        self.inercia_nuevos += float(distancias_cuadradas(X, np.asarray(centroides), etiquetas).sum())
+        self.suma_nuevos += np.asarray(X).sum(axis=0, dtype=np.float64)
+
+    def metricas(self, centroides: np.ndarray, umbral_inercia: float = 1.25,
+                 umbral_desplazamiento: float = 0.5, umbral_psi: float = 0.2) -> Dict[str, Any]:
+        """
+        Retorna las métricas de deriva y si conviene un reentrenamiento completo
+
+        Args:
+            centroides: Centroides actuales del modelo
+            umbral_inercia: Máximo cociente entre la inercia por inmueble de
+                los lotes nuevos y la de la línea base
+            umbral_desplazamiento: Máximo desplazamiento de un centroide o de
+                la media de una característica, en desviaciones estándar
+            umbral_psi: Máximo índice de estabilidad de población (PSI) de la
+                distribución de inmuebles por cluster
+        """
+        desplazamientos = np.sqrt(((np.asarray(centroides, dtype=np.float64)
+                                    - self.centroides_base) ** 2).sum(axis=1))
+        proporciones_base = self.conteos_base / max(self.n_base, 1)
+
+        resultado = {
+            'n_base': self.n_base,
+            'n_nuevos': self.n_nuevos,
+            'lotes': self.lotes,
+            'inercia_media_base': self.inercia_media_base,
+            'desplazamiento_centroides_max': float(desplazamientos.max()),
+            'desplazamiento_centroides_medio': float(desplazamientos.mean()),
+            'proporciones_base': proporciones_base.round(4).tolist()
+        }
+        motivos = []
+        if resultado['desplazamiento_centroides_max'] > umbral_desplazamiento:
+            motivos.append('desplazamiento_centroides')
+
+        if self.n_nuevos:
+            inercia_media = self.inercia_nuevos / self.n_nuevos
+            proporciones = self.conteos_nuevos / self.n_nuevos
+            p_base = np.maximum(proporciones_base, EPSILON_PSI)
+            p_nuevos = np.maximum(proporciones, EPSILON_PSI)
+            psi = float(((p_nuevos - p_base) * np.log(p_nuevos / p_base)).sum())
+            desplazamiento_medias = np.abs(self.suma_nuevos / self.n_nuevos - self.media_base)
+
+            resultado.update({
+                'inercia_media_nuevos': inercia_media,
+                'ratio_inercia': inercia_media / self.inercia_media_base if self.inercia_media_base else float('inf'),
+                'proporciones_nuevos': proporciones.round(4).tolist(),
+                'psi_clusters': psi,
+                'desplazamiento_medias_max': float(desplazamiento_medias.max())
+            })
+            if resultado['ratio_inercia'] > umbral_inercia:
+                motivos.append('inercia')
+            if psi > umbral_psi:
+                motivos.append('psi_clusters')
+            if resultado['desplazamiento_medias_max'] > umbral_desplazamiento:
+                motivos.append('desplazamiento_medias')
+
+        resultado['reentrenar'] = bool(motivos)
+        resultado['motivos'] = motivos
+        return resultado
@@ -135,7 +135,7 @@ def ejemplo_filtros_complejos():
     # Calcular score de amenidades
     amenidades = ['tiene_jardin', 'tiene_terraza', 'tiene_balcon', 
                   'tiene_piscina', 'tiene_gimnasio', 'tiene_seguridad']
-    modelo.df['score_amenidades'] = modelo.df[amenidades].sum(axis=1)
+    modelo.df['score_amenidades'] = modelo.score_amenidades(amenidades)
     
     # Buscar propiedades con alto score
     alto_score = modelo.df[modelo.df['score_amenidades'] >= 4]
@@ -218,7 +218,7 @@ def ejemplo_optimizacion_busqueda():
     
     # Score de amenidades
     amenidades = ['tiene_jardin', 'tiene_piscina', 'tiene_gimnasio', 'tiene_seguridad']
-    candidatos['score_amenidades'] = candidatos[amenidades].sum(axis=1) / len(amenidades)
+    candidatos['score_amenidades'] = modelo.score_amenidades(amenidades).loc[candidatos.index] / len(amenidades)
     
     # Score total ponderado
     candidatos['score_total'] = (
@@ -0,0 +1,279 @@
+"""
+Entrenamiento por flujo (out-of-core) para el modelo de inmuebles
+Lee archivos por trozos y acumula las estadísticas del preprocesamiento sin cargar el dataset completo
+"""
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from typing import Dict, List, Iterator
+
+
+def leer_trozos(ruta_archivo: str, tamano_trozo: int = 100000) -> Iterator[pd.DataFrame]:
+    """
+    Lee un archivo CSV o JSON lines en trozos de tamano_trozo filas
+
+    Solo un trozo está en memoria a la vez. Excel y JSON normal no admiten
+    lectura por trozos.
+    """
+    if tamano_trozo < 1:
+        raise ValueError("tamano_trozo debe ser mayor o igual que 1")
+    if ruta_archivo.endswith('.csv'):
+        lector = pd.read_csv(ruta_archivo, chunksize=tamano_trozo)
+    elif ruta_archivo.endswith('.jsonl') or ruta_archivo.endswith('.ndjson'):
+        lector = pd.read_json(ruta_archivo, lines=True, chunksize=tamano_trozo)
+    else:
+        raise ValueError("El entrenamiento por flujo requiere un archivo CSV o JSON lines (.jsonl)")
+
+    with lector:
+        yield from lector
+
+
+class MuestraFondo:
+    """
+    Muestra aleatoria uniforme de tamaño fijo sobre un flujo (bottom-k)
+
+    Cada valor recibe una clave aleatoria y se conservan los de menor clave.
+    Equivale a muestrear sin reemplazo de todo el flujo, con memoria
+    acotada por el tamaño de la muestra.
+    """
+
+    def __init__(self, tamano: int, semilla: int = 42):
+        self.tamano = tamano
+        self._rng = np.random.default_rng(semilla)
+        self.valores = np.empty(0)
+        self._claves = np.empty(0)
+
+    def agregar(self, valores: np.ndarray):
+        valores = np.asarray(valores, dtype=np.float64)
+        self.valores = np.concatenate([self.valores, valores])
+        self._claves = np.concatenate([self._claves, self._rng.random(len(valores))])
+        if len(self.valores) > self.tamano:
+            conservar = np.argpartition(self._claves, self.tamano - 1)[:self.tamano]
+            self.valores, self._claves = self.valores[conservar], self._claves[conservar]
+
+
+class MuestraEstratificada:
+    """
+    Muestra estratificada de tamaño fijo sobre un flujo de trozos, en una pasada
+
+    Como en MuestraFondo, cada fila recibe una clave aleatoria. Se conservan
+    las filas con las margen * tamano menores claves del flujo, más las
+    minimo_por_estrato menores de cada estrato, y se cuentan las filas de
+    cada estrato. Al final cada estrato aporta una cuota proporcional a su
+    conteo (al menos minimo_por_estrato si las tiene), tomada de sus menores
+    claves. Por eso las muestras de distintos tamaños quedan anidadas: la de
+    1.000 filas está contenida en la de 2.000.
+    """
+
+    def __init__(self, tamano: int, columnas_estrato: List[str], minimo_por_estrato: int = 2,
+                 margen: float = 1.25, semilla: int = 42):
+        if tamano < 1:
+            raise ValueError("El tamaño de la muestra debe ser mayor o igual que 1")
+        self.tamano = tamano
+        self.columnas_estrato = list(columnas_estrato)
+        self.minimo_por_estrato = minimo_por_estrato
+        self.capacidad = int(np.ceil(tamano * margen))
+        self.n_filas = 0
+        self.conteos = pd.Series(dtype=np.int64)
+        self._rng = np.random.default_rng(semilla)
+        self._reserva = None
+
+    def agregar(self, trozo: pd.DataFrame, estratos: pd.Series = None):
+        """
+        Agrega un trozo; estratos permite pasar el estrato de cada fila ya calculado
+        """
+        if estratos is None:
+            faltantes = [col for col in self.columnas_estrato if col not in trozo.columns]
+            if faltantes:
+                raise ValueError(f"Columnas de estrato inexistentes: {faltantes}")
+            estratos = self.estratos(trozo)
+        if not len(trozo):
+            return
+
+        self.n_filas += len(trozo)
+        self.conteos = self.conteos.add(estratos.value_counts(), fill_value=0).astype(np.int64)
+
+        claves = self._rng.random(len(trozo))
+        if self._reserva is not None and len(self._reserva) >= self.capacidad:
+            # Una clave mayor que la de la fila capacidad-ésima solo puede
+            # entrar por el mínimo de un estrato que aún no lo cubre bajo el umbral
+            umbral = self._reserva['_clave'].iat[self.capacidad - 1]
+            cubiertos = self._reserva['_estrato'].iloc[:self.capacidad].value_counts() >= self.minimo_por_estrato
+            candidatas = (claves <= umbral) | ~estratos.map(cubiertos).fillna(False).to_numpy(dtype=bool)
+            trozo, claves, estratos = trozo[candidatas], claves[candidatas], estratos[candidatas]
+
+        trozo = trozo.assign(_clave=claves, _estrato=estratos.to_numpy())
+        reserva = trozo if self._reserva is None else pd.concat([self._reserva, trozo], ignore_index=True)
+        reserva = reserva.sort_values('_clave', kind='stable', ignore_index=True)
+        conservar = ((np.arange(len(reserva)) < self.capacidad)
+                     | (reserva.groupby('_estrato', sort=False).cumcount().to_numpy() < self.minimo_por_estrato))
+        self._reserva = reserva[conservar].reset_index(drop=True)
+
+    def estratos(self, datos: pd.DataFrame) -> pd.Series:
+        """
+        Estrato de cada fila: los valores de las columnas de estrato unidos por '|'
+        (los faltantes forman su propio valor)
+        """
+        columnas = [datos[col].astype(str).fillna('') for col in self.columnas_estrato]
+        if not columnas:
+            return pd.Series('', index=datos.index)
+        return columnas[0].str.cat(columnas[1:], sep='|') if len(columnas) > 1 else columnas[0]
+
+    def muestra(self, tamano: int = None) -> pd.DataFrame:
+        """
+        Retorna la muestra estratificada de (aproximadamente) tamano filas
+
+        Las cuotas se redondean por estrato, de modo que el total puede
+        diferir en unas pocas filas. Sin tamano se usa el de la reserva.
+        """
+        if self._reserva is None:
+            return pd.DataFrame()
+        elegidas = self._elegidas(tamano)
+        return self._reserva[elegidas].drop(columns=['_clave', '_estrato']).reset_index(drop=True)
+
+    def separar(self, tamano: int) -> pd.DataFrame:
+        """
+        Retira de la reserva una muestra estratificada de tamano filas y la retorna
+
+        Se llama después de agregar todos los trozos. Las muestras siguientes
+        salen de las filas restantes (siguen anidadas entre sí) y no comparten
+        filas con la separada, que sirve como conjunto de prueba fijo. Sus
+        filas se descuentan de los conteos de cada estrato.
+        """
+        if self._reserva is None:
+            return pd.DataFrame()
+        elegidas = self._elegidas(tamano)
+        separada = self._reserva[elegidas].drop(columns=['_clave', '_estrato']).reset_index(drop=True)
+        # Las cuotas siguientes se calculan sobre las filas que quedan en el flujo
+        self.conteos = self.conteos.sub(self._reserva.loc[elegidas, '_estrato'].value_counts(),
+                                        fill_value=0).astype(np.int64)
+        self.n_filas -= len(separada)
+        self._reserva = self._reserva[~elegidas].reset_index(drop=True)
+        self.tamano = max(self.tamano - len(separada), 1)
+        return separada
+
+    def _elegidas(self, tamano: int = None) -> np.ndarray:
+        tamano = min(tamano or self.tamano, self.tamano)
+        cuotas = np.maximum(np.rint(self.conteos * tamano / self.n_filas),
+                            np.minimum(self.conteos, self.minimo_por_estrato))
+        posicion = self._reserva.groupby('_estrato', sort=False).cumcount()
+        return posicion.to_numpy() < self._reserva['_estrato'].map(cuotas).to_numpy()
+
+
+class EstadisticasFlujo:
+    """
+    Estadísticas del preprocesamiento acumuladas trozo a trozo
+
+    Para cada columna numérica guarda conteo, media y suma de cuadrados de
+    desviaciones (combinadas entre trozos con la fórmula de Chan et al.);
+    para cada categórica, el conteo de cada valor. Con ellas se obtienen,
+    igual que en preprocesar_datos, las medias y modas para imputar, los
+    LabelEncoders y el StandardScaler de la matriz ya imputada y codificada.
+    Los tipos de columna se toman del primer trozo.
+    """
+
+    def __init__(self, columnas_excluidas: List[str] = None):
+        self.columnas_excluidas = set(columnas_excluidas or [])
+        self.caracteristicas_numericas = None
+        self.caracteristicas_categoricas = None
+        self.n_filas = 0
+
+    def agregar(self, trozo: pd.DataFrame):
+        if self.caracteristicas_numericas is None:
+            self.caracteristicas_numericas = [col for col in trozo.select_dtypes(include=[np.number]).columns
+                                              if col not in self.columnas_excluidas]
+            self.caracteristicas_categoricas = [col for col in trozo.select_dtypes(include=['object', 'string']).columns
+                                                if col not in self.columnas_excluidas]
+            dimension = len(self.caracteristicas_numericas)
+            self._conteo = np.zeros(dimension)
+            self._media = np.zeros(dimension)
+            self._m2 = np.zeros(dimension)
+            self._valores = {col: pd.Series(dtype=np.int64) for col in self.caracteristicas_categoricas}
+
+        self.n_filas += len(trozo)
+
+        X = np.column_stack([
+            pd.to_numeric(trozo[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            if col in trozo.columns else np.full(len(trozo), np.nan)
+            for col in self.caracteristicas_numericas
+        ]) if self.caracteristicas_numericas else np.empty((len(trozo), 0))
+        conteo = (~np.isnan(X)).sum(axis=0)
+        media = np.divide(np.nansum(X, axis=0), conteo, out=np.zeros(X.shape[1]), where=conteo > 0)
+        m2 = np.nansum((X - media) ** 2, axis=0)
+
+        total = self._conteo + conteo
+        delta = media - self._media
+        peso = np.divide(conteo, total, out=np.zeros(X.shape[1]), where=total > 0)
+        self._media += delta * peso
+        self._m2 += m2 + delta ** 2 * self._conteo * peso
+        self._conteo = total
+
+        for col in self.caracteristicas_categoricas:
+            if col in trozo.columns:
+                conteos = trozo[col].dropna().astype(str).value_counts()
+                self._valores[col] = self._valores[col].add(conteos, fill_value=0).astype(np.int64)
+
+    def medias(self) -> Dict[str, float]:
+        """
+        Media de cada columna numérica (sobre los valores no faltantes)
+        """
+        return dict(zip(self.caracteristicas_numericas, self._media))
+
+    def modas(self) -> Dict[str, str]:
+        """
+        Valor más frecuente de cada columna categórica (el menor en empate)
+        """
+        return {col: conteos.sort_index().idxmax() for col, conteos in self._valores.items()
+                if len(conteos)}
+
+    def label_encoders(self) -> Dict[str, LabelEncoder]:
+        """
+        LabelEncoders ajustados con todos los valores vistos en el flujo
+        """
+        encoders = {}
+        for col, conteos in self._valores.items():
+            encoders[col] = LabelEncoder().fit(conteos.index.to_numpy(dtype=object))
+        return encoders
+
+    def scaler(self, columnas: List[str]) -> StandardScaler:
+        """
+        StandardScaler de la matriz imputada y codificada, en el orden de columnas
+
+        Las columnas '_encoded' toman media y varianza de los códigos según
+        el conteo de cada categoría (con los faltantes en la moda); las
+        numéricas, de sus estadísticas con los faltantes en la media, que no
+        suman desviación.
+        """
+        modas = self.modas()
+        medias, varianzas = [], []
+        for col in columnas:
+            if col.endswith('_encoded') and col[:-len('_encoded')] in self._valores:
+                base = col[:-len('_encoded')]
+                conteos = self._valores[base].sort_index().to_numpy(dtype=np.float64)
+                if base in modas:
+                    conteos[self._valores[base].sort_index().index.get_loc(modas[base])] += \
+                        self.n_filas - conteos.sum()
+                codigos = np.arange(len(conteos))
+                media = (codigos * conteos).sum() / max(conteos.sum(), 1)
+                medias.append(media)
+                varianzas.append((conteos * (codigos - media) ** 2).sum() / max(conteos.sum(), 1))
+            else:
+                j = self.caracteristicas_numericas.index(col)
+                medias.append(self._media[j])
+                varianzas.append(self._m2[j] / max(self.n_filas, 1))
+
+        # Mismos atributos que deja StandardScaler.fit (escala 1 si la varianza es 0)
+        scaler = StandardScaler()
+        scaler.mean_ = np.array(medias)
+        scaler.var_ = np.array(varianzas)
+        scaler.scale_ = np.where(scaler.var_ > 0, np.sqrt(scaler.var_), 1.0)
+        scaler.n_samples_seen_ = self.n_filas
+        scaler.n_features_in_ = len(columnas)
+        return scaler
+
+    def preparar(self, trozo: pd.DataFrame) -> pd.DataFrame:
+        """
+        Imputa un trozo como preprocesar_datos: medias y modas del flujo completo
+        """
+        return trozo.fillna({**self.medias(), **self.modas()})
@@ -0,0 +1,474 @@
+"""
+Evaluación y selección de modelos para inmuebles
+Barridos de hiperparámetros y comparación de modelos sobre la matriz de características
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import partial
+import numpy as np
+import pandas as pd
+import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold, ParameterGrid, ParameterSampler
+from sklearn.preprocessing import StandardScaler
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Tuple
+from inferencia_arboles import BosqueAplanado
+
+
+def muestra_estratificada(etiquetas: np.ndarray, tamano: int, semilla: int = 42) -> np.ndarray:
+    """
+    Posiciones de una muestra aleatoria que conserva la proporción de cada etiqueta
+
+    Cada grupo aporta al menos dos filas (si las tiene), de modo que los
+    grupos pequeños también quedan representados.
+    """
+    etiquetas = np.asarray(etiquetas)
+    if tamano >= len(etiquetas):
+        return np.arange(len(etiquetas))
+
+    rng = np.random.default_rng(semilla)
+    grupos, conteos = np.unique(etiquetas, return_counts=True)
+    cuotas = np.maximum(np.rint(conteos * tamano / len(etiquetas)).astype(np.int64), np.minimum(conteos, 2))
+    posiciones = [rng.choice(np.flatnonzero(etiquetas == grupo), size=cuota, replace=False)
+                  for grupo, cuota in zip(grupos, cuotas)]
+    return np.sort(np.concatenate(posiciones))
+
+
+def silueta_muestreada(X: np.ndarray, etiquetas: np.ndarray, tamano_muestra: int = 10000,
+                       semilla: int = 42) -> float:
+    """
+    Silueta estimada sobre una muestra estratificada por etiqueta (NaN con un solo grupo)
+    """
+    etiquetas = np.asarray(etiquetas)
+    muestra = muestra_estratificada(etiquetas, tamano_muestra, semilla)
+    if len(np.unique(etiquetas[muestra])) < 2:
+        return float('nan')
+    return float(silhouette_score(X[muestra], etiquetas[muestra]))
+
+
+def evaluar_k(X: np.ndarray, k: int, incremental: bool = False, tamano_lote: int = 4096,
+              tamano_muestra: int = 10000, semilla: int = 42) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Entrena un clustering con k grupos y lo evalúa
+
+    La silueta exacta es O(n²); se estima sobre una muestra estratificada
+    por cluster de tamano_muestra filas.
+
+    Returns:
+        (modelo entrenado, fila de métricas con k, inercia, silueta y segundos)
+    """
+    inicio = time.perf_counter()
+    if incremental:
+        modelo = MiniBatchKMeans(n_clusters=k, batch_size=tamano_lote, random_state=semilla, n_init=3)
+    else:
+        modelo = KMeans(n_clusters=k, random_state=semilla, n_init=10)
+    etiquetas = modelo.fit_predict(X)
+
+    return modelo, {
+        'k': k,
+        'inercia': float(modelo.inertia_),
+        'silueta': silueta_muestreada(X, etiquetas, tamano_muestra, semilla),
+        'segundos': time.perf_counter() - inicio
+    }
+
+
+def _evaluar_k_limitado(X: np.ndarray, k: int, hilos: int, **opciones) -> Tuple[Any, Dict[str, Any]]:
+    with threadpool_limits(limits=hilos):
+        return evaluar_k(X, k, **opciones)
+
+
+def barrer_k(X: np.ndarray, rango_k: Iterable[int], n_procesos: int = -1,
+             **opciones) -> Tuple[Any, pd.DataFrame]:
+    """
+    Entrena y evalúa un clustering por cada k en un pool de procesos
+
+    Cada candidato se ejecuta en un proceso (joblib/loky); la matriz se
+    comparte mediante memmap en lugar de copiarse a cada proceso. Los
+    núcleos se reparten entre procesos e hilos (ver repartir_cpu) para que
+    el OpenMP/BLAS de cada KMeans no sobresuscriba la máquina. Gana el k
+    con mayor silueta estimada.
+
+    Args:
+        X: Matriz de características escalada
+        rango_k: Valores de k a evaluar (cada uno entre 2 y n_filas - 1)
+        n_procesos: Procesos del pool (-1: todos los núcleos)
+        **opciones: Argumentos de evaluar_k (incremental, tamano_lote, ...)
+
+    Returns:
+        (mejor modelo, tabla con una fila por k y la columna 'mejor')
+    """
+    valores_k = sorted(set(int(k) for k in rango_k))
+    if not valores_k:
+        raise ValueError("rango_k no contiene valores")
+    if valores_k[0] < 2 or valores_k[-1] >= len(X):
+        raise ValueError(f"Cada k debe estar entre 2 y {len(X) - 1}")
+
+    procesos, hilos = repartir_cpu(len(valores_k), n_procesos)
+    resultados = Parallel(n_jobs=procesos, backend='loky')(
+        delayed(_evaluar_k_limitado)(X, k, hilos, **opciones) for k in valores_k
+    )
+
+    tabla = pd.DataFrame([fila for _, fila in resultados])
+    mejor = int(tabla['silueta'].fillna(-np.inf).to_numpy().argmax())
+    tabla['mejor'] = tabla.index == mejor
+    return resultados[mejor][0], tabla
+
+
+def comparar_clasificadores(fabricas: Dict[str, Callable[[], Any]], X_train: np.ndarray, y_train: np.ndarray,
+                            X_test: np.ndarray, y_test: np.ndarray, n_consultas: int = 200,
+                            semilla: int = 42) -> pd.DataFrame:
+    """
+    Entrena cada clasificador sobre la misma partición y compara su costo y precisión
+
+    La latencia por inmueble se mide con el motor que usa la predicción de
+    un inmueble: el bosque aplanado si el clasificador es un bosque de
+    árboles, o su propio predict_proba en otro caso.
+
+    Args:
+        fabricas: Nombre y función que crea cada clasificador sin entrenar
+        n_consultas: Inmuebles del conjunto de prueba usados para la latencia
+
+    Returns:
+        Tabla con una fila por clasificador: segundos de entrenamiento,
+        latencia p50/p99 en ms, filas por segundo en lote, tamaño en MB y
+        precisión
+    """
+    rng = np.random.default_rng(semilla)
+    consultas = [X_test[i:i + 1] for i in rng.integers(0, len(X_test), n_consultas)]
+
+    filas = []
+    for nombre, fabrica in fabricas.items():
+        modelo = fabrica()
+        inicio = time.perf_counter()
+        modelo.fit(X_train, y_train)
+        segundos = time.perf_counter() - inicio
+
+        try:
+            motor = BosqueAplanado(modelo)
+        except ValueError:
+            motor = modelo
+        motor.predict_proba(consultas[0])
+        latencias = np.empty(len(consultas))
+        for i, fila in enumerate(consultas):
+            inicio = time.perf_counter()
+            motor.predict_proba(fila)
+            latencias[i] = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        y_pred = modelo.predict(X_test)
+        segundos_lote = time.perf_counter() - inicio
+
+        filas.append({
+            'backend': nombre,
+            'segundos_entrenamiento': segundos,
+            'latencia_p50_ms': float(np.percentile(latencias, 50)),
+            'latencia_p99_ms': float(np.percentile(latencias, 99)),
+            'filas_por_segundo': len(X_test) / segundos_lote if segundos_lote > 0 else float('inf'),
+            'tamano_mb': len(pickle.dumps(modelo)) / 1e6,
+            'accuracy': float(accuracy_score(y_test, y_pred))
+        })
+
+    return pd.DataFrame(filas)
+
+
+def repartir_cpu(n_tareas: int, n_procesos: int = -1) -> Tuple[int, int]:
+    """
+    Reparte los núcleos entre procesos e hilos por proceso sin sobresuscribir
+
+    Returns:
+        (procesos, hilos por proceso), con procesos * hilos <= núcleos
+    """
+    nucleos = joblib.cpu_count()
+    procesos = nucleos if n_procesos == -1 else n_procesos
+    if procesos < 1:
+        raise ValueError("n_procesos debe ser -1 o mayor o igual que 1")
+    procesos = max(1, min(procesos, n_tareas, nucleos))
+    return procesos, max(1, nucleos // procesos)
+
+
+def _limitar_hilos(modelo: Any, hilos: int) -> Any:
+    """
+    Fija n_jobs del modelo (si lo tiene) al número de hilos del proceso
+    """
+    if 'n_jobs' in modelo.get_params():
+        modelo.set_params(n_jobs=hilos)
+    return modelo
+
+
+@contextmanager
+def matrices_compartidas(**arreglos: np.ndarray) -> Iterator[Dict[str, str]]:
+    """
+    Escribe cada arreglo una sola vez en una carpeta temporal y entrega sus rutas
+
+    Los procesos abren las rutas con joblib.load(ruta, mmap_mode='r') y
+    comparten las páginas en lugar de recibir una copia. La carpeta se
+    borra al salir.
+    """
+    carpeta = tempfile.mkdtemp(prefix='matrices_compartidas_')
+    try:
+        rutas = {}
+        for nombre, arreglo in arreglos.items():
+            rutas[nombre] = os.path.join(carpeta, f'{nombre}.joblib')
+            joblib.dump(np.ascontiguousarray(arreglo), rutas[nombre])
+        yield rutas
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def asignar_folds(y: np.ndarray, n_folds: int, semilla: int = 42) -> np.ndarray:
+    """
+    Fold de prueba (0 a n_folds - 1) de cada fila, estratificado por y
+
+    Un solo arreglo de enteros pequeños describe todas las particiones, en
+    lugar de enviar las posiciones de cada fold a cada proceso.
+    """
+    if n_folds < 2:
+        raise ValueError("n_folds debe ser mayor o igual que 2")
+    folds = np.empty(len(y), dtype=np.int8 if n_folds < 128 else np.int32)
+    divisor = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=semilla)
+    for fold, (_, filas_test) in enumerate(divisor.split(np.zeros(len(y)), y)):
+        folds[filas_test] = fold
+    return folds
+
+
+def _evaluar_fold(fabrica: Callable[[], Any], ruta_X: str, ruta_y: str, ruta_folds: str, fold: int,
+                  hilos: int, parametros: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Entrena y evalúa un fold leyendo la matriz compartida en modo solo lectura
+    """
+    X = joblib.load(ruta_X, mmap_mode='r')
+    y = joblib.load(ruta_y, mmap_mode='r')
+    folds = joblib.load(ruta_folds, mmap_mode='r')
+    filas_train = np.flatnonzero(folds != fold)
+    filas_test = np.flatnonzero(folds == fold)
+
+    with threadpool_limits(limits=hilos):
+        # El scaler se ajusta solo con las filas de entrenamiento del fold
+        scaler = StandardScaler()
+        X_train = scaler.fit_transform(X[filas_train])
+        X_test = scaler.transform(X[filas_test])
+
+        modelo = fabrica()
+        if parametros:
+            modelo.set_params(**parametros)
+        modelo = _limitar_hilos(modelo, hilos)
+        inicio = time.perf_counter()
+        modelo.fit(X_train, y[filas_train])
+        segundos = time.perf_counter() - inicio
+        y_pred = modelo.predict(X_test)
+
+    return {
+        'fold': fold + 1,
+        'filas_train': len(filas_train),
+        'filas_test': len(filas_test),
+        'accuracy': float(accuracy_score(y[filas_test], y_pred)),
+        'f1_macro': float(f1_score(y[filas_test], y_pred, average='macro')),
+        'segundos_entrenamiento': segundos
+    }
+
+
+def validacion_cruzada(fabrica: Callable[[], Any], X: np.ndarray, y: np.ndarray, n_folds: int = 5,
+                       n_procesos: int = -1, semilla: int = 42) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Validación cruzada estratificada con un fold por proceso
+
+    La matriz sin escalar y el objetivo se escriben una sola vez en archivos
+    que cada proceso abre como memmap de solo lectura, en lugar de copiarlos
+    a cada uno. Los procesos y los hilos de cada modelo (n_jobs y BLAS/OpenMP)
+    se reparten para que su producto no supere los núcleos disponibles.
+
+    Args:
+        fabrica: Función que crea el clasificador sin entrenar
+        X: Matriz de características sin escalar
+        y: Objetivo (etiquetas o códigos)
+        n_folds: Número de folds (cada clase necesita al menos n_folds filas)
+        n_procesos: Procesos del pool (-1: todos los núcleos)
+
+    Returns:
+        (tabla con una fila por fold, resumen con media y desviación de cada
+        métrica, procesos, hilos por proceso y segundos totales)
+    """
+    # Códigos enteros: un arreglo de objetos no se puede abrir como memmap
+    y = np.unique(np.asarray(y), return_inverse=True)[1]
+    folds = asignar_folds(y, n_folds, semilla)
+    procesos, hilos = repartir_cpu(n_folds, n_procesos)
+
+    inicio = time.perf_counter()
+    with matrices_compartidas(X=X, y=y, folds=folds) as rutas:
+        filas = Parallel(n_jobs=procesos, backend='loky')(
+            delayed(_evaluar_fold)(fabrica, rutas['X'], rutas['y'], rutas['folds'], fold, hilos)
+            for fold in range(n_folds)
+        )
+
+    tabla = pd.DataFrame(filas)
+    resumen = {'n_folds': n_folds, 'procesos': procesos, 'hilos_por_proceso': hilos,
+               'segundos': time.perf_counter() - inicio}
+    for metrica in ('accuracy', 'f1_macro'):
+        resumen[f'{metrica}_media'] = float(tabla[metrica].mean())
+        resumen[f'{metrica}_desviacion'] = float(tabla[metrica].std(ddof=0))
+    return tabla, resumen
+
+
+def generar_configuraciones(espacio: Dict[str, Any], modo: str = 'grid', n_iteraciones: int = 20,
+                            semilla: int = 42) -> List[Dict[str, Any]]:
+    """
+    Configuraciones de una búsqueda: todas las combinaciones ('grid') o
+    n_iteraciones al azar ('random')
+
+    En modo 'random' cada valor puede ser una lista o una distribución de
+    scipy.stats (con rvs).
+    """
+    try:
+        if modo == 'grid':
+            return list(ParameterGrid(espacio))
+        if modo == 'random':
+            return list(ParameterSampler(espacio, n_iter=n_iteraciones, random_state=semilla))
+    except TypeError as e:
+        raise ValueError(f"Espacio de búsqueda inválido: {e}")
+    raise ValueError("modo debe ser 'grid' o 'random'")
+
+
+def buscar_por_rondas(configuraciones: List[Dict[str, Any]],
+                      evaluar_ronda: Callable[[Dict[str, Any], int, int], Tuple[float, float]],
+                      n_rondas: int, margen: float = 0.02, acumular: str = 'media',
+                      n_procesos: int = -1) -> pd.DataFrame:
+    """
+    Evalúa configuraciones por rondas y abandona las claramente peores
+
+    En cada ronda las configuraciones vivas se evalúan en un pool de
+    procesos que se reutiliza entre rondas. Antes de la última, se abandonan
+    las que quedan más de margen por debajo de la mejor, de modo que el resto
+    del presupuesto se gasta en las prometedoras.
+
+    Args:
+        configuraciones: Parámetros de cada candidato
+        evaluar_ronda: evaluar_ronda(parametros, ronda, hilos) retorna
+            (puntaje, segundos); debe poder enviarse a otro proceso (función
+            de módulo o functools.partial de una)
+        n_rondas: Rondas por configuración
+        margen: Distancia a la mejor a partir de la cual se abandona
+        acumular: 'media' de las rondas (folds) o 'ultima' ronda (muestras
+            crecientes)
+        n_procesos: Procesos del pool (-1: todos los núcleos)
+
+    Returns:
+        Tabla ordenada por puntaje con los parámetros, 'configuracion'
+        (posición en configuraciones), 'puntaje', 'rondas', 'abandonada',
+        'segundos' y 'mejor'
+    """
+    if not configuraciones:
+        raise ValueError("No hay configuraciones que evaluar")
+    if n_rondas < 1:
+        raise ValueError("n_rondas debe ser mayor o igual que 1")
+    if acumular not in ('media', 'ultima'):
+        raise ValueError("acumular debe ser 'media' o 'ultima'")
+
+    procesos, hilos = repartir_cpu(len(configuraciones), n_procesos)
+    puntajes = [[] for _ in configuraciones]
+    segundos = np.zeros(len(configuraciones))
+    vivas = list(range(len(configuraciones)))
+
+    def puntaje(i: int) -> float:
+        valores = puntajes[i]
+        if not valores:
+            return float('nan')
+        return float(np.mean(valores)) if acumular == 'media' else valores[-1]
+
+    with Parallel(n_jobs=procesos, backend='loky') as pool:
+        for ronda in range(n_rondas):
+            resultados = pool(delayed(evaluar_ronda)(configuraciones[i], ronda, hilos) for i in vivas)
+            for i, (valor, duracion) in zip(vivas, resultados):
+                puntajes[i].append(float(valor))
+                segundos[i] += duracion
+
+            if ronda < n_rondas - 1:
+                # Un puntaje NaN (ej. silueta con un solo grupo) cuenta como el peor
+                actuales = np.nan_to_num([puntaje(i) for i in vivas], nan=-np.inf)
+                vivas = [i for i, valor in zip(vivas, actuales) if valor >= actuales.max() - margen]
+
+    tabla = pd.DataFrame(configuraciones)
+    tabla['configuracion'] = np.arange(len(configuraciones))
+    tabla['puntaje'] = [puntaje(i) for i in range(len(configuraciones))]
+    tabla['rondas'] = [len(valores) for valores in puntajes]
+    tabla['abandonada'] = tabla['rondas'] < n_rondas
+    tabla['segundos'] = segundos
+    completas = tabla['puntaje'].where(~tabla['abandonada']).fillna(-np.inf)
+    tabla['mejor'] = tabla.index == int(completas.to_numpy().argmax())
+    return tabla.sort_values(['abandonada', 'puntaje'], ascending=[True, False],
+                             na_position='last').reset_index(drop=True)
+
+
+def _ronda_clasificacion(fabrica: Callable[[], Any], ruta_X: str, ruta_y: str, ruta_folds: str,
+                         parametros: Dict[str, Any], ronda: int, hilos: int) -> Tuple[float, float]:
+    fila = _evaluar_fold(fabrica, ruta_X, ruta_y, ruta_folds, ronda, hilos, parametros)
+    return fila['accuracy'], fila['segundos_entrenamiento']
+
+
+def buscar_clasificador(fabrica: Callable[[], Any], configuraciones: List[Dict[str, Any]],
+                        X: np.ndarray, y: np.ndarray, n_folds: int = 3, margen: float = 0.02,
+                        n_procesos: int = -1, semilla: int = 42) -> pd.DataFrame:
+    """
+    Busca los parámetros del clasificador con validación cruzada por rondas
+
+    Cada ronda es un fold (ver validacion_cruzada): el puntaje es la
+    precisión media de los folds evaluados y las configuraciones que quedan
+    más de margen por debajo de la mejor no se evalúan en los folds
+    restantes. La matriz se escribe una sola vez para toda la búsqueda.
+    """
+    for parametros in configuraciones:
+        fabrica().set_params(**parametros)
+    y = np.unique(np.asarray(y), return_inverse=True)[1]
+    folds = asignar_folds(y, n_folds, semilla)
+
+    with matrices_compartidas(X=X, y=y, folds=folds) as rutas:
+        evaluar_ronda = partial(_ronda_clasificacion, fabrica, rutas['X'], rutas['y'], rutas['folds'])
+        return buscar_por_rondas(configuraciones, evaluar_ronda, n_folds, margen, 'media', n_procesos)
+
+
+def _ronda_clustering(ruta_X: str, ruta_orden: str, n_rondas: int, tamano_muestra: int, semilla: int,
+                      parametros: Dict[str, Any], ronda: int, hilos: int) -> Tuple[float, float]:
+    X = joblib.load(ruta_X, mmap_mode='r')
+    orden = joblib.load(ruta_orden, mmap_mode='r')
+    filas = np.sort(orden[:len(orden) * (ronda + 1) // n_rondas])
+
+    opciones = dict(parametros)
+    k = opciones.pop('n_clusters')
+    with threadpool_limits(limits=hilos):
+        _, fila = evaluar_k(X[filas], k, tamano_muestra=tamano_muestra, semilla=semilla, **opciones)
+    return fila['silueta'], fila['segundos']
+
+
+def buscar_clustering(configuraciones: List[Dict[str, Any]], X: np.ndarray, n_rondas: int = 3,
+                      margen: float = 0.02, n_procesos: int = -1, tamano_muestra: int = 10000,
+                      semilla: int = 42) -> pd.DataFrame:
+    """
+    Busca los parámetros del clustering (n_clusters, incremental, tamano_lote)
+    con muestras crecientes
+
+    La ronda r entrena con una muestra aleatoria de r/n_rondas de las filas
+    (anidadas; la última es la matriz completa) y puntúa con la silueta
+    estimada (ver evaluar_k). Las configuraciones más de margen por debajo
+    de la mejor no pasan a la muestra siguiente.
+    """
+    if n_rondas < 1:
+        raise ValueError("n_rondas debe ser mayor o igual que 1")
+    permitidos = {'n_clusters', 'incremental', 'tamano_lote'}
+    for parametros in configuraciones:
+        if 'n_clusters' not in parametros or set(parametros) - permitidos:
+            raise ValueError(f"Cada configuración de clustering requiere 'n_clusters' y solo admite "
+                             f"{sorted(permitidos)}: {parametros}")
+        if not 2 <= parametros['n_clusters'] < len(X) // n_rondas:
+            raise ValueError(f"n_clusters debe estar entre 2 y {len(X) // n_rondas - 1}")
+    orden = np.random.default_rng(semilla).permutation(len(X))
+
+    with matrices_compartidas(X=X, orden=orden) as rutas:
+        evaluar_ronda = partial(_ronda_clustering, rutas['X'], rutas['orden'], n_rondas, tamano_muestra, semilla)
+        return buscar_por_rondas(configuraciones, evaluar_ronda, n_rondas, margen, 'ultima', n_procesos)
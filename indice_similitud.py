@@ -0,0 +1,203 @@
+"""
+Índices de similitud para el modelo de inmuebles
+Búsqueda de vecinos más cercanos sobre la matriz de características escalada
+"""
+
+import numpy as np
+from sklearn.neighbors import KDTree
+from typing import Tuple
+
+
+# Filas procesadas por trozo al cuantizar y al recorrer las listas invertidas
+TAMANO_TROZO = 65536
+
+
+class IndiceVecinos:
+    """
+    Índice de vecinos más cercanos con un KDTree por cluster
+
+    Cada árbol contiene solo las filas de su cluster, de modo que restringir
+    la búsqueda al cluster del inmueble es una única consulta. La búsqueda
+    sin restricción consulta todos los árboles y combina los resultados, lo
+    que da los k vecinos exactos de todo el dataset.
+    """
+
+    def __init__(self, X: np.ndarray, grupos: np.ndarray, leaf_size: int = 40):
+        # Cada árbol copia (en float64) solo las filas de su cluster
+        X = np.asarray(X)
+        grupos = np.asarray(grupos)
+        if len(X) != len(grupos):
+            raise ValueError("La matriz de características y los grupos deben tener el mismo número de filas")
+
+        self.n_filas = len(X)
+        self.grupos = grupos
+        self.arboles = {}
+        for grupo in np.unique(grupos):
+            posiciones = np.flatnonzero(grupos == grupo)
+            self.arboles[grupo] = (KDTree(X[posiciones], leaf_size=leaf_size), posiciones)
+
+    def punto(self, posicion: int) -> np.ndarray:
+        """
+        Retorna el vector escalado de una fila (leído del árbol de su cluster)
+        """
+        arbol, posiciones = self.arboles[self.grupos[posicion]]
+        return np.asarray(arbol.data)[np.searchsorted(posiciones, posicion)]
+
+    def vecinos(self, posicion: int, k: int, mismo_grupo: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna las posiciones y distancias euclídeas de los k vecinos más
+        cercanos de una fila, excluyendo la propia fila
+
+        Los resultados se ordenan por distancia y, en empate, por posición.
+        """
+        if not 0 <= posicion < self.n_filas:
+            raise ValueError(f"ID de inmueble inválido: {posicion}")
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        punto = self.punto(posicion)[np.newaxis, :]
+        grupos = [self.grupos[posicion]] if mismo_grupo else list(self.arboles)
+
+        candidatos = []
+        distancias = []
+        for grupo in grupos:
+            arbol, posiciones = self.arboles[grupo]
+            # Se pide un vecino extra porque la propia fila suele ser el primero
+            distancia, indice = arbol.query(punto, k=min(k + 1, len(posiciones)))
+            candidatos.append(posiciones[indice[0]])
+            distancias.append(distancia[0])
+
+        candidatos = np.concatenate(candidatos)
+        distancias = np.concatenate(distancias)
+        otros = candidatos != posicion
+        candidatos, distancias = candidatos[otros], distancias[otros]
+
+        orden = np.lexsort((candidatos, distancias))[:k]
+        return candidatos[orden], distancias[orden]
+
+
+class IndiceIVF:
+    """
+    Índice aproximado de vecinos de tipo IVF (archivo invertido)
+
+    Los centroides del clustering actúan como cuantizador grueso: cada fila se
+    guarda en la lista de su cluster y solo se almacena su residuo respecto al
+    centroide, cuantizado a 8 bits por dimensión (un byte por característica
+    en lugar de ocho). Una consulta recorre las n_sondas listas cuyos
+    centroides están más cerca del punto; más sondas dan mayor recall a
+    cambio de más latencia.
+    """
+
+    def __init__(self, X: np.ndarray, centroides: np.ndarray, grupos: np.ndarray):
+        # X puede ser float32: los residuos se calculan en float64 por trozos
+        X = np.asarray(X)
+        grupos = np.asarray(grupos, dtype=np.int64)
+        if len(X) != len(grupos):
+            raise ValueError("La matriz de características y los grupos deben tener el mismo número de filas")
+
+        self.centroides = np.asarray(centroides, dtype=np.float64)
+        self.n_filas, self.dimension = X.shape
+        # El grupo de cada fila cabe en int16 salvo con más de 32767 centroides
+        tipo_grupo = np.int16 if len(self.centroides) <= np.iinfo(np.int16).max else np.int32
+        self.grupos = grupos.astype(tipo_grupo)
+
+        # Rango de los residuos por dimensión, en trozos para no duplicar X
+        self.minimo = np.full(self.dimension, np.inf)
+        maximo = np.full(self.dimension, -np.inf)
+        for inicio in range(0, self.n_filas, TAMANO_TROZO):
+            residuos = self._residuos(X, inicio)
+            self.minimo = np.minimum(self.minimo, residuos.min(axis=0))
+            maximo = np.maximum(maximo, residuos.max(axis=0))
+        if self.n_filas == 0:
+            self.minimo = maximo = np.zeros(self.dimension)
+        self.escala = np.where(maximo > self.minimo, (maximo - self.minimo) / 255, 1.0)
+
+        codigos = np.empty((self.n_filas, self.dimension), dtype=np.uint8)
+        for inicio in range(0, self.n_filas, TAMANO_TROZO):
+            cuantizados = np.rint((self._residuos(X, inicio) - self.minimo) / self.escala)
+            codigos[inicio:inicio + TAMANO_TROZO] = np.clip(cuantizados, 0, 255)
+
+        # Listas invertidas contiguas: filas ordenadas por cluster (y por posición dentro de él)
+        tipo_posicion = np.int32 if self.n_filas <= np.iinfo(np.int32).max else np.int64
+        self.orden = np.argsort(grupos, kind='stable').astype(tipo_posicion)
+        self.inicios = np.searchsorted(grupos[self.orden], np.arange(len(self.centroides) + 1))
+        self.codigos = codigos[self.orden]
+        self.normas = np.empty(self.n_filas, dtype=np.float32)
+        escala = self.escala.astype(np.float32)
+        for inicio in range(0, self.n_filas, TAMANO_TROZO):
+            decodificados = self.codigos[inicio:inicio + TAMANO_TROZO] * escala
+            self.normas[inicio:inicio + TAMANO_TROZO] = np.einsum('ij,ij->i', decodificados, decodificados)
+
+    def _residuos(self, X: np.ndarray, inicio: int) -> np.ndarray:
+        fin = min(inicio + TAMANO_TROZO, self.n_filas)
+        return X[inicio:fin] - self.centroides[self.grupos[inicio:fin]]
+
+    @property
+    def bytes_por_vector(self) -> int:
+        """
+        Memoria por fila: códigos de 8 bits, norma, posición y grupo
+        """
+        return (self.codigos.itemsize * self.dimension + self.normas.itemsize
+                + self.orden.itemsize + self.grupos.itemsize)
+
+    def punto(self, posicion: int) -> np.ndarray:
+        """
+        Reconstruye el vector (aproximado) de una fila a partir de su código
+        """
+        grupo = self.grupos[posicion]
+        lista = self.orden[self.inicios[grupo]:self.inicios[grupo + 1]]
+        fila = self.inicios[grupo] + np.searchsorted(lista, posicion)
+        return self.centroides[grupo] + self.minimo + self.codigos[fila] * self.escala
+
+    def vecinos(self, posicion: int, k: int, mismo_grupo: bool = False, n_sondas: int = 1,
+                punto: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna las posiciones y distancias aproximadas de los k vecinos más
+        cercanos de una fila, excluyendo la propia fila
+
+        Args:
+            posicion: Fila de referencia
+            k: Número de vecinos
+            mismo_grupo: Si es True solo se recorre la lista del cluster de la fila
+            n_sondas: Número de listas a recorrer (ignorado con mismo_grupo)
+            punto: Vector exacto de la fila; por defecto se reconstruye del código
+        """
+        if not 0 <= posicion < self.n_filas:
+            raise ValueError(f"ID de inmueble inválido: {posicion}")
+        if n_sondas < 1:
+            raise ValueError("n_sondas debe ser mayor o igual que 1")
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        punto = self.punto(posicion) if punto is None else np.asarray(punto, dtype=np.float64)
+        if mismo_grupo:
+            listas = [self.grupos[posicion]]
+        else:
+            distancias_centroides = ((self.centroides - punto) ** 2).sum(axis=1)
+            listas = np.argsort(distancias_centroides, kind='stable')[:n_sondas]
+
+        candidatos = [np.empty(0, dtype=np.int64)]
+        distancias = [np.empty(0, dtype=np.float32)]
+        for lista in listas:
+            # ||y - e*c||² = ||y||² - 2 c·(e*y) + ||e*c||², con y = punto - centroide - mínimo
+            y = punto - self.centroides[lista] - self.minimo
+            pesos = (self.escala * y).astype(np.float32)
+            norma_y = np.float32(y @ y)
+            for inicio in range(self.inicios[lista], self.inicios[lista + 1], TAMANO_TROZO):
+                fin = min(inicio + TAMANO_TROZO, self.inicios[lista + 1])
+                d2 = norma_y - 2 * (self.codigos[inicio:fin] @ pesos) + self.normas[inicio:fin]
+                posiciones = self.orden[inicio:fin]
+                d2[posiciones == posicion] = np.inf
+                if len(d2) > k:
+                    mejores = np.argpartition(d2, k - 1)[:k]
+                    d2, posiciones = d2[mejores], posiciones[mejores]
+                candidatos.append(posiciones)
+                distancias.append(d2)
+
+        candidatos = np.concatenate(candidatos)
+        distancias = np.concatenate(distancias)
+        validos = np.isfinite(distancias)
+        candidatos, distancias = candidatos[validos], distancias[validos]
+
+        orden = np.lexsort((candidatos, distancias))[:k]
+        return candidatos[orden], np.sqrt(np.maximum(distancias[orden], 0)).astype(np.float64)
@@ -0,0 +1,156 @@
+"""
+Motor de inferencia para bosques de árboles de decisión
+Exporta un RandomForestClassifier entrenado a arreglos contiguos y los recorre con NumPy
+"""
+
+import numpy as np
+from typing import Any
+
+
+# Máximo de elementos (árboles x filas) recorridos a la vez; grupos pequeños
+# mantienen los nodos de cada árbol en caché
+ELEMENTOS_POR_GRUPO = 1 << 14
+
+# A partir de este tamaño de lote el recorrido de sklearn (compilado) es más
+# rápido que el vectorizado; por debajo domina su costo fijo por llamada
+FILAS_MAX_APLANADO = 1000
+
+
+class BosqueAplanado:
+    """
+    Bosque de árboles exportado a arreglos contiguos
+
+    Todos los nodos de todos los árboles se concatenan en arreglos contiguos
+    (característica, umbral, hijo izquierdo, hijo derecho, dirección de los
+    faltantes y valor por clase). Las hojas apuntan a sí mismas, de modo que
+    el recorrido es un número fijo de pasos (la profundidad máxima) de
+    operaciones vectorizadas sobre todas las filas de un grupo de árboles a
+    la vez, sin llamadas de Python por nodo.
+
+    predict_proba() reproduce exactamente el resultado de sklearn: convierte X
+    a float32 como sklearn, compara con los mismos umbrales y suma las hojas
+    árbol por árbol en el orden de estimators_ antes de dividir. Los valores
+    de las hojas se normalizan por fila, ya que scikit-learn < 1.4 guarda
+    conteos en tree_.value en lugar de fracciones.
+    """
+
+    def __init__(self, modelo: Any):
+        arboles = getattr(modelo, 'estimators_', None)
+        if not arboles or any(not hasattr(arbol, 'tree_') for arbol in arboles):
+            raise ValueError("El modelo debe ser un bosque de árboles de decisión entrenado")
+        if getattr(modelo, 'n_outputs_', 1) != 1:
+            raise ValueError("Solo se admiten bosques con una única salida")
+
+        self.classes_ = modelo.classes_
+        self.n_clases = len(self.classes_)
+        self.n_caracteristicas = modelo.n_features_in_
+        self.n_arboles = len(arboles)
+
+        tamanos = [arbol.tree_.node_count for arbol in arboles]
+        self.raices = np.concatenate([[0], np.cumsum(tamanos)[:-1]]).astype(np.int32)
+        self.profundidad = max(arbol.tree_.max_depth for arbol in arboles)
+
+        caracteristicas, umbrales, izquierdos, derechos, valores = [], [], [], [], []
+        faltantes_izquierda = []
+        for raiz, arbol in zip(self.raices, arboles):
+            tree = arbol.tree_
+            hojas = tree.children_left < 0
+            nodos = np.arange(tree.node_count, dtype=np.int32) + raiz
+
+            caracteristicas.append(np.where(hojas, 0, tree.feature).astype(np.int32))
+            umbrales.append(tree.threshold.astype(np.float64))
+            izquierdos.append(np.where(hojas, nodos, tree.children_left + raiz).astype(np.int32))
+            derechos.append(np.where(hojas, nodos, tree.children_right + raiz).astype(np.int32))
+            valores.append(self._probabilidades_hojas(tree.value[:, 0, :self.n_clases]))
+            faltantes_izquierda.append(np.asarray(getattr(tree, 'missing_go_to_left',
+                                                          np.zeros(tree.node_count)), dtype=bool))
+
+        self.caracteristica = np.ascontiguousarray(np.concatenate(caracteristicas))
+        self.umbral = np.ascontiguousarray(np.concatenate(umbrales))
+        self.izquierdo = np.ascontiguousarray(np.concatenate(izquierdos))
+        self.derecho = np.ascontiguousarray(np.concatenate(derechos))
+        self.valor = np.ascontiguousarray(np.concatenate(valores), dtype=np.float64)
+        self.faltante_izquierda = np.concatenate(faltantes_izquierda)
+
+    @staticmethod
+    def _probabilidades_hojas(valor: np.ndarray) -> np.ndarray:
+        """
+        Valores de las hojas como probabilidades por clase
+
+        Desde scikit-learn 1.4 tree_.value ya guarda fracciones; en versiones
+        anteriores guarda conteos (ponderados) y es el predict_proba de cada
+        árbol el que divide por la suma de la fila. Se divide igual aquí para
+        que el resultado coincida en ambas versiones.
+        """
+        suma = valor.sum(axis=1, keepdims=True)
+        if np.allclose(suma, 1.0):
+            return valor
+        suma[suma == 0] = 1.0
+        return valor / suma
+
+    @property
+    def n_nodos(self) -> int:
+        return len(self.umbral)
+
+    def hojas(self, X: np.ndarray) -> np.ndarray:
+        """
+        Retorna el nodo hoja (índice global) de cada árbol para cada fila,
+        con forma (n_arboles, n_filas)
+        """
+        X = self._preparar(X)
+        return self._recorrer(X, self.raices)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidades por clase, idénticas a las de modelo.predict_proba(X)
+        """
+        X = self._preparar(X)
+        n_filas = len(X)
+        proba = np.zeros((n_filas, self.n_clases), dtype=np.float64)
+
+        # Grupos de árboles para acotar la memoria con lotes grandes
+        por_grupo = max(1, ELEMENTOS_POR_GRUPO // max(n_filas, 1))
+        for inicio in range(0, self.n_arboles, por_grupo):
+            hojas = self._recorrer(X, self.raices[inicio:inicio + por_grupo])
+            # Suma árbol por árbol, en el mismo orden que sklearn
+            if n_filas > 64:
+                for hojas_arbol in hojas:
+                    proba += self.valor[hojas_arbol]
+            else:
+                # La suma sobre el primer eje también es secuencial y evita un bucle por árbol
+                proba = np.concatenate([proba[np.newaxis], self.valor[hojas]]).sum(axis=0)
+
+        proba /= self.n_arboles
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Clase predicha, idéntica a la de modelo.predict(X)
+        """
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def _preparar(self, X: np.ndarray) -> np.ndarray:
+        # sklearn evalúa los árboles sobre float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_caracteristicas:
+            raise ValueError(f"Se esperaban {self.n_caracteristicas} características, "
+                             f"se recibieron {X.shape[1]}")
+        return X
+
+    def _recorrer(self, X: np.ndarray, raices: np.ndarray) -> np.ndarray:
+        n_filas, n_columnas = X.shape
+        X_plano = X.ravel()
+        desplazamientos = (np.arange(n_filas, dtype=np.int64) * n_columnas)[np.newaxis, :]
+        hay_faltantes = bool(np.isnan(X_plano).any())
+
+        nodos = np.repeat(raices[:, np.newaxis].astype(np.int64), n_filas, axis=1)
+        for _ in range(self.profundidad):
+            valores = X_plano[desplazamientos + self.caracteristica[nodos]]
+            izquierda = valores <= self.umbral[nodos]
+            if hay_faltantes:
+                # Igual que sklearn: un NaN sigue la dirección aprendida para faltantes
+                izquierda |= np.isnan(valores) & self.faltante_izquierda[nodos]
+            nodos = np.where(izquierda, self.izquierdo[nodos], self.derecho[nodos])
+        return nodos
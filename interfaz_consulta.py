@@ -35,6 +35,7 @@ class InterfazConsulta:
         print("\n📂 Cargando dataset...")
         self.modelo.cargar_dataset('dataset_inmuebles.csv')
         self.modelo.preprocesar_datos()
+        self.modelo.construir_indice_rango()
         
         # Verificar si existe modelo entrenado
         if os.path.exists('modelo_inmuebles.pkl'):
@@ -73,10 +74,10 @@ class InterfazConsulta:
         Búsqueda filtrada por tipo de inmueble
         """
         print("\n📋 Tipos disponibles:")
-        tipos = self.modelo.df['tipo'].unique()
+        conteo = self.modelo.calcular_facetas(['tipo'])['tipo']
+        tipos = list(conteo)
         for i, tipo in enumerate(tipos, 1):
-            count = len(self.modelo.df[self.modelo.df['tipo'] == tipo])
-            print(f"{i}. {tipo} ({count} disponibles)")
+            print(f"{i}. {tipo} ({conteo[tipo]} disponibles)")
         
         seleccion = input("\nSeleccione el número del tipo: ")
         try:
@@ -117,11 +118,12 @@ class InterfazConsulta:
         Búsqueda filtrada por ubicación
         """
         print("\n📍 Ubicaciones disponibles:")
-        ubicaciones = self.modelo.df['ubicacion'].unique()
+        conteo = self.modelo.calcular_facetas(['ubicacion'])['ubicacion']
+        precios_promedio = self.modelo.promedios_faceta('ubicacion', 'precio')
+        ubicaciones = list(conteo)
         for i, ubicacion in enumerate(ubicaciones, 1):
-            count = len(self.modelo.df[self.modelo.df['ubicacion'] == ubicacion])
-            precio_promedio = self.modelo.df[self.modelo.df['ubicacion'] == ubicacion]['precio'].mean()
-            print(f"{i}. {ubicacion} ({count} disponibles, precio promedio: ${precio_promedio:,.2f})")
+            print(f"{i}. {ubicacion} ({conteo[ubicacion]} disponibles, "
+                  f"precio promedio: ${precios_promedio.get(ubicacion, float('nan')):,.2f})")
         
         seleccion = input("\nSeleccione el número de la ubicación: ")
         try:
@@ -6,31 +6,126 @@ Utiliza Machine Learning para clasificar y filtrar propiedades según caracterí
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.cluster import KMeans
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
 import json
-from typing import Dict, List, Any, Optional
+import itertools
+import time
+from typing import Dict, List, Any, Optional, Tuple
+from motor_busqueda import (compilar_criterios, ejecutar_lote, seleccionar_top, calcular_facetas,
+                            promedios_faceta, calcular_skyline, IndiceBitmap, IndiceRango, IndiceHistogramas,
+                            IndicesBusqueda, EstadisticasColumnas)
+from indice_similitud import IndiceVecinos, IndiceIVF
+from inferencia_arboles import BosqueAplanado, FILAS_MAX_APLANADO
+from almacen_caracteristicas import AlmacenCaracteristicas, codificar_caracteristicas, imputar_medias
+from deriva_clustering import MonitorDeriva
+from evaluacion_modelos import (barrer_k, comparar_clasificadores, silueta_muestreada, validacion_cruzada,
+                                generar_configuraciones, buscar_clasificador, buscar_clustering)
+from entrenamiento_flujo import leer_trozos, EstadisticasFlujo, MuestraFondo, MuestraEstratificada
 import warnings
 warnings.filterwarnings('ignore')
 
 
+# Clasificadores disponibles para entrenar_modelo_clasificacion
+BACKENDS_CLASIFICACION = {
+    'random_forest': lambda: RandomForestClassifier(
+        n_estimators=100, max_depth=10, random_state=42, n_jobs=-1
+    ),
+    # Discretiza cada característica una vez en 255 bins y entrena sobre los
+    # histogramas: mucho más rápido que el bosque con millones de filas
+    'hist_gradient_boosting': lambda: HistGradientBoostingClassifier(
+        max_iter=200, learning_rate=0.1, max_bins=255, early_stopping='auto', random_state=42
+    ),
+    # Regresión logística por descenso de gradiente: admite partial_fit,
+    # lo que permite entrenar por trozos (ver entrenar_desde_archivo)
+    'sgd': lambda: SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+}
+
+# Categorías de crear_categorias_precio, en orden de cuartil
+ETIQUETAS_PRECIO = ['Económico', 'Medio', 'Alto', 'Premium']
+
+# Estratos por defecto de muestrear y curva_aprendizaje
+COLUMNAS_ESTRATO = ['categoria_precio', 'ciudad', 'tipo']
+
+# Identificadores: no describen al inmueble y crecen con cada alta, así que
+# no se usan como características del clustering (ni de la deriva)
+COLUMNAS_IDENTIFICADOR = ['id']
+
+# Tamaños de muestra por defecto de curva_aprendizaje
+TAMANOS_CURVA = [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000]
+
+
 class ModeloInmuebles:
     """
     Modelo de IA para análisis y categorización de inmuebles
     """
     
-    def __init__(self):
-        self.scaler = StandardScaler()
+    def __init__(self, n_hilos_busqueda: int = 1, similitud_aproximada: bool = False,
+                 n_sondas: int = 1, backend_clasificacion: str = 'random_forest'):
+        """
+        Args:
+            n_hilos_busqueda: Hilos usados para filtrar en categorizar_inmuebles.
+                Con 1 (por defecto) la búsqueda es serial
+            similitud_aproximada: Si es True, buscar_similares usa un índice
+                aproximado (IVF con residuos cuantizados a 8 bits) en lugar
+                del KDTree exacto
+            n_sondas: Listas del índice aproximado recorridas por consulta
+            backend_clasificacion: Clasificador usado por
+                entrenar_modelo_clasificacion (ver BACKENDS_CLASIFICACION):
+                'random_forest', 'hist_gradient_boosting' o 'sgd'
+        """
+        if backend_clasificacion not in BACKENDS_CLASIFICACION:
+            raise ValueError(f"Backend de clasificación desconocido: '{backend_clasificacion}'. "
+                             f"Opciones: {list(BACKENDS_CLASIFICACION)}")
+        self.scaler_clasificacion = StandardScaler()
+        self.scaler_clustering = StandardScaler()
         self.label_encoders = {}
         self.modelo_clasificacion = None
         self.modelo_clustering = None
+        self.monitor_deriva = None
+        self.barrido_clusters = None
+        self.bosque_aplanado = None
         self.caracteristicas_numericas = []
         self.caracteristicas_categoricas = []
+        self.columnas_clasificacion = None
+        self.columnas_clustering = None
         self.df = None
         self.categorias_precio = None
+        self.indice_bitmap = None
+        self.indice_rango = None
+        self.estadisticas = None
+        self.indice_histogramas = None
+        self.indice_vecinos = None
+        self.columnas_histograma = ['precio', 'area_m2', 'antiguedad_anos']
+        self._columnas_rango = None
+        self._columnas_derivadas = set()
+        self._df_indexado = None
+        self._almacen = None
+        self.n_hilos_busqueda = n_hilos_busqueda
+        self.similitud_aproximada = similitud_aproximada
+        self.n_sondas = n_sondas
+        self.backend_clasificacion = backend_clasificacion
+    
+    @property
+    def scaler(self):
+        """
+        Scaler del clasificador (o del clustering si no hay clasificador)
+        
+        Alias de compatibilidad: cada modelo tiene su propio scaler en
+        scaler_clasificacion y scaler_clustering. Asignarlo reemplaza ambos.
+        """
+        if self.modelo_clasificacion is None and self.modelo_clustering is not None:
+            return self.scaler_clustering
+        return self.scaler_clasificacion
+    
+    @scaler.setter
+    def scaler(self, scaler):
+        self.scaler_clasificacion = scaler
+        self.scaler_clustering = scaler
         
     def cargar_dataset(self, ruta_archivo: str = None, dataframe: pd.DataFrame = None):
         """
@@ -50,8 +145,11 @@ class ModeloInmuebles:
         else:
             raise ValueError("Debe proporcionar una ruta de archivo o un DataFrame")
         
+        self._columnas_derivadas = set()
         print(f"✓ Dataset cargado: {len(self.df)} inmuebles")
         print(f"✓ Columnas: {list(self.df.columns)}")
+        
+        self.reconstruir_indices()
         return self.df
     
     def analizar_dataset(self):
@@ -99,7 +197,7 @@ class ModeloInmuebles:
         
         # Identificar características numéricas y categóricas
         self.caracteristicas_numericas = self.df.select_dtypes(include=[np.number]).columns.tolist()
-        self.caracteristicas_categoricas = self.df.select_dtypes(include=['object']).columns.tolist()
+        self.caracteristicas_categoricas = self.df.select_dtypes(include=['object', 'string']).columns.tolist()
         
         # Remover columna objetivo de las características si existe
         if columna_objetivo and columna_objetivo in self.caracteristicas_numericas:
@@ -111,13 +209,190 @@ class ModeloInmuebles:
         for col in self.caracteristicas_categoricas:
             le = LabelEncoder()
             self.df[col + '_encoded'] = le.fit_transform(self.df[col].astype(str))
+            self._columnas_derivadas.add(col + '_encoded')
             self.label_encoders[col] = le
         
         print(f"✓ Características numéricas: {len(self.caracteristicas_numericas)}")
         print(f"✓ Características categóricas: {len(self.caracteristicas_categoricas)}")
         
+        # Los valores imputados cambian el contenido de las columnas indexadas
+        self.reconstruir_indices()
+        
         return self.df
     
+    def reconstruir_indices(self):
+        """
+        Construye los índices y estadísticas de búsqueda sobre el dataset actual
+        
+        Se ejecuta automáticamente al cargar y preprocesar; las columnas que
+        escribe el modelo ('cluster', 'categoria_precio') se actualizan solas.
+        Debe llamarse manualmente si se modifican en sitio columnas de self.df
+        desde fuera del modelo.
+        El índice de rango solo se reconstruye si fue solicitado antes con
+        construir_indice_rango(). También descarta el almacén de
+        características, que se vuelve a construir cuando se necesita.
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        self._almacen = None
+        self.indice_bitmap = IndiceBitmap(self.df)
+        self.estadisticas = EstadisticasColumnas(self.df, bitmap=self.indice_bitmap)
+        self.indice_histogramas = IndiceHistogramas(self.df, self.columnas_histograma)
+        self._df_indexado = self.df
+        print(f"✓ Índice de bitmaps: {len(self.indice_bitmap.columnas())} columnas")
+        
+        if self._columnas_rango is not None:
+            self._construir_rango()
+        
+        return self.indice_bitmap
+    
+    def construir_indice_rango(self, columnas: List[str] = None):
+        """
+        Construye el índice de rango (permutación ordenada) para columnas numéricas
+        
+        Una vez construido, los criterios '_min'/'_max' sobre esas columnas se
+        resuelven con búsqueda binaria en lugar de recorrer la columna.
+        
+        Args:
+            columnas: Columnas a indexar. Por defecto todas las numéricas
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        self._columnas_rango = list(columnas) if columnas is not None else []
+        
+        if self._df_indexado is not self.df:
+            self.reconstruir_indices()
+        else:
+            self._construir_rango()
+        
+        return self.indice_rango
+    
+    def _construir_rango(self):
+        if self._columnas_rango:
+            columnas = [col for col in self._columnas_rango if col in self.df.columns]
+        else:
+            # Las columnas '_encoded' son internas y no se usan como criterio
+            columnas = [col for col in self.df.select_dtypes(include=[np.number]).columns
+                        if not col.endswith('_encoded')]
+        self.indice_rango = IndiceRango(self.df, columnas)
+        print(f"✓ Índice de rango: {len(self.indice_rango.columnas())} columnas")
+    
+    def _asignar_columna(self, columna: str, valores):
+        """
+        Escribe una columna de self.df y actualiza sus entradas en los índices
+        
+        Sin esto, al sobrescribir una columna ya indexada (ej. 'cluster' al
+        reentrenar) los bitmaps, rangos, estadísticas e histogramas
+        conservarían los valores anteriores.
+        """
+        self.df[columna] = valores
+        self._columnas_derivadas.add(columna)
+        
+        if self._almacen is not None and columna in self._almacen.columnas:
+            self._almacen = None
+        if self.indice_bitmap is None or self._df_indexado is not self.df:
+            return
+        
+        self.indice_bitmap.actualizar_columna(self.df, columna)
+        self.estadisticas.actualizar_columna(self.df, columna, bitmap=self.indice_bitmap)
+        if columna in self.columnas_histograma:
+            self.indice_histogramas.actualizar_columna(self.df, columna)
+        if self.indice_rango is not None:
+            if self._columnas_rango:
+                indexada = columna in self._columnas_rango
+            else:
+                indexada = not columna.endswith('_encoded')
+            if indexada:
+                self.indice_rango.actualizar_columna(self.df, columna)
+    
+    def _datos_originales(self) -> pd.DataFrame:
+        """
+        self.df sin las columnas que escribe el modelo ('_encoded', 'cluster'
+        y 'categoria_precio' si la creó crear_categorias_precio)
+        """
+        return self.df.drop(columns=[col for col in self.df.columns if col in self._columnas_derivadas])
+    
+    def _indices_vigentes(self) -> Optional[IndicesBusqueda]:
+        """
+        Retorna los índices si corresponden al DataFrame actual
+        """
+        if self.indice_bitmap is None or self._df_indexado is not self.df:
+            return None
+        if self.indice_bitmap.n_filas != len(self.df):
+            return None
+        return IndicesBusqueda(bitmap=self.indice_bitmap, rango=self.indice_rango,
+                               estadisticas=self.estadisticas,
+                               histogramas=self.indice_histogramas)
+    
+    def _columnas_caracteristicas(self) -> List[str]:
+        caracteristicas_encoded = [col + '_encoded' for col in self.caracteristicas_categoricas]
+        return self.caracteristicas_numericas + caracteristicas_encoded
+    
+    def almacen_caracteristicas(self) -> AlmacenCaracteristicas:
+        """
+        Retorna el almacén de características del dataset actual
+        
+        La matriz codificada (float32 contigua) se construye una sola vez y la
+        reutilizan el entrenamiento, el clustering y la similitud. Se
+        reconstruye si cambia el DataFrame o las características.
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        columnas = self._columnas_caracteristicas()
+        if self._almacen is None or not self._almacen.vigente(self.df, columnas):
+            self._almacen = AlmacenCaracteristicas(self.df, columnas)
+            print(f"✓ Almacén de características: {self._almacen.matriz.shape[0]} x "
+                  f"{self._almacen.matriz.shape[1]} ({self._almacen.matriz.nbytes / 1e6:.1f} MB)")
+        return self._almacen
+    
+    def matriz_escalada(self, modelo: str = 'clustering') -> np.ndarray:
+        """
+        Matriz de características escalada (float32) de todo el dataset
+        
+        Args:
+            modelo: 'clasificacion' o 'clustering'; cada uno usa su propio scaler
+        
+        La matriz queda en caché en el almacén hasta que cambia el dataset o
+        se vuelve a entrenar el modelo.
+        """
+        modelos = {
+            'clasificacion': (self.scaler_clasificacion,
+                              self.columnas_clasificacion or self._columnas_similitud()),
+            'clustering': (self.scaler_clustering, self._columnas_similitud())
+        }
+        if modelo not in modelos:
+            raise ValueError(f"Modelo desconocido: '{modelo}'. Use 'clasificacion' o 'clustering'")
+        
+        scaler, columnas = modelos[modelo]
+        if not hasattr(scaler, 'mean_'):
+            raise ValueError(f"El scaler de '{modelo}' no está ajustado")
+        
+        almacen = self.almacen_caracteristicas()
+        X_scaled = almacen.escalada(modelo, scaler)
+        if X_scaled is None:
+            columnas_scaler = self._columnas_scaler(scaler, columnas)
+            X_scaled = almacen.escalar(modelo, scaler, columnas_scaler)
+            if columnas_scaler != list(columnas):
+                X_scaled = X_scaled[:, self._posiciones(columnas_scaler, columnas)]
+        return X_scaled
+    
+    @staticmethod
+    def _columnas_scaler(scaler, columnas: List[str]) -> List[str]:
+        # Los scalers de modelos anteriores se ajustaron sobre un DataFrame y
+        # conservan sus columnas de entrada
+        return list(getattr(scaler, 'feature_names_in_', columnas))
+    
+    @staticmethod
+    def _posiciones(columnas_scaler: List[str], columnas: List[str]) -> List[int]:
+        posicion = {col: i for i, col in enumerate(columnas_scaler)}
+        faltantes = [col for col in columnas if col not in posicion]
+        if faltantes:
+            raise ValueError(f"El scaler no contiene las características: {faltantes}")
+        return [posicion[col] for col in columnas]
+    
     def crear_categorias_precio(self, columna_precio: str = 'precio'):
         """
         Crea categorías de precio basadas en cuartiles
@@ -126,11 +401,11 @@ class ModeloInmuebles:
             raise ValueError(f"La columna '{columna_precio}' no existe en el dataset")
         
         # Crear categorías basadas en cuartiles
-        self.df['categoria_precio'] = pd.qcut(
+        self._asignar_columna('categoria_precio', pd.qcut(
             self.df[columna_precio], 
             q=4, 
-            labels=['Económico', 'Medio', 'Alto', 'Premium']
-        )
+            labels=ETIQUETAS_PRECIO
+        ))
         
         self.categorias_precio = {
             'Económico': self.df[self.df['categoria_precio'] == 'Económico'][columna_precio].max(),
@@ -145,97 +420,753 @@ class ModeloInmuebles:
         
         return self.categorias_precio
     
-    def entrenar_modelo_clasificacion(self, columna_objetivo: str = 'categoria_precio'):
+    def entrenar_modelo_clasificacion(self, columna_objetivo: str = 'categoria_precio',
+                                      backend: str = None, parametros: Dict[str, Any] = None):
         """
         Entrena un modelo de clasificación para categorizar inmuebles
+        
+        Args:
+            columna_objetivo: Columna a predecir
+            backend: Clasificador de BACKENDS_CLASIFICACION (default:
+                self.backend_clasificacion). Queda guardado como el backend
+                del modelo
+            parametros: Parámetros que reemplazan los del backend (ej.
+                {'n_estimators': 200, 'max_depth': 15})
         """
-        if self.df is None:
-            raise ValueError("Primero debe cargar y preprocesar un dataset")
+        backend = backend or self.backend_clasificacion
+        if backend not in BACKENDS_CLASIFICACION:
+            raise ValueError(f"Backend de clasificación desconocido: '{backend}'. "
+                             f"Opciones: {list(BACKENDS_CLASIFICACION)}")
         
-        if columna_objetivo not in self.df.columns:
-            raise ValueError(f"La columna objetivo '{columna_objetivo}' no existe")
+        datos = self._datos_clasificacion(columna_objetivo)
         
-        print(f"\n🤖 Entrenando modelo de clasificación...")
+        print(f"\n🤖 Entrenando modelo de clasificación ({backend})...")
         
-        # Preparar características
-        caracteristicas_encoded = [col + '_encoded' for col in self.caracteristicas_categoricas]
-        X_cols = self.caracteristicas_numericas + caracteristicas_encoded
+        self.columnas_clasificacion = datos['columnas']
+        self.scaler_clasificacion = datos['scaler']
+        if datos['codificador'] is not None:
+            self.label_encoders['objetivo'] = datos['codificador']
         
-        # Remover columna objetivo si está en las características
-        X_cols = [col for col in X_cols if col != columna_objetivo]
+        # Entrenar modelo
+        self.backend_clasificacion = backend
+        self.modelo_clasificacion = BACKENDS_CLASIFICACION[backend]()
+        if parametros:
+            self.modelo_clasificacion.set_params(**parametros)
+        self.modelo_clasificacion.fit(datos['X_train'], datos['y_train'])
         
-        X = self.df[X_cols]
-        y = self.df[columna_objetivo]
+        # Evaluar modelo
+        y_pred = self.modelo_clasificacion.predict(datos['X_test'])
+        accuracy = accuracy_score(datos['y_test'], y_pred)
         
-        # Codificar objetivo si es categórico
-        if y.dtype == 'object' or isinstance(y.dtype, pd.CategoricalDtype):
-            le_objetivo = LabelEncoder()
-            y = le_objetivo.fit_transform(y)
-            self.label_encoders['objetivo'] = le_objetivo
+        print(f"✓ Modelo entrenado con precisión: {accuracy:.2%}")
+        self.bosque_aplanado = None
+        if backend == 'random_forest':
+            self.exportar_bosque()
         
-        # Dividir datos
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        # Importancia de características (solo los bosques la calculan al entrenar)
+        if hasattr(self.modelo_clasificacion, 'feature_importances_'):
+            importancias = pd.DataFrame({
+                'caracteristica': datos['columnas'],
+                'importancia': self.modelo_clasificacion.feature_importances_
+            }).sort_values('importancia', ascending=False)
+            
+            print("\n📊 Top 5 características más importantes:")
+            print(importancias.head())
         
-        # Escalar características
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        return accuracy
+    
+    def entrenar_desde_archivo(self, ruta_archivo: str, columna_objetivo: str = 'categoria_precio',
+                               columna_precio: str = 'precio', tamano_trozo: int = 100000,
+                               epocas: int = 1, fraccion_prueba: float = 0.2, backend: str = 'sgd',
+                               tamano_muestra: int = 100000) -> Dict[str, Any]:
+        """
+        Entrena el clasificador leyendo el archivo por trozos, sin cargarlo en memoria
         
-        # Entrenar modelo
-        self.modelo_clasificacion = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            n_jobs=-1
+        Una primera pasada acumula las estadísticas del preprocesamiento
+        (medias y modas para imputar, valores de cada categórica y media y
+        varianza de cada característica), con las que se ajustan los
+        LabelEncoders y el scaler. Luego cada época vuelve a leer el archivo
+        y entrena con partial_fit trozo a trozo. La memoria máxima depende de
+        tamano_trozo, no del tamaño del archivo; self.df no se modifica.
+        
+        Args:
+            ruta_archivo: Archivo CSV o JSON lines (.jsonl)
+            columna_objetivo: Columna a predecir. Si es 'categoria_precio' y no
+                está en el archivo, se deriva de columna_precio con los
+                cuartiles de una muestra de tamano_muestra precios (exactos
+                si el archivo tiene menos filas), como crear_categorias_precio
+            tamano_trozo: Filas leídas a la vez
+            epocas: Pasadas de entrenamiento sobre el archivo
+            fraccion_prueba: Fracción de filas (al azar, con semilla fija) que
+                no se usa para entrenar y mide la precisión en la última época
+            backend: Clasificador de BACKENDS_CLASIFICACION con partial_fit
+        
+        Returns:
+            Métricas: filas, precisión y filas por segundo de cada fase
+        """
+        if backend not in BACKENDS_CLASIFICACION:
+            raise ValueError(f"Backend de clasificación desconocido: '{backend}'. "
+                             f"Opciones: {list(BACKENDS_CLASIFICACION)}")
+        clasificador = BACKENDS_CLASIFICACION[backend]()
+        if not hasattr(clasificador, 'partial_fit'):
+            raise ValueError(f"El backend '{backend}' no admite entrenamiento incremental (partial_fit)")
+        if epocas < 1:
+            raise ValueError("epocas debe ser mayor o igual que 1")
+        if not 0 <= fraccion_prueba < 1:
+            raise ValueError("fraccion_prueba debe estar entre 0 y 1")
+        
+        print(f"\n📂 Entrenamiento por trozos desde: {ruta_archivo}")
+        
+        # Primera pasada: estadísticas del preprocesamiento
+        estadisticas = EstadisticasFlujo(columnas_excluidas=[columna_objetivo])
+        muestra_precios = MuestraFondo(tamano_muestra)
+        conteos_objetivo = pd.Series(dtype=np.int64)
+        derivar_objetivo = None
+        inicio = time.perf_counter()
+        for trozo in leer_trozos(ruta_archivo, tamano_trozo):
+            if derivar_objetivo is None:
+                derivar_objetivo = columna_objetivo == 'categoria_precio' and columna_objetivo not in trozo.columns
+                if derivar_objetivo and columna_precio not in trozo.columns:
+                    raise ValueError(f"La columna '{columna_precio}' no existe en el archivo")
+                if not derivar_objetivo and columna_objetivo not in trozo.columns:
+                    raise ValueError(f"La columna objetivo '{columna_objetivo}' no existe")
+            estadisticas.agregar(trozo)
+            if derivar_objetivo:
+                precios = pd.to_numeric(trozo[columna_precio], errors='coerce').dropna()
+                muestra_precios.agregar(precios.to_numpy(dtype=np.float64))
+            else:
+                conteos_objetivo = conteos_objetivo.add(trozo[columna_objetivo].value_counts(), fill_value=0)
+            self._reportar_progreso('Estadísticas', estadisticas.n_filas, inicio)
+        segundos_estadisticas = time.perf_counter() - inicio
+        
+        if estadisticas.n_filas == 0 or (not derivar_objetivo and conteos_objetivo.empty):
+            raise ValueError("El archivo no contiene filas con la columna objetivo")
+        
+        caracteristicas_numericas = estadisticas.caracteristicas_numericas
+        caracteristicas_categoricas = estadisticas.caracteristicas_categoricas
+        label_encoders = estadisticas.label_encoders()
+        columnas = caracteristicas_numericas + [col + '_encoded' for col in caracteristicas_categoricas]
+        scaler = estadisticas.scaler(columnas)
+        
+        # Objetivo: categorías de precio por cuartiles o los valores de la columna
+        codificador_objetivo = None
+        moda_objetivo = None if derivar_objetivo else conteos_objetivo.sort_index().idxmax()
+        if derivar_objetivo:
+            bordes = np.quantile(muestra_precios.valores, [0.25, 0.5, 0.75])
+            media_precio = estadisticas.medias().get(columna_precio, muestra_precios.valores.mean())
+            codificador_objetivo = LabelEncoder().fit(ETIQUETAS_PRECIO)
+        elif conteos_objetivo.index.dtype == object or pd.api.types.is_string_dtype(conteos_objetivo.index):
+            codificador_objetivo = LabelEncoder().fit(conteos_objetivo.index.to_numpy(dtype=object))
+        clases = (codificador_objetivo.transform(codificador_objetivo.classes_)
+                  if codificador_objetivo is not None else np.sort(conteos_objetivo.index.to_numpy()))
+        
+        def objetivo(trozo: pd.DataFrame) -> np.ndarray:
+            if derivar_objetivo:
+                precios = pd.to_numeric(trozo[columna_precio], errors='coerce').fillna(media_precio)
+                cuartiles = np.searchsorted(bordes, precios.to_numpy(dtype=np.float64), side='left')
+                return codificador_objetivo.transform(np.asarray(ETIQUETAS_PRECIO, dtype=object)[cuartiles])
+            valores = trozo[columna_objetivo].fillna(moda_objetivo)
+            if codificador_objetivo is not None:
+                return codificador_objetivo.transform(valores.to_numpy(dtype=object))
+            return valores.to_numpy()
+        
+        # Épocas de entrenamiento trozo a trozo
+        print(f"\n🤖 Entrenando clasificador ({backend}) por trozos de {tamano_trozo:,} filas...")
+        aciertos = evaluadas = filas_entrenamiento = 0
+        entrenado = False
+        precios_maximos = {}
+        inicio = time.perf_counter()
+        for epoca in range(epocas):
+            ultima = epoca == epocas - 1
+            filas = 0
+            inicio_epoca = time.perf_counter()
+            for numero, trozo in enumerate(leer_trozos(ruta_archivo, tamano_trozo)):
+                trozo = estadisticas.preparar(trozo)
+                y = objetivo(trozo)
+                X = scaler.transform(codificar_caracteristicas(trozo, columnas, label_encoders))
+                
+                # Misma partición en todas las épocas: semilla por trozo
+                prueba = np.random.default_rng(42 + numero).random(len(trozo)) < fraccion_prueba
+                if ultima and prueba.any() and entrenado:
+                    aciertos += int((clasificador.predict(X[prueba]) == y[prueba]).sum())
+                    evaluadas += int(prueba.sum())
+                if (~prueba).any():
+                    clasificador.partial_fit(X[~prueba], y[~prueba], classes=clases)
+                    entrenado = True
+                    if ultima:
+                        filas_entrenamiento += int((~prueba).sum())
+                if ultima and derivar_objetivo:
+                    for clase, maximo in trozo[columna_precio].groupby(y).max().items():
+                        precios_maximos[clase] = max(precios_maximos.get(clase, -np.inf), maximo)
+                
+                filas += len(trozo)
+                self._reportar_progreso(f'Época {epoca + 1}/{epocas}', filas, inicio_epoca)
+        segundos_entrenamiento = time.perf_counter() - inicio
+        
+        # El clasificador queda listo para predecir() y guardar_modelo()
+        self.caracteristicas_numericas = caracteristicas_numericas
+        self.caracteristicas_categoricas = caracteristicas_categoricas
+        self.label_encoders.update(label_encoders)
+        self.label_encoders.pop('objetivo', None)
+        if codificador_objetivo is not None:
+            self.label_encoders['objetivo'] = codificador_objetivo
+        self.columnas_clasificacion = columnas
+        self.scaler_clasificacion = scaler
+        self.modelo_clasificacion = clasificador
+        self.backend_clasificacion = backend
+        self.bosque_aplanado = None
+        if derivar_objetivo:
+            codigos = dict(zip(ETIQUETAS_PRECIO, codificador_objetivo.transform(ETIQUETAS_PRECIO)))
+            self.categorias_precio = {etiqueta: precios_maximos[codigos[etiqueta]]
+                                      for etiqueta in ETIQUETAS_PRECIO if codigos[etiqueta] in precios_maximos}
+        
+        accuracy = aciertos / evaluadas if evaluadas else float('nan')
+        print(f"✓ Modelo entrenado con precisión: {accuracy:.2%} ({evaluadas:,} filas de prueba)")
+        
+        return {
+            'filas': estadisticas.n_filas,
+            'filas_entrenamiento': filas_entrenamiento,
+            'filas_prueba': evaluadas,
+            'accuracy': accuracy,
+            'epocas': epocas,
+            'segundos_estadisticas': segundos_estadisticas,
+            'segundos_entrenamiento': segundos_entrenamiento,
+            'filas_por_segundo_estadisticas': estadisticas.n_filas / segundos_estadisticas,
+            'filas_por_segundo_entrenamiento': estadisticas.n_filas * epocas / segundos_entrenamiento
+        }
+    
+    @staticmethod
+    def _reportar_progreso(fase: str, filas: int, inicio: float):
+        segundos = time.perf_counter() - inicio
+        print(f"  {fase}: {filas:,} filas ({filas / segundos if segundos > 0 else 0:,.0f} filas/s)")
+    
+    def muestrear(self, fuente=None, tamano: int = 10000, columnas_estrato: List[str] = None,
+                  columna_precio: str = 'precio', tamano_trozo: int = 100000,
+                  semilla: int = 42) -> pd.DataFrame:
+        """
+        Muestra estratificada de una fuente, leída en una sola pasada
+        
+        Args:
+            fuente: DataFrame, ruta de un archivo CSV o JSON lines (leído por
+                trozos, sin cargarlo completo) o None para usar self.df sin
+                las columnas que escribe el modelo ('_encoded', 'cluster', ...)
+            tamano: Filas de la muestra (aproximado: las cuotas se redondean
+                por estrato)
+            columnas_estrato: Columnas cuyos valores combinados definen los
+                estratos (default: COLUMNAS_ESTRATO). Si falta
+                'categoria_precio', en un DataFrame se calcula con los
+                cuartiles de columna_precio; en un archivo se omite
+            tamano_trozo: Filas leídas a la vez de un archivo
+            semilla: Semilla del muestreo
+        
+        Returns:
+            DataFrame con la muestra, sin modificar el modelo
+        """
+        return self._reserva_estratificada(fuente, tamano, columnas_estrato, columna_precio,
+                                           tamano_trozo, semilla).muestra()
+    
+    def _reserva_estratificada(self, fuente, tamano: int, columnas_estrato: Optional[List[str]],
+                               columna_precio: str, tamano_trozo: int,
+                               semilla: int) -> MuestraEstratificada:
+        """
+        Recorre la fuente una vez y retorna la reserva de la que salen las muestras
+        """
+        if fuente is None:
+            if self.df is None:
+                raise ValueError("Primero debe cargar un dataset o indicar una fuente")
+            # Las columnas derivadas se vuelven a calcular con cada muestra
+            fuente = self._datos_originales()
+        es_dataframe = isinstance(fuente, pd.DataFrame)
+        columnas_estrato = list(COLUMNAS_ESTRATO if columnas_estrato is None else columnas_estrato)
+        
+        print(f"\n🎲 Muestreo estratificado por {columnas_estrato}...")
+        reserva = None
+        derivar_categoria = False
+        for trozo in ([fuente] if es_dataframe else leer_trozos(fuente, tamano_trozo)):
+            if reserva is None:
+                derivar_categoria = (es_dataframe and 'categoria_precio' in columnas_estrato
+                                     and 'categoria_precio' not in trozo.columns
+                                     and columna_precio in trozo.columns)
+                presentes = [col for col in columnas_estrato
+                             if col in trozo.columns or (col == 'categoria_precio' and derivar_categoria)]
+                ausentes = [col for col in columnas_estrato if col not in presentes]
+                if ausentes:
+                    print(f"⚠️  Columnas de estrato ausentes (se omiten): {ausentes}")
+                reserva = MuestraEstratificada(tamano, presentes, semilla=semilla)
+            
+            # La categoría derivada solo define el estrato; no se agrega a la muestra
+            estratos = None
+            if derivar_categoria:
+                estratos = reserva.estratos(trozo.assign(categoria_precio=pd.qcut(
+                    trozo[columna_precio], q=4, labels=ETIQUETAS_PRECIO)))
+            reserva.agregar(trozo, estratos)
+        
+        if reserva is None or reserva.n_filas == 0:
+            raise ValueError("La fuente no contiene filas")
+        print(f"✓ {reserva.n_filas:,} filas leídas en {len(reserva.conteos)} estratos")
+        return reserva
+    
+    def curva_aprendizaje(self, fuente=None, modelo: str = 'clasificacion', tamanos: List[int] = None,
+                          columna_objetivo: str = 'categoria_precio', columnas_estrato: List[str] = None,
+                          tolerancia: float = 0.005, paciencia: int = 2, fraccion_prueba: float = 0.2,
+                          tamano_trozo: int = 100000, semilla: int = 42, **opciones) -> pd.DataFrame:
+        """
+        Entrena con muestras estratificadas crecientes y se detiene cuando dejan de mejorar
+        
+        La fuente se recorre una sola vez. De la reserva se separa primero un
+        conjunto de prueba estratificado, el mismo para todos los tamaños y
+        sin filas en común con ninguna muestra de entrenamiento; las muestras
+        salen del resto y están anidadas (cada una contiene a la anterior).
+        Con cada muestra se repite el flujo habitual: cargar_dataset,
+        preprocesar_datos, crear_categorias_precio (si el objetivo es
+        'categoria_precio' y no está en la fuente) y el entrenamiento. La
+        métrica es la precisión del clasificador o la silueta estimada del
+        clustering, ambas sobre el conjunto de prueba. Al terminar se
+        restaura el estado del modelo (self.df y los modelos entrenados).
+        
+        Args:
+            fuente: DataFrame, archivo CSV/JSON lines o None (self.df sin
+                las columnas derivadas, ver muestrear)
+            modelo: 'clasificacion' o 'clustering'
+            tamanos: Tamaños de muestra (default: TAMANOS_CURVA); los
+                mayores que la fuente (sin el conjunto de prueba) se reducen
+                a las filas disponibles
+            columna_objetivo: Columna a predecir en la clasificación
+            columnas_estrato: Columnas de los estratos (ver muestrear)
+            tolerancia: Mejora mínima de la métrica sobre la mejor anterior
+                para considerar que más datos ayudan
+            paciencia: Tamaños seguidos sin esa mejora antes de detenerse
+            fraccion_prueba: Fracción de la reserva separada como conjunto de prueba
+            **opciones: Argumentos de entrenar_modelo_clasificacion (backend)
+                o de entrenar_clustering (n_clusters, tamano_muestra, ...)
+        
+        Returns:
+            Tabla con tamano, filas, la métrica, su mejora y segundos de
+            entrenamiento por muestra
+        """
+        if modelo not in ('clasificacion', 'clustering'):
+            raise ValueError("modelo debe ser 'clasificacion' o 'clustering'")
+        tamanos = sorted(set(int(t) for t in (TAMANOS_CURVA if tamanos is None else tamanos)))
+        if not tamanos or tamanos[0] < 1:
+            raise ValueError("tamanos debe contener valores mayores o iguales que 1")
+        if paciencia < 1:
+            raise ValueError("paciencia debe ser mayor o igual que 1")
+        if not 0 < fraccion_prueba < 1:
+            raise ValueError("fraccion_prueba debe estar entre 0 y 1")
+        
+        # La reserva incluye las filas de prueba, que se separan una sola vez
+        reserva = self._reserva_estratificada(fuente, int(np.ceil(tamanos[-1] / (1 - fraccion_prueba))),
+                                              columnas_estrato, 'precio', tamano_trozo, semilla)
+        disponibles = min(reserva.tamano, reserva.n_filas)
+        prueba = reserva.separar(max(int(round(disponibles * fraccion_prueba)), 1))
+        if disponibles - len(prueba) < 1:
+            raise ValueError("La fuente no tiene filas suficientes para separar el conjunto de prueba")
+        tamanos = sorted(set(min(t, disponibles - len(prueba)) for t in tamanos))
+        metrica = 'accuracy' if modelo == 'clasificacion' else 'silueta'
+        print(f"✓ Conjunto de prueba fijo: {len(prueba):,} filas")
+        
+        estado = dict(vars(self))
+        filas = []
+        mejor = np.nan
+        sin_mejora = 0
+        try:
+            for tamano in tamanos:
+                muestra = reserva.muestra(tamano)
+                print(f"\n📈 Curva de aprendizaje: muestra de {len(muestra):,} filas")
+                
+                inicio = time.perf_counter()
+                self.label_encoders = {}
+                self.cargar_dataset(dataframe=muestra)
+                if modelo == 'clasificacion':
+                    objetivo = columna_objetivo if columna_objetivo in muestra.columns else None
+                    self.preprocesar_datos(objetivo)
+                    if columna_objetivo == 'categoria_precio' and objetivo is None:
+                        self.crear_categorias_precio()
+                    self.entrenar_modelo_clasificacion(columna_objetivo, **opciones)
+                    segundos = time.perf_counter() - inicio
+                    valor = self._precision_prueba(prueba, columna_objetivo)
+                else:
+                    self.preprocesar_datos()
+                    self.entrenar_clustering(**opciones)
+                    segundos = time.perf_counter() - inicio
+                    X_prueba = self._escalar_datos(prueba, ['clustering'])['clustering']
+                    valor = silueta_muestreada(X_prueba, self.modelo_clustering.predict(X_prueba),
+                                               opciones.get('tamano_muestra', 10000), semilla)
+                
+                mejora = valor - mejor
+                filas.append({'tamano': tamano, 'filas': len(muestra), metrica: valor,
+                              'mejora': mejora, 'segundos': segundos})
+                sin_mejora = sin_mejora + 1 if len(filas) > 1 and not mejora >= tolerancia else 0
+                mejor = np.fmax(mejor, valor)
+                if sin_mejora >= paciencia:
+                    print(f"\n⏹️  Sin mejora de {tolerancia} en {paciencia} tamaños seguidos: "
+                          f"se detiene en {len(muestra):,} filas")
+                    break
+        finally:
+            vars(self).clear()
+            vars(self).update(estado)
+        
+        tabla = pd.DataFrame(filas)
+        print("\n📈 Curva de aprendizaje:")
+        print(tabla.to_string(index=False))
+        return tabla
+    
+    def _precision_prueba(self, prueba: pd.DataFrame, columna_objetivo: str,
+                          columna_precio: str = 'precio') -> float:
+        """
+        Precisión del clasificador sobre filas sin procesar que no vio al entrenar
+        
+        Si el objetivo es 'categoria_precio' y las filas no lo tienen, se
+        asigna con los cuartiles de precio de self.df, como
+        crear_categorias_precio. Las filas sin objetivo no cuentan.
+        """
+        if columna_objetivo in prueba.columns:
+            esperado = prueba[columna_objetivo]
+        else:
+            bordes = np.quantile(self.df[columna_precio], [0.25, 0.5, 0.75])
+            esperado = pd.cut(pd.to_numeric(prueba[columna_precio], errors='coerce'),
+                              bins=[-np.inf, *bordes, np.inf], labels=ETIQUETAS_PRECIO).astype(object)
+        validas = esperado.notna().to_numpy()
+        
+        X = self._escalar_datos(prueba[validas], ['clasificacion'])['clasificacion']
+        prediccion = self.modelo_clasificacion.predict(X)
+        if 'objetivo' in self.label_encoders:
+            prediccion = self.label_encoders['objetivo'].inverse_transform(prediccion)
+        return float(accuracy_score(esperado[validas].to_numpy(), prediccion))
+    
+    def comparar_backends(self, columna_objetivo: str = 'categoria_precio',
+                          backends: List[str] = None, n_consultas: int = 200) -> pd.DataFrame:
+        """
+        Compara los backends de clasificación sobre la misma partición
+        
+        Entrena cada backend con el mismo conjunto de entrenamiento y mide
+        tiempo de entrenamiento, latencia por inmueble (p50/p99, con el mismo
+        motor que usa predecir() para un inmueble), filas por segundo en lote,
+        tamaño serializado y precisión sobre el mismo conjunto de prueba. No
+        modifica el modelo entrenado.
+        
+        Args:
+            columna_objetivo: Columna a predecir
+            backends: Backends a comparar (default: todos)
+            n_consultas: Inmuebles usados para medir la latencia
+        """
+        backends = list(BACKENDS_CLASIFICACION) if backends is None else list(backends)
+        desconocidos = [b for b in backends if b not in BACKENDS_CLASIFICACION]
+        if desconocidos:
+            raise ValueError(f"Backends de clasificación desconocidos: {desconocidos}. "
+                             f"Opciones: {list(BACKENDS_CLASIFICACION)}")
+        
+        datos = self._datos_clasificacion(columna_objetivo)
+        
+        print(f"\n⏱️  Comparando backends de clasificación: {backends}")
+        comparacion = comparar_clasificadores(
+            {backend: BACKENDS_CLASIFICACION[backend] for backend in backends},
+            datos['X_train'], datos['y_train'], datos['X_test'], datos['y_test'],
+            n_consultas=n_consultas
         )
-        self.modelo_clasificacion.fit(X_train_scaled, y_train)
+        print(comparacion.to_string(index=False))
         
-        # Evaluar modelo
-        y_pred = self.modelo_clasificacion.predict(X_test_scaled)
-        accuracy = accuracy_score(y_test, y_pred)
+        return comparacion
+    
+    def validacion_cruzada(self, columna_objetivo: str = 'categoria_precio', n_folds: int = 5,
+                           backend: str = None, n_procesos: int = -1) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Evalúa el clasificador con validación cruzada estratificada en paralelo
         
-        print(f"✓ Modelo entrenado con precisión: {accuracy:.2%}")
+        Cada fold se entrena en un proceso; la matriz de características se
+        escribe una vez a disco y los procesos la leen como memmap. Los hilos
+        de cada modelo se limitan para que folds × n_jobs no supere los
+        núcleos. No modifica el modelo entrenado.
         
-        # Importancia de características
-        importancias = pd.DataFrame({
-            'caracteristica': X_cols,
-            'importancia': self.modelo_clasificacion.feature_importances_
-        }).sort_values('importancia', ascending=False)
+        Args:
+            columna_objetivo: Columna a predecir
+            n_folds: Número de folds
+            backend: Clasificador de BACKENDS_CLASIFICACION (default:
+                self.backend_clasificacion)
+            n_procesos: Procesos del pool (-1: todos los núcleos)
         
-        print("\n📊 Top 5 características más importantes:")
-        print(importancias.head())
+        Returns:
+            (tabla con accuracy, f1_macro y segundos por fold, resumen con la
+            media y desviación de cada métrica)
+        """
+        backend = backend or self.backend_clasificacion
+        if backend not in BACKENDS_CLASIFICACION:
+            raise ValueError(f"Backend de clasificación desconocido: '{backend}'. "
+                             f"Opciones: {list(BACKENDS_CLASIFICACION)}")
         
-        return accuracy
+        _, X, y, _ = self._matriz_clasificacion(columna_objetivo)
+        
+        print(f"\n🧪 Validación cruzada de {n_folds} folds ({backend})...")
+        tabla, resumen = validacion_cruzada(BACKENDS_CLASIFICACION[backend], X, y, n_folds=n_folds,
+                                            n_procesos=n_procesos)
+        
+        print(tabla.to_string(index=False))
+        print(f"✓ Precisión: {resumen['accuracy_media']:.2%} ± {resumen['accuracy_desviacion']:.2%} "
+              f"({resumen['procesos']} procesos × {resumen['hilos_por_proceso']} hilos, "
+              f"{resumen['segundos']:.1f}s)")
+        return tabla, resumen
     
-    def entrenar_clustering(self, n_clusters: int = 5):
+    def buscar_hiperparametros(self, espacio: Dict[str, Any], modelo: str = 'clasificacion',
+                               modo: str = 'grid', n_iteraciones: int = 20,
+                               columna_objetivo: str = 'categoria_precio', backend: str = None,
+                               n_rondas: int = 3, margen: float = 0.02, n_procesos: int = -1,
+                               tamano_muestra: int = 10000,
+                               archivo_resultados: Optional[str] = 'busqueda_hiperparametros.csv',
+                               guardar_mejor: str = None) -> pd.DataFrame:
+        """
+        Búsqueda de hiperparámetros (grid o aleatoria) en paralelo con abandono temprano
+        
+        Usa el dataset ya preprocesado: la matriz del almacén de
+        características se codifica una sola vez y se comparte como memmap
+        con los procesos, sin repetir preprocesar_datos por configuración.
+        Las configuraciones se evalúan por rondas; tras cada ronda se
+        abandonan las que quedan más de margen por debajo de la mejor.
+        
+        - 'clasificacion': parámetros del backend (ej. n_estimators,
+          max_depth). Cada ronda es un fold estratificado y el puntaje es la
+          precisión media.
+        - 'clustering': n_clusters (y opcionalmente incremental,
+          tamano_lote). La ronda r usa r/n_rondas de las filas y el puntaje
+          es la silueta estimada de la última ronda.
+        
+        Args:
+            espacio: Valores de cada parámetro (listas; en modo 'random'
+                también distribuciones de scipy.stats)
+            modelo: 'clasificacion' o 'clustering'
+            modo: 'grid' (todas las combinaciones) o 'random'
+            n_iteraciones: Configuraciones evaluadas en modo 'random'
+            columna_objetivo: Columna a predecir en la clasificación
+            backend: Clasificador de BACKENDS_CLASIFICACION (default:
+                self.backend_clasificacion)
+            n_rondas: Folds (clasificación, al menos 2) o muestras crecientes
+                (clustering)
+            margen: Distancia a la mejor a partir de la cual se abandona
+            n_procesos: Procesos del pool (-1: todos los núcleos); los hilos
+                de cada modelo se limitan para no superar los núcleos
+            tamano_muestra: Filas para estimar la silueta del clustering
+            archivo_resultados: CSV donde se escribe la tabla (None: no se
+                escribe)
+            guardar_mejor: Si se indica, entrena la mejor configuración con
+                todo el dataset y la guarda con guardar_modelo en esta ruta
+        
+        Returns:
+            Tabla ordenada por puntaje (ver buscar_por_rondas en
+            evaluacion_modelos.py)
+        """
+        if modelo not in ('clasificacion', 'clustering'):
+            raise ValueError("modelo debe ser 'clasificacion' o 'clustering'")
+        backend = backend or self.backend_clasificacion
+        if modelo == 'clasificacion' and backend not in BACKENDS_CLASIFICACION:
+            raise ValueError(f"Backend de clasificación desconocido: '{backend}'. "
+                             f"Opciones: {list(BACKENDS_CLASIFICACION)}")
+        if self.df is None:
+            raise ValueError("Primero debe cargar y preprocesar un dataset")
+        
+        configuraciones = generar_configuraciones(espacio, modo, n_iteraciones)
+        print(f"\n🔍 Búsqueda de hiperparámetros ({modo}, {modelo}): "
+              f"{len(configuraciones)} configuraciones, {n_rondas} rondas")
+        
+        inicio = time.perf_counter()
+        if modelo == 'clasificacion':
+            _, X, y, _ = self._matriz_clasificacion(columna_objetivo)
+            tabla = buscar_clasificador(BACKENDS_CLASIFICACION[backend], configuraciones, X, y,
+                                        n_folds=n_rondas, margen=margen, n_procesos=n_procesos)
+        else:
+            X = StandardScaler().fit_transform(
+                self.almacen_caracteristicas().seleccionar(self._columnas_caracteristicas())
+            ).astype(np.float32)
+            tabla = buscar_clustering(configuraciones, X, n_rondas=n_rondas, margen=margen,
+                                      n_procesos=n_procesos, tamano_muestra=tamano_muestra)
+        
+        print(tabla.to_string(index=False))
+        print(f"✓ {int(tabla['abandonada'].sum())} configuraciones abandonadas "
+              f"({time.perf_counter() - inicio:.1f}s)")
+        if archivo_resultados:
+            tabla.to_csv(archivo_resultados, index=False)
+            print(f"✓ Resultados guardados en: {archivo_resultados}")
+        
+        if guardar_mejor:
+            mejor = configuraciones[int(tabla.loc[tabla['mejor'], 'configuracion'].iloc[0])]
+            print(f"\n🏆 Mejor configuración: {mejor}")
+            if modelo == 'clasificacion':
+                self.entrenar_modelo_clasificacion(columna_objetivo, backend=backend, parametros=mejor)
+            else:
+                self.entrenar_clustering(**mejor)
+            self.guardar_modelo(guardar_mejor)
+        
+        return tabla
+    
+    def _matriz_clasificacion(self, columna_objetivo: str) -> Tuple[List[str], np.ndarray, np.ndarray, Any]:
+        """
+        Columnas, matriz sin escalar, objetivo codificado y su codificador
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar y preprocesar un dataset")
+        
+        if columna_objetivo not in self.df.columns:
+            raise ValueError(f"La columna objetivo '{columna_objetivo}' no existe")
+        
+        # Remover columna objetivo (y su codificación) de las características del almacén
+        X_cols = [col for col in self._columnas_caracteristicas()
+                  if col not in (columna_objetivo, columna_objetivo + '_encoded')]
+        X = self.almacen_caracteristicas().seleccionar(X_cols)
+        y = self.df[columna_objetivo]
+        
+        # Codificar objetivo si es categórico
+        codificador = None
+        if y.dtype == 'object' or isinstance(y.dtype, pd.CategoricalDtype):
+            codificador = LabelEncoder()
+            y = codificador.fit_transform(y)
+        return X_cols, X, np.asarray(y), codificador
+    
+    def _datos_clasificacion(self, columna_objetivo: str) -> Dict[str, Any]:
+        """
+        Partición train/test escalada para el clasificador, sin modificar el modelo
+        """
+        X_cols, X, y, codificador = self._matriz_clasificacion(columna_objetivo)
+        
+        # Dividir datos (por posiciones, sin copiar la matriz completa)
+        filas_train, filas_test = train_test_split(
+            np.arange(len(X)), test_size=0.2, random_state=42
+        )
+        
+        # Escalar características con el scaler propio del clasificador
+        scaler = StandardScaler()
+        return {
+            'columnas': X_cols,
+            'codificador': codificador,
+            'scaler': scaler,
+            'X_train': scaler.fit_transform(X[filas_train]),
+            'X_test': scaler.transform(X[filas_test]),
+            'y_train': y[filas_train],
+            'y_test': y[filas_test]
+        }
+    
+    def entrenar_clustering(self, n_clusters: int = 5, incremental: bool = False,
+                            tamano_lote: int = 4096, rango_k=None, n_procesos: int = -1,
+                            tamano_muestra: int = 10000):
         """
         Entrena un modelo de clustering para agrupar inmuebles similares
+        
+        Args:
+            n_clusters: Número de grupos
+            incremental: Si es True usa MiniBatchKMeans, que además permite
+                absorber inmuebles nuevos con actualizar_clustering() sin
+                volver a recorrer el dataset
+            tamano_lote: Filas por mini-lote en modo incremental
+            rango_k: Valores de k a evaluar (ej. range(2, 11)) en lugar de
+                n_clusters. Cada candidato se entrena en un pool de procesos
+                y se puntúa con su inercia y la silueta estimada sobre una
+                muestra estratificada; se conserva el de mayor silueta y la
+                tabla queda en self.barrido_clusters
+            n_procesos: Procesos del barrido (-1: todos los núcleos)
+            tamano_muestra: Filas de la muestra para estimar la silueta
+        
+        Las columnas de COLUMNAS_IDENTIFICADOR no se usan como características.
         """
         if self.df is None:
             raise ValueError("Primero debe cargar y preprocesar un dataset")
         
-        print(f"\n🔮 Entrenando modelo de clustering con {n_clusters} grupos...")
+        if rango_k is not None:
+            print(f"\n🔮 Entrenando modelo de clustering con k en {list(rango_k)}...")
+        else:
+            print(f"\n🔮 Entrenando modelo de clustering con {n_clusters} grupos...")
         
-        # Preparar características
-        caracteristicas_encoded = [col + '_encoded' for col in self.caracteristicas_categoricas]
-        X_cols = self.caracteristicas_numericas + caracteristicas_encoded
-        X = self.df[X_cols]
+        # Preparar características (sin identificadores)
+        X_cols = [col for col in self._columnas_caracteristicas() if col not in COLUMNAS_IDENTIFICADOR]
+        self.columnas_clustering = X_cols
         
-        # Escalar características
-        X_scaled = self.scaler.fit_transform(X)
+        # Escalar características con el scaler propio del clustering; la
+        # matriz escalada queda en el almacén para el índice de vecinos
+        self.scaler_clustering = StandardScaler()
+        X_scaled = self.almacen_caracteristicas().escalar('clustering', self.scaler_clustering,
+                                                          X_cols, ajustar=True)
         
         # Entrenar clustering
-        self.modelo_clustering = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        self.df['cluster'] = self.modelo_clustering.fit_predict(X_scaled)
+        if rango_k is not None:
+            self.modelo_clustering, self.barrido_clusters = barrer_k(
+                X_scaled, rango_k, n_procesos=n_procesos, incremental=incremental,
+                tamano_lote=tamano_lote, tamano_muestra=tamano_muestra
+            )
+            self._asignar_columna('cluster', self.modelo_clustering.labels_)
+            
+            print("\n📊 Barrido de k:")
+            print(self.barrido_clusters.to_string(index=False))
+            print(f"✓ Mejor k: {self.modelo_clustering.n_clusters}")
+        elif incremental:
+            self.modelo_clustering = MiniBatchKMeans(n_clusters=n_clusters, batch_size=tamano_lote,
+                                                     random_state=42, n_init=3)
+            self._asignar_columna('cluster', self.modelo_clustering.fit_predict(X_scaled))
+        else:
+            self.modelo_clustering = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+            self._asignar_columna('cluster', self.modelo_clustering.fit_predict(X_scaled))
+        
+        # Línea base para medir la deriva de los lotes nuevos
+        self.monitor_deriva = MonitorDeriva(X_scaled, self.modelo_clustering.cluster_centers_,
+                                            self.df['cluster'].to_numpy())
         
         print(f"✓ Clustering completado")
+        self.construir_indice_vecinos(X_scaled)
         print("\n📊 Distribución de inmuebles por cluster:")
         print(self.df['cluster'].value_counts().sort_index())
         
         return self.df['cluster']
     
-    def categorizar_inmuebles(self, criterios: Dict[str, Any]) -> pd.DataFrame:
+    def actualizar_clustering(self, nuevos: pd.DataFrame) -> pd.Series:
+        """
+        Absorbe un lote de inmuebles nuevos en el clustering incremental
+        
+        Actualiza los centroides con partial_fit usando solo el lote (sin
+        recorrer los datos anteriores) y asigna un cluster a cada inmueble.
+        Los inmuebles se codifican y escalan como en predecir(); el scaler no
+        cambia, de modo que un cambio en la distribución de los datos se
+        refleja en metricas_deriva(). Los clusters de self.df no se
+        recalculan.
+        
+        Args:
+            nuevos: DataFrame de inmuebles sin procesar
+        
+        Returns:
+            Serie 'cluster' con el mismo índice de nuevos
+        """
+        if not isinstance(self.modelo_clustering, MiniBatchKMeans):
+            raise ValueError("El clustering incremental requiere entrenar_clustering(incremental=True)")
+        
+        if len(nuevos) == 0:
+            return pd.Series([], index=nuevos.index, name='cluster', dtype=np.int32)
+        
+        X_scaled = self._escalar_datos(nuevos, ['clustering'])['clustering']
+        self.modelo_clustering.partial_fit(X_scaled)
+        etiquetas = self.modelo_clustering.predict(X_scaled)
+        
+        if self.monitor_deriva is not None:
+            self.monitor_deriva.registrar(X_scaled, self.modelo_clustering.cluster_centers_, etiquetas)
+        
+        print(f"✓ Clustering actualizado con {len(nuevos)} inmuebles nuevos")
+        return pd.Series(etiquetas, index=nuevos.index, name='cluster')
+    
+    def metricas_deriva(self, umbral_inercia: float = 1.25, umbral_desplazamiento: float = 0.5,
+                        umbral_psi: float = 0.2) -> Dict[str, Any]:
+        """
+        Métricas de deriva de los lotes absorbidos desde el último entrenamiento
+        
+        Compara con la línea base del entrenamiento: desplazamiento de los
+        centroides y de la media de cada característica (en desviaciones
+        estándar), cociente de inercia por inmueble y PSI de la distribución
+        por cluster. 'reentrenar' es True si alguna supera su umbral, lo que
+        indica que conviene volver a entrenar el clustering completo.
+        """
+        if self.modelo_clustering is None or self.monitor_deriva is None:
+            raise ValueError("Primero debe entrenar el modelo de clustering")
+        
+        return self.monitor_deriva.metricas(self.modelo_clustering.cluster_centers_,
+                                            umbral_inercia=umbral_inercia,
+                                            umbral_desplazamiento=umbral_desplazamiento,
+                                            umbral_psi=umbral_psi)
+    
+    def categorizar_inmuebles(self, criterios: Dict[str, Any], n_hilos: int = None,
+                              ordenar_por: str = None, ascendente: bool = True,
+                              limite: int = None) -> pd.DataFrame:
         """
         Categoriza y filtra inmuebles según criterios específicos
         
@@ -247,6 +1178,20 @@ class ModeloInmuebles:
                     'habitaciones': 3,
                     'tipo': 'Casa'
                 }
+                Admite expresiones con las claves 'o', 'y' y 'no', y los
+                operadores {'entre': [min, max]} y {'en': [...]}:
+                {
+                    'o': [{'tipo': 'Casa', 'ubicacion': 'Norte'},
+                          {'tipo': 'Apartamento', 'ubicacion': 'Centro'}],
+                    'precio_max': 300000
+                }
+            n_hilos: Hilos para evaluar los criterios por particiones de filas
+                (default: self.n_hilos_busqueda). El resultado no depende del
+                número de hilos
+            ordenar_por: Columna por la que ordenar el resultado
+            ascendente: Sentido del orden
+            limite: Número máximo de inmuebles a retornar. Junto con
+                ordenar_por solo se materializan los k mejores
         """
         if self.df is None:
             raise ValueError("Primero debe cargar un dataset")
@@ -254,42 +1199,547 @@ class ModeloInmuebles:
         print("\n🔍 Categorizando inmuebles según criterios...")
         print(f"Criterios aplicados: {criterios}")
         
-        resultado = self.df.copy()
-        
-        for columna, valor in criterios.items():
-            if columna.endswith('_min'):
-                col_base = columna.replace('_min', '')
-                if col_base in resultado.columns:
-                    resultado = resultado[resultado[col_base] >= valor]
-            elif columna.endswith('_max'):
-                col_base = columna.replace('_max', '')
-                if col_base in resultado.columns:
-                    resultado = resultado[resultado[col_base] <= valor]
-            elif columna in resultado.columns:
-                if isinstance(valor, list):
-                    resultado = resultado[resultado[columna].isin(valor)]
-                else:
-                    resultado = resultado[resultado[columna] == valor]
+        posiciones = self.filtrar_posiciones(criterios, n_hilos=n_hilos)
+        print(f"✓ Encontrados {len(posiciones)} inmuebles que cumplen los criterios")
+        
+        resultado = self.materializar(posiciones, ordenar_por=ordenar_por,
+                                      ascendente=ascendente, limite=limite)
+        if len(resultado) < len(posiciones):
+            print(f"✓ Retornando {len(resultado)} inmuebles")
+        
+        return resultado
+    
+    def filtrar_posiciones(self, criterios: Dict[str, Any], n_hilos: int = None) -> np.ndarray:
+        """
+        Retorna las posiciones (iloc) de los inmuebles que cumplen los criterios
+        
+        No materializa filas; permite contar resultados o combinarlos con
+        materializar() y calcular_facetas() sin repetir la búsqueda.
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        # Compilar criterios y ejecutarlos en el orden elegido por el planificador
+        plan = compilar_criterios(criterios, self.df.columns)
+        return plan.posiciones(self.df, indices=self._indices_vigentes(),
+                               n_hilos=n_hilos or self.n_hilos_busqueda)
+    
+    def categorizar_lote(self, lista_criterios: List[Dict[str, Any]], solo_conteo: bool = False,
+                         n_hilos: int = None, limite: int = None) -> List[Any]:
+        """
+        Ejecuta muchas búsquedas independientes en una sola pasada por el dataset
+        
+        Los predicados repetidos entre búsquedas se evalúan una vez por bloque
+        de filas y se comparten en todo el lote.
+        
+        Args:
+            lista_criterios: Lista de diccionarios de criterios (ver categorizar_inmuebles)
+            solo_conteo: Si es True retorna solo el número de inmuebles por búsqueda
+            n_hilos: Hilos para repartir los bloques (default: self.n_hilos_busqueda)
+            limite: Máximo de inmuebles por búsqueda en el resultado
+        
+        Returns:
+            Lista de DataFrames (o de conteos) en el orden de lista_criterios
+        """
+        print(f"\n🔍 Ejecutando lote de {len(lista_criterios)} búsquedas...")
+        
+        if solo_conteo:
+            conteos = self._ejecutar_lote(lista_criterios, True, n_hilos)
+            print(f"✓ Lote completado: {sum(conteos)} coincidencias en total")
+            return conteos
+        
+        lote = self._ejecutar_lote(lista_criterios, False, n_hilos)
+        print(f"✓ Lote completado: {sum(len(posiciones) for posiciones in lote)} coincidencias en total")
+        return [self.materializar(posiciones, limite=limite) for posiciones in lote]
+    
+    def filtrar_posiciones_lote(self, lista_criterios: List[Dict[str, Any]],
+                                n_hilos: int = None) -> List[np.ndarray]:
+        """
+        Versión por lotes de filtrar_posiciones(): una lista de posiciones por búsqueda
+        """
+        return self._ejecutar_lote(lista_criterios, False, n_hilos)
+    
+    def _ejecutar_lote(self, lista_criterios: List[Dict[str, Any]], solo_conteo: bool,
+                       n_hilos: int = None) -> List[Any]:
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        if not isinstance(lista_criterios, list) or \
+                not all(isinstance(criterios, dict) for criterios in lista_criterios):
+            raise ValueError("El lote debe ser una lista de diccionarios de criterios")
+        
+        planes = [compilar_criterios(criterios, self.df.columns) for criterios in lista_criterios]
+        return ejecutar_lote(self.df, planes, indices=self._indices_vigentes(),
+                             solo_conteo=solo_conteo, n_hilos=n_hilos or self.n_hilos_busqueda)
+    
+    def materializar(self, posiciones: np.ndarray, ordenar_por: str = None,
+                     ascendente: bool = True, limite: int = None) -> pd.DataFrame:
+        """
+        Construye el DataFrame de resultados a partir de posiciones
+        
+        Con ordenar_por y limite se seleccionan primero los k mejores
+        (selección parcial) y solo esas filas se copian del dataset.
+        """
+        posiciones = seleccionar_top(self.df, posiciones, ordenar_por=ordenar_por,
+                                     ascendente=ascendente, limite=limite)
+        return self.df.iloc[posiciones]
+    
+    def explicar_busqueda(self, criterios: Dict[str, Any]) -> pd.DataFrame:
+        """
+        Muestra el plan de ejecución de una búsqueda sin ejecutarla
         
-        print(f"✓ Encontrados {len(resultado)} inmuebles que cumplen los criterios")
+        Indica, en orden de ejecución, la estrategia de cada predicado
+        (bitmap, rango o recorrido) y su selectividad estimada.
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        plan = compilar_criterios(criterios, self.df.columns)
+        return pd.DataFrame(plan.explicar(indices=self._indices_vigentes()))
+    
+    def _columnas_amenidades(self) -> List[str]:
+        return [col for col in self.df.columns
+                if col.startswith('tiene_') or col.startswith('amenidad_')]
+    
+    def score_amenidades(self, amenidades: List[str] = None) -> pd.Series:
+        """
+        Cuenta cuántas amenidades tiene cada inmueble
+        
+        Args:
+            amenidades: Columnas booleanas a sumar. Por defecto todas las
+                columnas 'tiene_*' y 'amenidad_*' del dataset
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        if amenidades is None:
+            amenidades = self._columnas_amenidades()
+        
+        indices = self._indices_vigentes()
+        if indices is not None and all(col in indices.bitmap.bitsets for col in amenidades):
+            conteo = indices.bitmap.contar_por_fila(amenidades).astype(np.int64)
+            return pd.Series(conteo, index=self.df.index, name='score_amenidades')
+        
+        return self.df[amenidades].sum(axis=1).rename('score_amenidades')
+    
+    def posiciones_skyline(self, dimensiones: Dict[str, str] = None,
+                           criterios: Dict[str, Any] = None) -> np.ndarray:
+        """
+        Posiciones de los inmuebles del skyline (frontera de Pareto)
+        
+        Un inmueble está en el skyline si ningún otro es igual o mejor en
+        todas las dimensiones y estrictamente mejor en alguna.
+        
+        Args:
+            dimensiones: Columna y sentido ('min' o 'max') de cada dimensión.
+                'score_amenidades' cuenta las amenidades (ver score_amenidades).
+                Por defecto: precio mínimo, área máxima, antigüedad mínima y
+                más amenidades
+            criterios: Criterios de filtrado previos, como en
+                categorizar_inmuebles; el skyline se calcula sobre el resultado
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        if dimensiones is None:
+            dimensiones = {'precio': 'min', 'area_m2': 'max', 'antiguedad_anos': 'min',
+                           'score_amenidades': 'max'}
+        if not isinstance(dimensiones, dict) or not dimensiones:
+            raise ValueError("Las dimensiones deben ser un diccionario {columna: 'min' | 'max'}")
+        for columna, sentido in dimensiones.items():
+            if sentido not in ('min', 'max'):
+                raise ValueError(f"Sentido inválido para '{columna}': '{sentido}'. Use 'min' o 'max'")
+            if columna != 'score_amenidades' and columna not in self.df.columns:
+                raise ValueError(f"La columna '{columna}' no existe en el dataset")
+        
+        posiciones = self.filtrar_posiciones(criterios) if criterios else np.arange(len(self.df))
+        
+        # Todas las dimensiones se minimizan: las de 'max' se niegan
+        valores = np.empty((len(posiciones), len(dimensiones)))
+        for j, (columna, sentido) in enumerate(dimensiones.items()):
+            serie = self.score_amenidades() if columna == 'score_amenidades' else self.df[columna]
+            columna_valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            valores[:, j] = columna_valores[posiciones] if sentido == 'min' else -columna_valores[posiciones]
+        
+        return posiciones[calcular_skyline(valores)]
+    
+    def skyline(self, dimensiones: Dict[str, str] = None, criterios: Dict[str, Any] = None,
+                ordenar_por: str = None, ascendente: bool = True, limite: int = None) -> pd.DataFrame:
+        """
+        Inmuebles que ningún otro supera en todas las dimensiones a la vez
+        
+        Ejemplo:
+            modelo.skyline(
+                dimensiones={'precio': 'min', 'area_m2': 'max', 'score_amenidades': 'max'},
+                criterios={'tipo': 'Casa', 'ubicacion': 'Norte'}
+            )
+        
+        Ver posiciones_skyline(). Incluye la columna 'score_amenidades' si es
+        una de las dimensiones; ordenar_por, ascendente y limite funcionan
+        como en categorizar_inmuebles.
+        """
+        print("\n🔍 Calculando skyline...")
+        posiciones = self.posiciones_skyline(dimensiones, criterios)
+        print(f"✓ Skyline: {len(posiciones)} inmuebles no dominados")
+        
+        return self.materializar_skyline(posiciones, dimensiones, ordenar_por=ordenar_por,
+                                         ascendente=ascendente, limite=limite)
+    
+    def materializar_skyline(self, posiciones: np.ndarray, dimensiones: Dict[str, str] = None,
+                             ordenar_por: str = None, ascendente: bool = True,
+                             limite: int = None) -> pd.DataFrame:
+        """
+        Construye el DataFrame del skyline a partir de posiciones_skyline()
         
+        Como materializar(), solo copia las filas retornadas; la columna
+        'score_amenidades' (si es una de las dimensiones) se calcula solo
+        para esas filas.
+        """
+        resultado = self.materializar(posiciones, ordenar_por=ordenar_por,
+                                      ascendente=ascendente, limite=limite)
+        if dimensiones is None or 'score_amenidades' in dimensiones:
+            resultado = resultado.assign(score_amenidades=resultado[self._columnas_amenidades()].sum(axis=1))
         return resultado
     
-    def buscar_similares(self, inmueble_id: int, n_similares: int = 5) -> pd.DataFrame:
+    def calcular_facetas(self, columnas: List[str],
+                         posiciones: np.ndarray = None) -> Dict[str, Dict[Any, int]]:
+        """
+        Cuenta los inmuebles por valor de cada columna categórica
+        
+        Args:
+            columnas: Columnas a contar (ej. ['tipo', 'ubicacion'])
+            posiciones: Posiciones del resultado (ver filtrar_posiciones).
+                Por defecto se cuenta todo el dataset
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        indices = self._indices_vigentes()
+        return calcular_facetas(self.df, columnas, posiciones=posiciones,
+                                bitmap=indices.bitmap if indices is not None else None)
+    
+    def histogramas(self, criterios: Dict[str, Any] = None, columnas: List[str] = None,
+                    n_hilos: int = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Histogramas de columnas numéricas sobre los inmuebles que cumplen los criterios
+        
+        Los intervalos son fijos (calculados al cargar sobre todo el dataset),
+        así que solo cambian los conteos al variar los filtros.
+        
+        Args:
+            criterios: Criterios de búsqueda (ver categorizar_inmuebles).
+                Por defecto se usa todo el dataset
+            columnas: Columnas numéricas (default: self.columnas_histograma)
+            n_hilos: Hilos para la búsqueda (default: self.n_hilos_busqueda)
+        
+        Returns:
+            {columna: {'bordes', 'conteos', 'total', 'minimo', 'maximo'}}
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        columnas = columnas or self.columnas_histograma
+        indices = self._indices_vigentes()
+        if indices is not None and all(col in indices.histogramas.bordes for col in columnas):
+            indice = indices.histogramas
+        else:
+            indice = IndiceHistogramas(self.df, columnas)
+        
+        posiciones = self.filtrar_posiciones(criterios, n_hilos=n_hilos) if criterios else None
+        return {columna: indice.histograma(columna, posiciones) for columna in columnas}
+    
+    def promedios_faceta(self, columna: str, columna_valor: str = 'precio',
+                         posiciones: np.ndarray = None) -> Dict[Any, float]:
         """
-        Encuentra inmuebles similares basándose en clustering
+        Promedio de columna_valor por cada valor de columna
+        
+        Equivale a df.groupby(columna)[columna_valor].mean(), opcionalmente
+        restringido a las posiciones de un resultado.
+        """
+        if self.df is None:
+            raise ValueError("Primero debe cargar un dataset")
+        
+        indices = self._indices_vigentes()
+        return promedios_faceta(self.df, columna, columna_valor, posiciones=posiciones,
+                                bitmap=indices.bitmap if indices is not None else None)
+    
+    def construir_indice_vecinos(self, X_scaled: np.ndarray = None):
+        """
+        Construye el índice de vecinos más cercanos sobre la matriz de
+        características escalada
+        
+        Por defecto es exacto (un KDTree por cluster). Con
+        similitud_aproximada=True es un índice IVF: los centroides del
+        clustering son las listas invertidas y cada inmueble guarda su residuo
+        cuantizado a 8 bits por característica.
+        
+        Se ejecuta automáticamente al entrenar el clustering y al cargar un
+        modelo con un dataset ya preprocesado.
+        """
+        if self.df is None or self.modelo_clustering is None:
+            raise ValueError("Primero debe entrenar el modelo de clustering")
+        
+        if X_scaled is None:
+            X_scaled = self.matriz_escalada('clustering')
+        if 'cluster' not in self.df.columns:
+            self._asignar_columna('cluster', self.modelo_clustering.predict(X_scaled))
+        
+        if self.similitud_aproximada:
+            self.indice_vecinos = IndiceIVF(X_scaled, self.modelo_clustering.cluster_centers_,
+                                            self.df['cluster'].to_numpy())
+            # El índice guarda los residuos de 8 bits; la matriz escalada densa no se conserva
+            if self._almacen is not None:
+                self._almacen.descartar('clustering')
+            print(f"✓ Índice aproximado (IVF): {self.indice_vecinos.n_filas} inmuebles "
+                  f"en {len(self.indice_vecinos.centroides)} listas, "
+                  f"{self.indice_vecinos.bytes_por_vector} bytes por inmueble")
+        else:
+            self.indice_vecinos = IndiceVecinos(X_scaled, self.df['cluster'].to_numpy())
+            print(f"✓ Índice de vecinos: {self.indice_vecinos.n_filas} inmuebles "
+                  f"en {len(self.indice_vecinos.arboles)} árboles")
+        
+        return self.indice_vecinos
+    
+    def _columnas_similitud(self) -> List[str]:
+        if self.columnas_clustering is not None:
+            return self.columnas_clustering
+        return self._columnas_caracteristicas()
+    
+    def buscar_similares(self, inmueble_id: int, n_similares: int = 5,
+                         mismo_cluster: bool = False, n_sondas: int = None) -> pd.DataFrame:
+        """
+        Encuentra los inmuebles más cercanos en el espacio de características escalado
+        
+        Args:
+            inmueble_id: Posición del inmueble de referencia
+            n_similares: Número de inmuebles a retornar
+            mismo_cluster: Si es True solo se buscan inmuebles del mismo cluster
+            n_sondas: Solo en modo aproximado; listas recorridas por la
+                consulta (default: self.n_sondas). Más sondas dan mayor
+                recall a cambio de más latencia
+        
+        Returns:
+            DataFrame ordenado por la columna 'distancia' (euclídea; aproximada
+            en modo aproximado)
         """
         if self.modelo_clustering is None:
             raise ValueError("Primero debe entrenar el modelo de clustering")
         
-        if inmueble_id >= len(self.df):
+        if inmueble_id < 0 or inmueble_id >= len(self.df):
             raise ValueError(f"ID de inmueble inválido: {inmueble_id}")
         
-        cluster_objetivo = self.df.iloc[inmueble_id]['cluster']
-        similares = self.df[self.df['cluster'] == cluster_objetivo]
-        similares = similares[similares.index != inmueble_id]
+        if self.indice_vecinos is None or self.indice_vecinos.n_filas != len(self.df):
+            self.construir_indice_vecinos()
+        
+        if isinstance(self.indice_vecinos, IndiceIVF):
+            # La consulta usa el vector exacto del inmueble, no su versión
+            # cuantizada; se escala solo su fila para no mantener la matriz densa
+            punto = self._escalar_datos(self.df.iloc[[inmueble_id]], ['clustering'])['clustering'][0]
+            posiciones, distancias = self.indice_vecinos.vecinos(
+                inmueble_id, n_similares, mismo_grupo=mismo_cluster,
+                n_sondas=n_sondas or self.n_sondas, punto=punto
+            )
+        else:
+            posiciones, distancias = self.indice_vecinos.vecinos(inmueble_id, n_similares,
+                                                                 mismo_grupo=mismo_cluster)
+        return self.df.iloc[posiciones].assign(distancia=distancias)
+    
+    def exportar_bosque(self):
+        """
+        Exporta el clasificador a arreglos contiguos para inferencia con NumPy
+        
+        El bosque aplanado da exactamente las mismas probabilidades que
+        sklearn, sin su costo fijo por llamada, y predecir() lo usa para
+        lotes pequeños (hasta FILAS_MAX_APLANADO filas). Se
+        ejecuta automáticamente al entrenar y al cargar un modelo con el
+        backend 'random_forest'; con otros backends se mantiene la ruta de
+        sklearn.
+        """
+        self.bosque_aplanado = None
+        if self.modelo_clasificacion is None:
+            raise ValueError("Primero debe entrenar el modelo de clasificación")
+        
+        try:
+            self.bosque_aplanado = BosqueAplanado(self.modelo_clasificacion)
+        except ValueError as e:
+            print(f"⚠️  No se exportó el clasificador: {e}")
+            return None
+        
+        print(f"✓ Bosque exportado: {self.bosque_aplanado.n_arboles} árboles, "
+              f"{self.bosque_aplanado.n_nodos} nodos")
+        return self.bosque_aplanado
+    
+    def predecir(self, datos, tamano_lote: int = 100000):
+        """
+        Predice categoría de precio, probabilidades y cluster de inmuebles nuevos
+        
+        Aplica la misma codificación y escalado del entrenamiento: los
+        label_encoders guardados, el orden de características persistido y el
+        scaler de cada modelo. Los valores categóricos no vistos en el
+        entrenamiento (y los faltantes) se codifican como -1; los numéricos
+        faltantes toman la media del scaler, igual que la imputación del
+        preprocesamiento.
         
-        return similares.head(n_similares)
+        Args:
+            datos: DataFrame de inmuebles sin procesar o iterador de DataFrames
+                (ej. pd.read_csv(ruta, chunksize=100000))
+            tamano_lote: Filas procesadas a la vez cuando datos es un DataFrame
+        
+        Returns:
+            DataFrame con 'categoria_predicha', una columna 'prob_<categoría>'
+            por clase y 'cluster' (según los modelos entrenados), con el mismo
+            índice de los datos. Con un iterador retorna un generador de
+            DataFrames, uno por trozo, de modo que la memoria queda acotada
+        """
+        if self.modelo_clasificacion is None and self.modelo_clustering is None:
+            raise ValueError("Primero debe entrenar o cargar un modelo")
+        
+        if isinstance(datos, pd.DataFrame):
+            trozos = [self._predecir_trozo(datos.iloc[inicio:inicio + tamano_lote])
+                      for inicio in range(0, max(len(datos), 1), tamano_lote)]
+            return pd.concat(trozos)
+        return (self._predecir_trozo(trozo) for trozo in datos)
+    
+    def analisis_what_if(self, inmueble, variaciones: Dict[str, List[Any]],
+                         max_variantes: int = 100000) -> pd.DataFrame:
+        """
+        Predice la categoría de un inmueble bajo todas las combinaciones de cambios
+        
+        Expande la grilla de variaciones (producto cartesiano) en una sola
+        matriz que se codifica, escala y evalúa con una única llamada al
+        clasificador.
+        
+        Args:
+            inmueble: Inmueble base (dict o Series con las columnas del dataset)
+                o su ID (posición en self.df)
+            variaciones: Valores alternativos por característica que usa el
+                clasificador (ver columnas_clasificacion; las categóricas por su
+                nombre sin '_encoded')
+                Ejemplo: {
+                    'area_m2': [120, 150],
+                    'estacionamientos': [2, 3, 4],
+                    'estado': ['Excelente']
+                }
+            max_variantes: Máximo de combinaciones permitidas
+        
+        Returns:
+            DataFrame con una fila por variante (la fila 0 es el inmueble sin
+            cambios): las características variadas, la predicción, la
+            probabilidad de la categoría predicha y si la categoría cambia
+            respecto al inmueble base
+        """
+        if self.modelo_clasificacion is None:
+            raise ValueError("Primero debe entrenar el modelo de clasificación")
+        
+        if isinstance(inmueble, (int, np.integer)):
+            if self.df is None or not 0 <= inmueble < len(self.df):
+                raise ValueError(f"ID de inmueble inválido: {inmueble}")
+            inmueble = self.df.iloc[inmueble]
+        base = pd.DataFrame([dict(inmueble)])
+        
+        if not isinstance(variaciones, dict) or not variaciones:
+            raise ValueError("Las variaciones deben ser un diccionario {característica: [valores]}")
+        for columna, valores in variaciones.items():
+            if not isinstance(valores, (list, tuple)) or len(valores) == 0:
+                raise ValueError(f"La variación de '{columna}' debe ser una lista no vacía de valores")
+        
+        # Una columna que el clasificador no usa no cambiaría ninguna predicción
+        usadas = {col[:-len('_encoded')] if col.endswith('_encoded') else col
+                  for col in self.columnas_clasificacion or self._columnas_similitud()}
+        no_usadas = [columna for columna in variaciones if columna not in usadas]
+        if no_usadas:
+            raise ValueError(f"El clasificador no usa las columnas {no_usadas}. "
+                             f"Columnas disponibles: {sorted(usadas)}")
+        
+        n_variantes = int(np.prod([len(valores) for valores in variaciones.values()]))
+        if n_variantes > max_variantes:
+            raise ValueError(f"La grilla genera {n_variantes} variantes (máximo: {max_variantes})")
+        
+        # Las columnas ya codificadas se recalculan a partir de los valores variados
+        codificadas = [col for col in base.columns
+                       if col.endswith('_encoded') and col[:-len('_encoded')] in base.columns]
+        base = base.drop(columns=codificadas)
+        
+        # Fila 0: inmueble base; luego una fila por combinación
+        combinaciones = list(itertools.product(*variaciones.values()))
+        variantes = base.loc[np.zeros(n_variantes + 1, dtype=np.int64)].reset_index(drop=True)
+        cambios = pd.DataFrame(combinaciones, columns=list(variaciones.keys()), index=range(1, n_variantes + 1))
+        for columna in variaciones:
+            if columna in variantes.columns:
+                variantes[columna] = pd.concat([variantes[columna].iloc[:1], cambios[columna]])
+            else:
+                variantes[columna] = pd.concat([pd.Series([np.nan]), cambios[columna]])
+        
+        predicciones = self.predecir(variantes)
+        probabilidades = predicciones.filter(like='prob_')
+        
+        resultado = variantes[list(variaciones.keys())].copy()
+        resultado['categoria_predicha'] = predicciones['categoria_predicha']
+        resultado['probabilidad'] = probabilidades.to_numpy().max(axis=1)
+        resultado = pd.concat([resultado, probabilidades], axis=1)
+        if 'cluster' in predicciones.columns:
+            resultado['cluster'] = predicciones['cluster']
+        resultado['cambia_categoria'] = resultado['categoria_predicha'] != resultado['categoria_predicha'].iloc[0]
+        
+        return resultado
+    
+    def _predecir_trozo(self, trozo: pd.DataFrame) -> pd.DataFrame:
+        """
+        Codifica, escala y predice un trozo de inmuebles
+        """
+        resultado = pd.DataFrame(index=trozo.index)
+        if len(trozo) == 0:
+            return resultado
+        
+        modelos = [nombre for nombre, modelo in [('clasificacion', self.modelo_clasificacion),
+                                                 ('clustering', self.modelo_clustering)]
+                   if modelo is not None]
+        escaladas = self._escalar_datos(trozo, modelos)
+        
+        if self.modelo_clasificacion is not None:
+            X_clasificacion = escaladas['clasificacion']
+            if self.bosque_aplanado is not None and len(X_clasificacion) <= FILAS_MAX_APLANADO:
+                probabilidades = self.bosque_aplanado.predict_proba(X_clasificacion)
+            else:
+                probabilidades = self.modelo_clasificacion.predict_proba(X_clasificacion)
+            clases = self.modelo_clasificacion.classes_
+            if 'objetivo' in self.label_encoders:
+                clases = self.label_encoders['objetivo'].inverse_transform(clases)
+            
+            resultado['categoria_predicha'] = np.asarray(clases)[probabilidades.argmax(axis=1)]
+            for i, clase in enumerate(clases):
+                resultado[f'prob_{clase}'] = probabilidades[:, i]
+        
+        if self.modelo_clustering is not None:
+            resultado['cluster'] = self.modelo_clustering.predict(escaladas['clustering'])
+        
+        return resultado
+    
+    def _escalar_datos(self, datos: pd.DataFrame, modelos: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Codifica datos sin procesar y los escala con el scaler de cada modelo
+        """
+        scalers = {
+            'clasificacion': (self.scaler_clasificacion,
+                              self.columnas_clasificacion or self._columnas_similitud()),
+            'clustering': (self.scaler_clustering, self._columnas_similitud())
+        }
+        
+        # La unión de las columnas de los scalers se codifica una sola vez
+        entradas = {nombre: self._columnas_scaler(scalers[nombre][0], scalers[nombre][1])
+                    for nombre in modelos}
+        union = list(dict.fromkeys(col for columnas in entradas.values() for col in columnas))
+        crudo = codificar_caracteristicas(datos, union, self.label_encoders)
+        
+        escaladas = {}
+        for nombre in modelos:
+            scaler, columnas = scalers[nombre]
+            X = crudo[:, self._posiciones(union, entradas[nombre])]
+            imputar_medias(X, getattr(scaler, 'mean_', None))
+            X_scaled = scaler.transform(X)
+            if entradas[nombre] != list(columnas):
+                X_scaled = X_scaled[:, self._posiciones(entradas[nombre], columnas)]
+            escaladas[nombre] = X_scaled
+        return escaladas
     
     def guardar_modelo(self, ruta: str = 'modelo_inmuebles.pkl'):
         """
@@ -297,11 +1747,17 @@ class ModeloInmuebles:
         """
         modelo_data = {
             'scaler': self.scaler,
+            'scaler_clasificacion': self.scaler_clasificacion,
+            'scaler_clustering': self.scaler_clustering,
             'label_encoders': self.label_encoders,
             'modelo_clasificacion': self.modelo_clasificacion,
+            'backend_clasificacion': self.backend_clasificacion,
             'modelo_clustering': self.modelo_clustering,
+            'monitor_deriva': self.monitor_deriva,
             'caracteristicas_numericas': self.caracteristicas_numericas,
             'caracteristicas_categoricas': self.caracteristicas_categoricas,
+            'columnas_clasificacion': self.columnas_clasificacion,
+            'columnas_clustering': self.columnas_clustering,
             'categorias_precio': self.categorias_precio
         }
         joblib.dump(modelo_data, ruta)
@@ -312,14 +1768,30 @@ class ModeloInmuebles:
         Carga un modelo previamente entrenado
         """
         modelo_data = joblib.load(ruta)
-        self.scaler = modelo_data['scaler']
+        # Los modelos anteriores guardaban un único scaler compartido
+        self.scaler_clasificacion = modelo_data.get('scaler_clasificacion', modelo_data['scaler'])
+        self.scaler_clustering = modelo_data.get('scaler_clustering', modelo_data['scaler'])
         self.label_encoders = modelo_data['label_encoders']
         self.modelo_clasificacion = modelo_data['modelo_clasificacion']
+        self.backend_clasificacion = modelo_data.get('backend_clasificacion', 'random_forest')
         self.modelo_clustering = modelo_data['modelo_clustering']
+        self.monitor_deriva = modelo_data.get('monitor_deriva')
         self.caracteristicas_numericas = modelo_data['caracteristicas_numericas']
         self.caracteristicas_categoricas = modelo_data['caracteristicas_categoricas']
         self.categorias_precio = modelo_data.get('categorias_precio')
+        self.columnas_clasificacion = modelo_data.get('columnas_clasificacion')
+        self.columnas_clustering = modelo_data.get('columnas_clustering')
         print(f"✓ Modelo cargado desde: {ruta}")
+        
+        self.bosque_aplanado = None
+        if self.modelo_clasificacion is not None and self.backend_clasificacion == 'random_forest':
+            self.exportar_bosque()
+        
+        # Con un dataset ya preprocesado se reconstruye el índice de vecinos
+        self.indice_vecinos = None
+        if self.df is not None and self.modelo_clustering is not None and \
+                all(col in self.df.columns for col in self._columnas_similitud()):
+            self.construir_indice_vecinos()
     
     def generar_reporte(self, resultado: pd.DataFrame, nombre_archivo: str = 'reporte_inmuebles.csv'):
         """
@@ -0,0 +1,1293 @@
+"""
+Motor de búsqueda para el modelo de inmuebles
+Compila criterios de filtrado en planes que se evalúan como una sola máscara booleana
+"""
+
+import pandas as pd
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
+
+
+# Número de bits encendidos para cada valor posible de un byte
+_POPCOUNT_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Por encima de esta fracción de filas seleccionadas, recorrer la columna es
+# más barato que marcar las filas del rango una a una
+FRACCION_MAX_RANGO = 0.15
+
+# Por debajo de esta fracción de candidatos, los predicados restantes se
+# evalúan solo sobre las filas candidatas en lugar de sobre toda la columna
+FRACCION_DISPERSA = 0.1
+
+# Filas por bloque al evaluar expresiones: los temporales de cada subexpresión
+# (máscaras y lecturas de columna) caben en la caché en lugar de ocupar n filas
+TAMANO_BLOQUE = 65536
+
+# Costo relativo por fila de cada estrategia de evaluación
+COSTO_BITMAP = 0.02
+COSTO_RANGO = 4.0
+COSTO_RECORRIDO = 1.0
+COSTO_RECORRIDO_OBJETO = 3.0
+
+# Selectividad supuesta cuando no hay estadísticas de la columna
+SELECTIVIDAD_DEFECTO = {'==': 0.1, 'en': 0.3, '>=': 0.5, '<=': 0.5}
+
+# Skyline: filas por bloque del recorrido ordenado y filas del skyline
+# comparadas a la vez. El primer tramo es pequeño porque las primeras filas
+# del skyline descartan casi todos los candidatos; luego se duplica hasta
+# ELEMENTOS_SKYLINE comparaciones (candidatos x tramo) por paso
+TAMANO_BLOQUE_SKYLINE = 4096
+TAMANO_TRAMO_SKYLINE_INICIAL = 16
+ELEMENTOS_SKYLINE = 1 << 20
+
+
+class Predicado:
+    """
+    Condición elemental sobre una columna del dataset
+    """
+
+    def __init__(self, columna: str, operador: str, valor: Any):
+        self.columna = columna
+        self.operador = operador
+        self.valor = valor
+
+    def evaluar(self, serie: pd.Series, posiciones: np.ndarray = None) -> np.ndarray:
+        """
+        Evalúa el predicado sobre una columna y retorna una máscara booleana
+
+        Si se indican posiciones, solo se evalúan esas filas y la máscara
+        tiene la longitud de las posiciones.
+        """
+        valores = _valores_columna(serie)
+        if posiciones is not None:
+            valores = valores[posiciones] if isinstance(valores, np.ndarray) else valores.iloc[posiciones]
+
+        if self.operador == '>=':
+            mascara = valores >= self.valor
+        elif self.operador == '<=':
+            mascara = valores <= self.valor
+        elif self.operador == 'en':
+            mascara = pd.Series(valores, copy=False).isin(self.valor)
+        else:
+            mascara = valores == self.valor
+
+        return np.asarray(mascara, dtype=bool)
+
+    def __repr__(self):
+        return f"Predicado({self.columna!r} {self.operador} {self.valor!r})"
+
+
+class PasoPlan:
+    """
+    Paso de ejecución: uno o varios predicados sobre una columna y la estrategia elegida
+    """
+
+    def __init__(self, predicados: List[Predicado], estrategia: str, selectividad: float, costo: float):
+        self.predicados = predicados
+        self.estrategia = estrategia
+        self.selectividad = selectividad
+        self.costo = costo
+
+    @property
+    def columna(self) -> str:
+        return self.predicados[0].columna
+
+    def prioridad(self) -> float:
+        """
+        Costo por unidad de filas descartadas: menor es mejor
+        """
+        descarte = 1.0 - self.selectividad
+        if descarte <= 0:
+            return float('inf')
+        return self.costo / descarte
+
+
+class PlanBusqueda:
+    """
+    Conjunto de predicados compilados a partir de un diccionario de criterios
+    """
+
+    def __init__(self, predicados: List[Predicado], nodos: List['Nodo'] = None):
+        self.predicados = predicados
+        self.nodos = nodos or []
+
+    def planificar(self, indices: Optional['IndicesBusqueda'] = None) -> List[PasoPlan]:
+        """
+        Ordena la ejecución de los predicados según su selectividad estimada
+
+        Los predicados resolubles con el índice de bitmaps van primero (son los
+        más baratos); los rangos de una misma columna se agrupan en un paso.
+        El resto se ordena por costo por fila descartada, de modo que los
+        predicados más selectivos y baratos reducen antes los candidatos.
+        """
+        bitmap = indices.bitmap if indices is not None else None
+        rango = indices.rango if indices is not None else None
+        estadisticas = indices.estadisticas if indices is not None else None
+
+        def estimar(predicados):
+            if estadisticas is None:
+                return float(np.prod([SELECTIVIDAD_DEFECTO[p.operador] for p in predicados]))
+            return estadisticas.selectividad(predicados)
+
+        pasos = []
+        rangos = {}
+        for predicado in self.predicados:
+            if bitmap is not None and bitmap.admite(predicado):
+                pasos.append(PasoPlan([predicado], 'bitmap', estimar([predicado]), COSTO_BITMAP))
+            elif rango is not None and rango.admite(predicado):
+                rangos.setdefault(predicado.columna, []).append(predicado)
+            else:
+                costo = COSTO_RECORRIDO if estadisticas is None or estadisticas.es_numerica(predicado.columna) \
+                    else COSTO_RECORRIDO_OBJETO
+                pasos.append(PasoPlan([predicado], 'recorrido', estimar([predicado]), costo))
+
+        for columna, predicados in rangos.items():
+            # El índice de rango da la selectividad exacta sin recorrer la columna
+            inicio, fin = rango.tramo(columna, predicados)
+            selectividad = (fin - inicio) / max(rango.n_filas, 1)
+            if selectividad > FRACCION_MAX_RANGO:
+                pasos.append(PasoPlan(predicados, 'recorrido', selectividad, COSTO_RECORRIDO))
+            else:
+                pasos.append(PasoPlan(predicados, 'rango', selectividad, COSTO_RANGO * selectividad))
+
+        pasos.sort(key=lambda paso: (paso.estrategia != 'bitmap', paso.prioridad()))
+        return pasos
+
+    def posiciones(self, df: pd.DataFrame, indices: Optional['IndicesBusqueda'] = None,
+                   n_hilos: int = 1) -> np.ndarray:
+        """
+        Ejecuta el plan y retorna las posiciones (ordenadas) de las filas que cumplen
+
+        Los bitmaps se combinan primero con AND sobre bitsets empaquetados. Luego
+        cada paso reduce los candidatos; cuando quedan pocos, los pasos
+        siguientes solo leen las filas candidatas. La ejecución se corta en
+        cuanto no queda ningún candidato. Las expresiones 'o'/'y'/'no' se
+        evalúan al final, bloque a bloque, solo donde quedan candidatos.
+
+        Con n_hilos > 1 las filas se reparten en particiones contiguas que se
+        evalúan en paralelo; el resultado es idéntico al de la ruta serial.
+        """
+        if n_hilos > 1 and len(df) > TAMANO_BLOQUE:
+            return self._posiciones_paralelo(df, indices, n_hilos)
+
+        if self.nodos and not self.predicados:
+            return self._filtrar_bloques(df, indices, self.nodos)
+
+        posiciones = self._posiciones_predicados(df, indices)
+        if self.nodos and len(posiciones) > 0:
+            posiciones = self._filtrar_bloques(df, indices, self.nodos, posiciones)
+        return posiciones
+
+    def _posiciones_paralelo(self, df: pd.DataFrame, indices: Optional['IndicesBusqueda'],
+                             n_hilos: int) -> np.ndarray:
+        """
+        Evalúa el plan por particiones de filas en un pool de hilos
+
+        Cada partición aplica los predicados (en el orden del planificador) y
+        las expresiones bloque a bloque; las comparaciones de NumPy liberan el
+        GIL, de modo que las particiones avanzan en paralelo.
+        """
+        nodos = [NodoPredicado(p) for paso in self.planificar(indices) for p in paso.predicados]
+        nodos += self.nodos
+        n_filas = len(df)
+        if not nodos:
+            return np.arange(n_filas)
+
+        # Varias particiones por hilo para equilibrar la carga; múltiplos de
+        # TAMANO_BLOQUE para que los bitsets se corten en bytes completos
+        n_particiones = n_hilos * 4
+        tamano = -(-n_filas // n_particiones)
+        tamano = -(-tamano // TAMANO_BLOQUE) * TAMANO_BLOQUE
+        limites = [(inicio, min(inicio + tamano, n_filas)) for inicio in range(0, n_filas, tamano)]
+
+        resultados = _pool_hilos(n_hilos).map(
+            lambda limite: self._filtrar_bloques(df, indices, nodos, None, *limite), limites
+        )
+        return np.concatenate(list(resultados))
+
+    def _filtrar_bloques(self, df: pd.DataFrame, indices: Optional['IndicesBusqueda'], nodos: List['Nodo'],
+                         posiciones: Optional[np.ndarray] = None, inicio: int = 0, fin: int = None) -> np.ndarray:
+        """
+        Conserva las posiciones de [inicio, fin) que cumplen todos los nodos, por bloques
+
+        Si posiciones es None se parte de todas las filas del tramo.
+        """
+        fin = len(df) if fin is None else fin
+        conservadas = [np.empty(0, dtype=np.int64)]
+        for bloque in range(inicio, fin, TAMANO_BLOQUE):
+            bloque_fin = min(bloque + TAMANO_BLOQUE, fin)
+            pendientes = nodos
+            if posiciones is None:
+                candidatas = np.flatnonzero(nodos[0].evaluar(df, indices, bloque, bloque_fin)) + bloque
+                pendientes = nodos[1:]
+            else:
+                a, b = np.searchsorted(posiciones, [bloque, bloque_fin])
+                candidatas = posiciones[a:b]
+
+            for nodo in pendientes:
+                if len(candidatas) == 0:
+                    break
+                # Con pocos candidatos se leen solo esas filas; si no, el bloque entero
+                if len(candidatas) <= FRACCION_DISPERSA * (bloque_fin - bloque):
+                    cumple = nodo.evaluar(df, indices, bloque, bloque_fin, candidatas)
+                else:
+                    cumple = nodo.evaluar(df, indices, bloque, bloque_fin)[candidatas - bloque]
+                candidatas = candidatas[cumple]
+            conservadas.append(candidatas.astype(np.int64, copy=False))
+
+        return np.concatenate(conservadas)
+
+    def _posiciones_predicados(self, df: pd.DataFrame, indices: Optional['IndicesBusqueda']) -> np.ndarray:
+        """
+        Ejecuta los pasos planificados de los predicados simples
+        """
+        n_filas = len(df)
+        vacio = np.empty(0, dtype=np.int64)
+        mascara = None
+        posiciones = None
+
+        pasos = self.planificar(indices)
+        bits = None
+        for paso in pasos:
+            if paso.estrategia != 'bitmap':
+                continue
+            bitset = indices.bitmap.bitset_predicado(paso.predicados[0])
+            bits = bitset.copy() if bits is None else bits & bitset
+            if not bits.any():
+                return vacio
+        if bits is not None:
+            mascara = desempaquetar(bits, n_filas)
+
+        for paso in pasos:
+            if paso.estrategia == 'bitmap':
+                continue
+
+            if posiciones is not None:
+                serie = df[paso.columna]
+                for predicado in paso.predicados:
+                    posiciones = posiciones[predicado.evaluar(serie, posiciones)]
+            elif paso.estrategia == 'rango':
+                filas = indices.rango.filas(paso.columna, paso.predicados)
+                if mascara is not None:
+                    filas = filas[mascara[filas]]
+                posiciones = np.sort(filas).astype(np.int64)
+                mascara = None
+            else:
+                serie = df[paso.columna]
+                for predicado in paso.predicados:
+                    if mascara is None:
+                        mascara = predicado.evaluar(serie)
+                    else:
+                        mascara = mascara & predicado.evaluar(serie)
+
+            if posiciones is None and mascara is not None:
+                candidatos = np.count_nonzero(mascara)
+                if candidatos <= FRACCION_DISPERSA * n_filas:
+                    posiciones = np.flatnonzero(mascara)
+                    mascara = None
+
+            if posiciones is not None and len(posiciones) == 0:
+                return vacio
+
+        if posiciones is not None:
+            return posiciones
+        if mascara is not None:
+            return np.flatnonzero(mascara)
+        return np.arange(n_filas)
+
+    def evaluar(self, df: pd.DataFrame, indices: Optional['IndicesBusqueda'] = None) -> np.ndarray:
+        """
+        Ejecuta el plan y retorna una máscara booleana sobre todas las filas
+        """
+        mascara = np.zeros(len(df), dtype=bool)
+        mascara[self.posiciones(df, indices)] = True
+        return mascara
+
+    def explicar(self, indices: Optional['IndicesBusqueda'] = None) -> List[Dict[str, Any]]:
+        """
+        Describe el orden de ejecución elegido por el planificador
+        """
+        filas = [
+            {
+                'columna': paso.columna,
+                'predicados': ' y '.join(f"{p.operador} {p.valor!r}" for p in paso.predicados),
+                'estrategia': paso.estrategia,
+                'selectividad_estimada': round(paso.selectividad, 6),
+            }
+            for paso in self.planificar(indices)
+        ]
+        filas += [
+            {'columna': None, 'predicados': repr(nodo), 'estrategia': 'bloques', 'selectividad_estimada': None}
+            for nodo in self.nodos
+        ]
+        return [{'orden': orden, **fila} for orden, fila in enumerate(filas, 1)]
+
+
+def ejecutar_lote(df: pd.DataFrame, planes: List[PlanBusqueda], indices: Optional['IndicesBusqueda'] = None,
+                  solo_conteo: bool = False, n_hilos: int = 1) -> List[Any]:
+    """
+    Ejecuta varios planes en una sola pasada por bloques de filas
+
+    Cada bloque se recorre una vez para todo el lote: los predicados
+    idénticos (misma columna, operador y valor) se evalúan una sola vez por
+    bloque y se reutilizan en todas las búsquedas que los contienen, y las
+    columnas se leen por bloque mientras siguen en caché.
+
+    Retorna, por cada plan, las posiciones que cumplen (ordenadas) o, con
+    solo_conteo, el número de filas.
+    """
+    raices = []
+    for plan in planes:
+        nodos = [NodoPredicado(p) for p in plan.predicados] + plan.nodos
+        raices.append(None if not nodos else nodos[0] if len(nodos) == 1 else NodoY(nodos))
+
+    n_filas = len(df)
+    if n_hilos > 1 and n_filas > TAMANO_BLOQUE:
+        tamano = -(-n_filas // (n_hilos * 4))
+        tamano = -(-tamano // TAMANO_BLOQUE) * TAMANO_BLOQUE
+        limites = [(inicio, min(inicio + tamano, n_filas)) for inicio in range(0, n_filas, tamano)]
+    else:
+        limites = [(0, n_filas)]
+
+    def tramo(limite):
+        return _lote_tramo(df, indices, raices, limite[0], limite[1], solo_conteo)
+
+    parciales = list(_pool_hilos(n_hilos).map(tramo, limites)) if len(limites) > 1 else [tramo(limites[0])]
+    if solo_conteo:
+        return [int(sum(parcial[i] for parcial in parciales)) for i in range(len(raices))]
+    return [
+        np.concatenate([np.empty(0, dtype=np.int64)] + [trozo for parcial in parciales for trozo in parcial[i]])
+        for i in range(len(raices))
+    ]
+
+
+def _lote_tramo(df: pd.DataFrame, indices: Optional['IndicesBusqueda'], raices: List[Optional['Nodo']],
+                inicio: int, fin: int, solo_conteo: bool) -> List[Any]:
+    """
+    Evalúa todas las búsquedas de un lote sobre las filas [inicio, fin)
+    """
+    resultados = [0 if solo_conteo else [] for _ in raices]
+    for bloque in range(inicio, fin, TAMANO_BLOQUE):
+        bloque_fin = min(bloque + TAMANO_BLOQUE, fin)
+        mascaras = {}
+        columnas = {}
+
+        def mascara_predicado(predicado):
+            clave = (predicado.columna, predicado.operador, repr(predicado.valor))
+            if clave not in mascaras:
+                bitmap = indices.bitmap if indices is not None else None
+                if bitmap is not None and bitmap.admite(predicado):
+                    mascaras[clave] = NodoPredicado(predicado).evaluar(df, indices, bloque, bloque_fin)
+                else:
+                    if predicado.columna not in columnas:
+                        columnas[predicado.columna] = df[predicado.columna].iloc[bloque:bloque_fin]
+                    mascaras[clave] = predicado.evaluar(columnas[predicado.columna])
+            return mascaras[clave]
+
+        for i, raiz in enumerate(raices):
+            if raiz is None:
+                cumple = np.ones(bloque_fin - bloque, dtype=bool)
+            else:
+                cumple = _evaluar_compartido(raiz, mascara_predicado)
+            if solo_conteo:
+                resultados[i] += int(np.count_nonzero(cumple))
+            else:
+                resultados[i].append(np.flatnonzero(cumple) + bloque)
+    return resultados
+
+
+def _evaluar_compartido(nodo: 'Nodo', mascara_predicado) -> np.ndarray:
+    """
+    Evalúa un nodo sobre un bloque tomando las máscaras de predicados de una caché
+    """
+    if isinstance(nodo, NodoPredicado):
+        return mascara_predicado(nodo.predicado)
+    if isinstance(nodo, NodoNo):
+        return ~_evaluar_compartido(nodo.hijo, mascara_predicado)
+
+    mascara = None
+    for hijo in nodo.hijos:
+        parcial = _evaluar_compartido(hijo, mascara_predicado)
+        if isinstance(nodo, NodoY):
+            mascara = parcial if mascara is None else mascara & parcial
+            if not mascara.any():
+                break
+        else:
+            mascara = parcial if mascara is None else mascara | parcial
+            if mascara.all():
+                break
+    return mascara
+
+
+class IndicesBusqueda:
+    """
+    Agrupa los índices construidos sobre un mismo DataFrame
+    """
+
+    def __init__(self, bitmap: Optional['IndiceBitmap'] = None, rango: Optional['IndiceRango'] = None,
+                 estadisticas: Optional['EstadisticasColumnas'] = None,
+                 histogramas: Optional['IndiceHistogramas'] = None):
+        self.bitmap = bitmap
+        self.rango = rango
+        self.estadisticas = estadisticas
+        self.histogramas = histogramas
+
+
+class IndiceBitmap:
+    """
+    Índice de bitsets empaquetados por cada par (columna, valor)
+
+    Se construye sobre columnas categóricas, booleanas y enteras de baja
+    cardinalidad. Cada bitset ocupa un bit por fila (np.packbits). También
+    conserva los códigos enteros de cada columna (0 para faltantes, i + 1
+    para el valor i) para calcular facetas con np.bincount.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_cardinalidad: int = 64):
+        self.n_filas = len(df)
+        self.max_cardinalidad = max_cardinalidad
+        self.bitsets = {}
+        self.codigos = {}
+        self.valores = {}
+
+        for columna in df.columns:
+            self.actualizar_columna(df, columna)
+
+    def actualizar_columna(self, df: pd.DataFrame, columna: str):
+        """
+        Vuelve a indexar una columna con sus valores actuales (o la descarta si
+        ya no es indexable o no existe)
+        """
+        self.bitsets.pop(columna, None)
+        self.codigos.pop(columna, None)
+        self.valores.pop(columna, None)
+        if columna not in df.columns:
+            return
+        serie = df[columna]
+        if not _es_indexable(serie) or serie.nunique() > self.max_cardinalidad:
+            return
+
+        codigos, valores = pd.factorize(serie)
+        valores = valores.tolist()
+        self.bitsets[columna] = {
+            valor: np.packbits(codigos == codigo)
+            for codigo, valor in enumerate(valores)
+        }
+        self.codigos[columna] = (codigos + 1).astype(np.min_scalar_type(len(valores)))
+        self.valores[columna] = valores
+
+    def columnas(self) -> List[str]:
+        """
+        Retorna las columnas cubiertas por el índice
+        """
+        return list(self.bitsets.keys())
+
+    def bitset(self, columna: str, valor: Any, tramo: slice = None) -> np.ndarray:
+        """
+        Retorna el bitset de las filas donde columna == valor
+
+        Con tramo (un slice sobre bytes) retorna solo ese segmento del bitset.
+        """
+        bitset = self.bitsets[columna].get(valor)
+        if bitset is None:
+            return self._vacio(tramo)
+        return bitset if tramo is None else bitset[tramo]
+
+    def bitset_en(self, columna: str, valores: List[Any], tramo: slice = None) -> np.ndarray:
+        """
+        Retorna el bitset de las filas cuyo valor está en la lista (OR de bitsets)
+        """
+        resultado = self._vacio(tramo)
+        for valor in valores:
+            bitset = self.bitsets[columna].get(valor)
+            if bitset is not None:
+                resultado = resultado | (bitset if tramo is None else bitset[tramo])
+        return resultado
+
+    def admite(self, predicado: Predicado) -> bool:
+        """
+        Indica si el predicado es una igualdad o pertenencia resoluble con bitsets
+        """
+        if predicado.columna not in self.bitsets:
+            return False
+
+        if predicado.operador == '==':
+            valores = [predicado.valor]
+        elif predicado.operador == 'en':
+            valores = predicado.valor
+        else:
+            return False
+
+        # Valores faltantes o no hashables se delegan al recorrido de la columna
+        try:
+            if any(pd.isna(valor) for valor in valores):
+                return False
+            hash(tuple(valores))
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def bitset_predicado(self, predicado: Predicado, tramo: slice = None) -> Optional[np.ndarray]:
+        """
+        Resuelve un predicado de igualdad o pertenencia con el índice
+
+        Retorna None si el predicado no puede resolverse con bitsets.
+        """
+        if not self.admite(predicado):
+            return None
+        if predicado.operador == '==':
+            return self.bitset(predicado.columna, predicado.valor, tramo)
+        return self.bitset_en(predicado.columna, predicado.valor, tramo)
+
+    def contar(self, columna: str, valor: Any) -> int:
+        """
+        Cuenta las filas donde columna == valor mediante popcount
+        """
+        return popcount(self.bitset(columna, valor))
+
+    def contar_por_fila(self, columnas: List[str]) -> np.ndarray:
+        """
+        Cuenta, para cada fila, cuántas de las columnas booleanas son verdaderas
+
+        Suma los bitsets con un sumador bit a bit: cada plano del contador es
+        a su vez un bitset empaquetado, así que la suma recorre n/8 bytes por
+        columna y solo se desempaqueta al final.
+        """
+        planos = []
+        for columna in columnas:
+            acarreo = self.bitset(columna, True)
+            for i, plano in enumerate(planos):
+                planos[i] = plano ^ acarreo
+                acarreo = plano & acarreo
+            if acarreo.any():
+                planos.append(acarreo)
+
+        conteo = np.zeros(self.n_filas, dtype=np.uint8 if len(planos) <= 8 else np.uint16)
+        for i, plano in enumerate(planos):
+            conteo |= desempaquetar(plano, self.n_filas).astype(conteo.dtype) << i
+        return conteo
+
+    def _vacio(self, tramo: slice = None) -> np.ndarray:
+        n_bytes = (self.n_filas + 7) // 8
+        if tramo is not None:
+            n_bytes = len(range(*tramo.indices(n_bytes)))
+        return np.zeros(n_bytes, dtype=np.uint8)
+
+
+# Claves reservadas para combinar subexpresiones
+OPERADORES_LOGICOS = ('o', 'y', 'no')
+
+
+def compilar_criterios(criterios: Dict[str, Any], columnas) -> PlanBusqueda:
+    """
+    Convierte un diccionario de criterios en un plan de búsqueda
+
+    Los sufijos '_min' y '_max' generan comparaciones de rango, las listas
+    generan pertenencia y cualquier otro valor una igualdad. Un valor puede
+    ser también {'entre': [minimo, maximo]} o {'en': [valores]}. Los criterios
+    sobre columnas inexistentes se ignoran.
+
+    Las claves reservadas 'o' (lista de subexpresiones), 'y' (lista de
+    subexpresiones) y 'no' (una subexpresión) permiten combinar criterios;
+    cada subexpresión es a su vez un diccionario de criterios. Todas las
+    entradas de un mismo diccionario se combinan con AND.
+    """
+    columnas = set(columnas)
+    predicados = []
+    nodos = []
+
+    for clave, valor in criterios.items():
+        if clave in OPERADORES_LOGICOS:
+            nodo = _compilar_logico(clave, valor, columnas)
+            if nodo is not None:
+                nodos.append(nodo)
+        else:
+            predicados.extend(_compilar_entrada(clave, valor, columnas))
+
+    return PlanBusqueda(predicados, nodos)
+
+
+def _compilar_entrada(clave: str, valor: Any, columnas: set) -> List[Predicado]:
+    """
+    Compila una entrada columna/valor del diccionario de criterios
+    """
+    if clave.endswith('_min'):
+        col_base = clave[:-len('_min')]
+        return [Predicado(col_base, '>=', valor)] if col_base in columnas else []
+    if clave.endswith('_max'):
+        col_base = clave[:-len('_max')]
+        return [Predicado(col_base, '<=', valor)] if col_base in columnas else []
+    if clave not in columnas:
+        return []
+
+    if isinstance(valor, list):
+        return [Predicado(clave, 'en', valor)]
+    if isinstance(valor, dict):
+        predicados = []
+        for operador, operando in valor.items():
+            if operador == 'entre':
+                if not isinstance(operando, (list, tuple)) or len(operando) != 2:
+                    raise ValueError(f"'entre' requiere [minimo, maximo] en la columna '{clave}'")
+                predicados.append(Predicado(clave, '>=', operando[0]))
+                predicados.append(Predicado(clave, '<=', operando[1]))
+            elif operador == 'en':
+                predicados.append(Predicado(clave, 'en', list(operando)))
+            else:
+                raise ValueError(f"Operador no soportado en la columna '{clave}': '{operador}'")
+        return predicados
+    return [Predicado(clave, '==', valor)]
+
+
+def _compilar_expresion(expresion: Dict[str, Any], columnas: set) -> Optional['Nodo']:
+    """
+    Compila una subexpresión (diccionario) en un nodo AND
+
+    Retorna None si la subexpresión no impone ninguna restricción.
+    """
+    if not isinstance(expresion, dict):
+        raise ValueError(f"Cada subexpresión debe ser un diccionario de criterios: {expresion!r}")
+
+    hijos = []
+    for clave, valor in expresion.items():
+        if clave in OPERADORES_LOGICOS:
+            nodo = _compilar_logico(clave, valor, columnas)
+            if nodo is not None:
+                hijos.append(nodo)
+        else:
+            hijos.extend(NodoPredicado(p) for p in _compilar_entrada(clave, valor, columnas))
+
+    if not hijos:
+        return None
+    return hijos[0] if len(hijos) == 1 else NodoY(hijos)
+
+
+def _compilar_logico(operador: str, operando: Any, columnas: set) -> Optional['Nodo']:
+    """
+    Compila una clave 'o', 'y' o 'no'
+
+    Una rama sin restricciones hace que un 'o' o un 'no' tampoco restrinjan,
+    del mismo modo que se ignoran los criterios sobre columnas inexistentes.
+    """
+    if operador == 'no':
+        hijo = _compilar_expresion(operando, columnas)
+        return None if hijo is None else NodoNo(hijo)
+
+    if not isinstance(operando, list):
+        raise ValueError(f"'{operador}' requiere una lista de subexpresiones")
+
+    hijos = [_compilar_expresion(sub, columnas) for sub in operando]
+    if operador == 'o':
+        if not hijos or any(hijo is None for hijo in hijos):
+            return None
+        return hijos[0] if len(hijos) == 1 else NodoO(hijos)
+
+    hijos = [hijo for hijo in hijos if hijo is not None]
+    if not hijos:
+        return None
+    return hijos[0] if len(hijos) == 1 else NodoY(hijos)
+
+
+class Nodo:
+    """
+    Nodo de una expresión booleana evaluada por bloques de filas
+
+    evaluar() recibe el bloque [inicio, fin) y, opcionalmente, las posiciones
+    candidatas dentro de él; retorna una máscara del tamaño del bloque o de
+    las posiciones, nunca del tamaño del dataset completo.
+    """
+
+    def evaluar(self, df: pd.DataFrame, indices: Optional['IndicesBusqueda'],
+                inicio: int, fin: int, posiciones: np.ndarray = None) -> np.ndarray:
+        raise NotImplementedError
+
+
+class NodoPredicado(Nodo):
+    def __init__(self, predicado: Predicado):
+        self.predicado = predicado
+
+    def evaluar(self, df, indices, inicio, fin, posiciones=None):
+        bitmap = indices.bitmap if indices is not None else None
+        if bitmap is not None and bitmap.admite(self.predicado) and inicio % 8 == 0:
+            bits = bitmap.bitset_predicado(self.predicado, slice(inicio // 8, (fin + 7) // 8))
+            bloque = desempaquetar(bits, fin - inicio)
+            return bloque if posiciones is None else bloque[posiciones - inicio]
+
+        seleccion = slice(inicio, fin) if posiciones is None else posiciones
+        return self.predicado.evaluar(df[self.predicado.columna], seleccion)
+
+    def __repr__(self):
+        return repr(self.predicado)
+
+
+class NodoY(Nodo):
+    def __init__(self, hijos: List[Nodo]):
+        self.hijos = hijos
+
+    def evaluar(self, df, indices, inicio, fin, posiciones=None):
+        mascara = None
+        for hijo in self.hijos:
+            parcial = hijo.evaluar(df, indices, inicio, fin, posiciones)
+            mascara = parcial if mascara is None else mascara & parcial
+            if not mascara.any():
+                break
+        return mascara
+
+    def __repr__(self):
+        return '(' + ' Y '.join(map(repr, self.hijos)) + ')'
+
+
+class NodoO(Nodo):
+    def __init__(self, hijos: List[Nodo]):
+        self.hijos = hijos
+
+    def evaluar(self, df, indices, inicio, fin, posiciones=None):
+        mascara = None
+        for hijo in self.hijos:
+            parcial = hijo.evaluar(df, indices, inicio, fin, posiciones)
+            mascara = parcial if mascara is None else mascara | parcial
+            if mascara.all():
+                break
+        return mascara
+
+    def __repr__(self):
+        return '(' + ' O '.join(map(repr, self.hijos)) + ')'
+
+
+class NodoNo(Nodo):
+    def __init__(self, hijo: Nodo):
+        self.hijo = hijo
+
+    def evaluar(self, df, indices, inicio, fin, posiciones=None):
+        return ~self.hijo.evaluar(df, indices, inicio, fin, posiciones)
+
+    def __repr__(self):
+        return f"NO {self.hijo!r}"
+
+
+class IndiceRango:
+    """
+    Índice de rango por columna numérica: permutación de filas ordenada por valor
+
+    Un criterio '_min'/'_max' se resuelve con dos búsquedas binarias sobre los
+    valores ordenados, lo que da directamente el tramo de filas que cumple.
+    """
+
+    def __init__(self, df: pd.DataFrame, columnas: List[str] = None):
+        self.n_filas = len(df)
+        self.orden = {}
+        self.ordenados = {}
+        self.n_validos = {}
+
+        if columnas is None:
+            columnas = df.columns
+        for columna in columnas:
+            self.actualizar_columna(df, columna)
+
+    def actualizar_columna(self, df: pd.DataFrame, columna: str):
+        """
+        Vuelve a ordenar una columna con sus valores actuales (o la descarta si
+        ya no es numérica o no existe)
+        """
+        self.orden.pop(columna, None)
+        self.ordenados.pop(columna, None)
+        self.n_validos.pop(columna, None)
+        if columna not in df.columns or not (isinstance(df[columna].dtype, np.dtype)
+                                             and df[columna].dtype.kind in 'iuf'):
+            return
+
+        tipo_posicion = np.int32 if self.n_filas < np.iinfo(np.int32).max else np.int64
+        valores = df[columna].to_numpy()
+        # argsort deja los NaN al final, fuera del tramo de valores válidos
+        orden = np.argsort(valores, kind='stable').astype(tipo_posicion)
+        self.orden[columna] = orden
+        self.ordenados[columna] = valores[orden]
+        self.n_validos[columna] = int(self.n_filas - pd.isna(valores).sum())
+
+    def columnas(self) -> List[str]:
+        """
+        Retorna las columnas cubiertas por el índice
+        """
+        return list(self.orden.keys())
+
+    def admite(self, predicado: Predicado) -> bool:
+        """
+        Indica si el predicado es un rango numérico resoluble con el índice
+        """
+        if predicado.columna not in self.orden or predicado.operador not in ('>=', '<='):
+            return False
+        valor = predicado.valor
+        return isinstance(valor, (int, float, np.number)) and not pd.isna(valor)
+
+    def tramo(self, columna: str, predicados: List[Predicado]):
+        """
+        Retorna las posiciones [inicio, fin) del tramo ordenado que cumple los predicados
+        """
+        ordenados = self.ordenados[columna]
+        inicio, fin = 0, self.n_validos[columna]
+        for predicado in predicados:
+            if predicado.operador == '>=':
+                inicio = max(inicio, int(np.searchsorted(ordenados[:fin], predicado.valor, side='left')))
+            else:
+                fin = min(fin, int(np.searchsorted(ordenados[:fin], predicado.valor, side='right')))
+        return inicio, max(inicio, fin)
+
+    def filas(self, columna: str, predicados: List[Predicado]) -> np.ndarray:
+        """
+        Retorna las posiciones de fila que cumplen los predicados de rango
+        """
+        inicio, fin = self.tramo(columna, predicados)
+        return self.orden[columna][inicio:fin]
+
+
+class EstadisticasColumnas:
+    """
+    Estadísticas por columna para estimar la selectividad de los predicados
+
+    Guarda conteos de valores para columnas de baja cardinalidad (tomados del
+    índice de bitmaps cuando existe) e histogramas para columnas numéricas.
+    """
+
+    def __init__(self, df: pd.DataFrame, bitmap: Optional['IndiceBitmap'] = None,
+                 n_bins: int = 64, max_cardinalidad: int = 64):
+        self.n_filas = len(df)
+        self.n_bins = n_bins
+        self.max_cardinalidad = max_cardinalidad
+        self.conteos = {}
+        self.histogramas = {}
+        self.distintos = {}
+        self.numericas = set()
+
+        for columna in df.columns:
+            self.actualizar_columna(df, columna, bitmap)
+
+    def actualizar_columna(self, df: pd.DataFrame, columna: str, bitmap: Optional['IndiceBitmap'] = None):
+        """
+        Recalcula las estadísticas de una columna con sus valores actuales
+
+        Si se pasa el índice de bitmaps, la columna debe estar ya actualizada en él.
+        """
+        self.conteos.pop(columna, None)
+        self.histogramas.pop(columna, None)
+        self.distintos.pop(columna, None)
+        self.numericas.discard(columna)
+        if columna not in df.columns:
+            return
+
+        serie = df[columna]
+        es_numerica = isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biuf'
+        if es_numerica:
+            self.numericas.add(columna)
+
+        if bitmap is not None and columna in bitmap.bitsets:
+            self.conteos[columna] = {valor: popcount(bitset)
+                                     for valor, bitset in bitmap.bitsets[columna].items()}
+        elif es_numerica and serie.dtype.kind != 'b':
+            valores = serie.to_numpy()
+            valores = valores[np.isfinite(valores)] if serie.dtype.kind == 'f' else valores
+            if len(valores) == 0:
+                return
+            self.histogramas[columna] = np.histogram(valores, bins=self.n_bins)
+            self.distintos[columna] = int(serie.nunique())
+        elif _es_indexable(serie) and serie.nunique() <= self.max_cardinalidad:
+            self.conteos[columna] = serie.value_counts().to_dict()
+
+    def es_numerica(self, columna: str) -> bool:
+        return columna in self.numericas
+
+    def selectividad(self, predicados: List[Predicado]) -> float:
+        """
+        Estima la fracción de filas que cumple la conjunción de predicados
+        sobre una misma columna
+        """
+        if self.n_filas == 0:
+            return 0.0
+
+        columna = predicados[0].columna
+        if columna in self.conteos:
+            total = 0
+            for valor, conteo in self.conteos[columna].items():
+                try:
+                    if all(_cumple(valor, p) for p in predicados):
+                        total += conteo
+                except TypeError:
+                    continue
+            return total / self.n_filas
+
+        if columna in self.histogramas:
+            conteos, bordes = self.histogramas[columna]
+            minimo, maximo = -np.inf, np.inf
+            selectividad = 1.0
+            for predicado in predicados:
+                if not isinstance(predicado.valor, (int, float, np.number)):
+                    selectividad *= SELECTIVIDAD_DEFECTO[predicado.operador]
+                elif predicado.operador == '>=':
+                    minimo = max(minimo, predicado.valor)
+                elif predicado.operador == '<=':
+                    maximo = min(maximo, predicado.valor)
+                elif predicado.operador == '==':
+                    selectividad *= 1.0 / max(self.distintos.get(columna, 1), 1)
+                else:
+                    selectividad *= min(1.0, len(predicado.valor) / max(self.distintos.get(columna, 1), 1))
+            if minimo > -np.inf or maximo < np.inf:
+                fraccion = _fraccion_histograma(conteos, bordes, maximo) - _fraccion_histograma(conteos, bordes, minimo)
+                selectividad *= max(fraccion, 0.0) * conteos.sum() / self.n_filas
+            return selectividad
+
+        return float(np.prod([SELECTIVIDAD_DEFECTO[p.operador] for p in predicados]))
+
+
+class IndiceHistogramas:
+    """
+    Códigos de intervalo precalculados para histogramas de columnas numéricas
+
+    Los bordes se fijan una vez sobre todo el dataset (n_bins intervalos
+    iguales entre el mínimo y el máximo, como np.histogram), de modo que el
+    eje de cada histograma no cambia con los filtros. Cada fila guarda el
+    código de su intervalo (0 para faltantes, i + 1 para el intervalo i) y
+    el histograma de un resultado es un np.bincount sobre sus posiciones.
+    """
+
+    def __init__(self, df: pd.DataFrame, columnas: List[str], n_bins: int = 32):
+        self.n_bins = n_bins
+        self.bordes = {}
+        self.codigos = {}
+        self.valores = {}
+
+        for columna in columnas:
+            self.actualizar_columna(df, columna)
+
+    def actualizar_columna(self, df: pd.DataFrame, columna: str):
+        """
+        Vuelve a calcular bordes y códigos de una columna con sus valores actuales
+        """
+        self.bordes.pop(columna, None)
+        self.codigos.pop(columna, None)
+        self.valores.pop(columna, None)
+        if columna not in df.columns:
+            return
+        serie = df[columna]
+        if not (isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biuf'):
+            return
+
+        valores = serie.to_numpy(dtype=np.float64)
+        finitos = np.isfinite(valores)
+        if not finitos.any():
+            return
+
+        bordes = np.histogram_bin_edges(valores[finitos], bins=self.n_bins)
+        # El último intervalo es cerrado por la derecha, igual que en np.histogram
+        codigos = np.searchsorted(bordes, valores, side='right')
+        codigos = np.minimum(codigos, self.n_bins)
+        codigos[~finitos] = 0
+        self.bordes[columna] = bordes
+        self.codigos[columna] = codigos.astype(np.min_scalar_type(self.n_bins))
+        self.valores[columna] = valores
+
+    def columnas(self) -> List[str]:
+        """
+        Retorna las columnas cubiertas por el índice
+        """
+        return list(self.bordes.keys())
+
+    def histograma(self, columna: str, posiciones: np.ndarray = None) -> Dict[str, Any]:
+        """
+        Retorna bordes, conteos por intervalo, mínimo y máximo de la columna
+        restringida a las posiciones
+        """
+        if columna not in self.bordes:
+            raise ValueError(f"La columna '{columna}' no tiene histograma precalculado")
+
+        codigos = self.codigos[columna]
+        valores = self.valores[columna]
+        if posiciones is not None:
+            codigos = codigos[posiciones]
+            valores = valores[posiciones]
+
+        conteos = np.bincount(codigos, minlength=self.n_bins + 1)[1:]
+        validos = valores[codigos > 0]
+        return {
+            'bordes': self.bordes[columna].tolist(),
+            'conteos': conteos.tolist(),
+            'total': int(conteos.sum()),
+            'minimo': float(validos.min()) if len(validos) else None,
+            'maximo': float(validos.max()) if len(validos) else None
+        }
+
+
+def _cumple(valor: Any, predicado: Predicado) -> bool:
+    """
+    Evalúa un predicado sobre un único valor (usado con los conteos de valores)
+    """
+    if predicado.operador == '>=':
+        return bool(valor >= predicado.valor)
+    if predicado.operador == '<=':
+        return bool(valor <= predicado.valor)
+    if predicado.operador == 'en':
+        return valor in predicado.valor
+    return bool(valor == predicado.valor)
+
+
+def _fraccion_histograma(conteos: np.ndarray, bordes: np.ndarray, limite: float) -> float:
+    """
+    Fracción acumulada de valores menores o iguales al límite, interpolando
+    linealmente dentro del bin
+    """
+    if limite < bordes[0]:
+        return 0.0
+    if limite >= bordes[-1]:
+        return 1.0
+    i = int(np.searchsorted(bordes, limite, side='right')) - 1
+    acumulado = conteos[:i].sum() + conteos[i] * (limite - bordes[i]) / (bordes[i + 1] - bordes[i])
+    return float(acumulado / conteos.sum())
+
+
+def seleccionar_top(df: pd.DataFrame, posiciones: np.ndarray, ordenar_por: str = None,
+                    ascendente: bool = True, limite: int = None) -> np.ndarray:
+    """
+    Ordena las posiciones por una columna y conserva como máximo 'limite'
+
+    Con límite se hace una selección parcial (np.argpartition) sobre los
+    valores de las filas candidatas, de modo que solo se ordenan los k
+    ganadores. El resultado coincide con un ordenamiento estable seguido de
+    head(limite): los empates se resuelven por posición y los valores
+    faltantes quedan al final.
+    """
+    if limite is not None and limite < 0:
+        raise ValueError("El límite debe ser mayor o igual que cero")
+
+    if ordenar_por is None:
+        return posiciones if limite is None else posiciones[:limite]
+    if ordenar_por not in df.columns:
+        raise ValueError(f"La columna '{ordenar_por}' no existe en el dataset")
+
+    clave, faltantes = _clave_orden(df[ordenar_por], posiciones, ascendente)
+    validas = posiciones[~faltantes]
+    clave = clave[~faltantes]
+    k = len(validas) if limite is None else min(limite, len(validas))
+
+    if k < len(validas):
+        umbral = clave[np.argpartition(clave, k - 1)[k - 1]] if k > 0 else None
+        if umbral is None:
+            seleccion = np.empty(0, dtype=np.int64)
+        else:
+            mejores = np.flatnonzero(clave < umbral)
+            empates = np.flatnonzero(clave == umbral)[:k - len(mejores)]
+            seleccion = np.concatenate([mejores, empates])
+    else:
+        seleccion = np.arange(len(validas))
+
+    # Orden final de los k elegidos: por clave y, en empate, por posición
+    seleccion = seleccion[np.lexsort((validas[seleccion], clave[seleccion]))]
+    resultado = validas[seleccion]
+
+    if limite is None or len(resultado) < limite:
+        restantes = posiciones[faltantes]
+        if limite is not None:
+            restantes = restantes[:limite - len(resultado)]
+        resultado = np.concatenate([resultado, restantes])
+    return resultado
+
+
+def _clave_orden(serie: pd.Series, posiciones: np.ndarray, ascendente: bool):
+    """
+    Retorna una clave numérica cuyo orden ascendente es el orden pedido,
+    junto con la máscara de valores faltantes
+
+    Para invertir el orden se niegan los flotantes y se complementan bit a
+    bit los enteros (~x), que no desborda. Las columnas no numéricas se
+    factorizan ordenadas.
+    """
+    valores = _valores_columna(serie)
+    if isinstance(valores, np.ndarray):
+        clave = valores[posiciones]
+        if clave.dtype.kind == 'b':
+            clave = clave.view(np.uint8)
+        faltantes = np.isnan(clave) if clave.dtype.kind == 'f' else np.zeros(len(clave), dtype=bool)
+        if not ascendente:
+            clave = -clave if clave.dtype.kind == 'f' else ~clave
+        return clave, faltantes
+
+    codigos, _ = pd.factorize(valores.iloc[posiciones], sort=True)
+    faltantes = codigos < 0
+    if not ascendente:
+        codigos = codigos.max(initial=0) - codigos
+    return codigos, faltantes
+
+
+def calcular_skyline(valores: np.ndarray) -> np.ndarray:
+    """
+    Retorna los índices (ascendentes) de las filas no dominadas, a minimizar
+    en todas las columnas
+
+    Una fila domina a otra si no es peor en ninguna columna y es mejor en
+    al menos una. Se usa Sort-Filter-Skyline: las filas se ordenan por la
+    suma de sus valores normalizados (y en empate lexicográficamente), de
+    modo que una fila dominante siempre va antes que las que domina. Así
+    cada fila solo se compara con el skyline acumulado, que nunca pierde
+    filas. El recorrido es por bloques: primero se descartan las filas del
+    bloque dominadas por el skyline, por tramos y empezando por sus filas de
+    menor suma (las que más descartan), y luego las dominadas dentro del
+    bloque. El costo es O(n x tamaño del skyline) en lugar de O(n²).
+
+    Los valores faltantes (NaN) cuentan como los peores posibles.
+    """
+    X = np.asarray(valores, dtype=np.float64)
+    if X.ndim != 2:
+        raise ValueError("Los valores del skyline deben ser una matriz (filas x dimensiones)")
+    n_filas, n_dimensiones = X.shape
+    if n_filas == 0:
+        return np.empty(0, dtype=np.int64)
+
+    X = np.where(np.isnan(X), np.inf, X)
+    finitos = np.isfinite(X)
+    minimo = np.where(finitos, X, np.inf).min(axis=0)
+    maximo = np.where(finitos, X, -np.inf).max(axis=0)
+    rango = np.where(maximo > minimo, maximo - minimo, 1.0)
+    normalizados = np.where(finitos, (X - np.where(np.isfinite(minimo), minimo, 0)) / rango,
+                            np.where(X > 0, 2.0, -1.0))
+    clave = normalizados.sum(axis=1)
+    orden = np.lexsort(tuple(X[:, j] for j in reversed(range(n_dimensiones))) + (clave,))
+
+    skyline = np.empty((0, n_dimensiones))
+    indices = [np.empty(0, dtype=np.int64)]
+    for inicio in range(0, n_filas, TAMANO_BLOQUE_SKYLINE):
+        bloque = orden[inicio:inicio + TAMANO_BLOQUE_SKYLINE]
+        candidatos = X[bloque]
+
+        vivos = ~_dominadas(candidatos, skyline)
+        bloque, candidatos = bloque[vivos], candidatos[vivos]
+        vivos = ~_dominadas(candidatos, candidatos)
+
+        indices.append(bloque[vivos])
+        skyline = np.concatenate([skyline, candidatos[vivos]])
+
+    return np.sort(np.concatenate(indices))
+
+
+def _dominadas(candidatos: np.ndarray, dominantes: np.ndarray) -> np.ndarray:
+    """
+    Máscara de los candidatos dominados por alguna fila de dominantes
+    """
+    dominada = np.zeros(len(candidatos), dtype=bool)
+    inicio, tamano = 0, TAMANO_TRAMO_SKYLINE_INICIAL
+    while inicio < len(dominantes):
+        pendientes = np.flatnonzero(~dominada)
+        if len(pendientes) == 0:
+            break
+        tramo = dominantes[inicio:inicio + tamano]
+        inicio, tamano = inicio + tamano, max(1, min(2 * tamano, ELEMENTOS_SKYLINE // len(pendientes)))
+        filas = candidatos[pendientes]
+        # Comparaciones por dimensión sobre matrices candidatos x tramo
+        no_peor = np.ones((len(filas), len(tramo)), dtype=bool)
+        mejor = np.zeros((len(filas), len(tramo)), dtype=bool)
+        for j in range(candidatos.shape[1]):
+            no_peor &= tramo[:, j] <= filas[:, j, np.newaxis]
+            mejor |= tramo[:, j] < filas[:, j, np.newaxis]
+        dominada[pendientes] = (no_peor & mejor).any(axis=1)
+    return dominada
+
+
+def calcular_facetas(df: pd.DataFrame, columnas: List[str], posiciones: np.ndarray = None,
+                     bitmap: IndiceBitmap = None) -> Dict[str, Dict[Any, int]]:
+    """
+    Cuenta, para cada columna, cuántas filas del resultado tienen cada valor
+
+    Las columnas cubiertas por el índice de bitmaps se cuentan con un único
+    np.bincount sobre sus códigos enteros; el resto se factoriza al vuelo.
+    Los valores sin filas en el resultado y los faltantes se omiten, y el
+    orden de los valores es el de su primera aparición en el dataset.
+    """
+    facetas = {}
+    for columna in columnas:
+        codigos, valores = _codigos_faceta(df, columna, bitmap)
+        if posiciones is not None:
+            codigos = codigos[posiciones]
+        conteos = np.bincount(codigos, minlength=len(valores) + 1)[1:]
+        facetas[columna] = {
+            valores[i]: int(conteos[i]) for i in np.flatnonzero(conteos)
+        }
+    return facetas
+
+
+def promedios_faceta(df: pd.DataFrame, columna: str, columna_valor: str,
+                     posiciones: np.ndarray = None,
+                     bitmap: IndiceBitmap = None) -> Dict[Any, float]:
+    """
+    Promedio de columna_valor por cada valor de columna (bincount ponderado)
+
+    Equivale a df.groupby(columna)[columna_valor].mean() restringido a las
+    posiciones; los valores faltantes de columna_valor no se promedian.
+    """
+    if columna_valor not in df.columns:
+        raise ValueError(f"La columna '{columna_valor}' no existe en el dataset")
+
+    codigos, valores = _codigos_faceta(df, columna, bitmap)
+    datos = df[columna_valor].to_numpy(dtype=np.float64, na_value=np.nan)
+    if posiciones is not None:
+        codigos = codigos[posiciones]
+        datos = datos[posiciones]
+
+    validos = ~np.isnan(datos)
+    codigos = codigos[validos]
+    sumas = np.bincount(codigos, weights=datos[validos], minlength=len(valores) + 1)[1:]
+    conteos = np.bincount(codigos, minlength=len(valores) + 1)[1:]
+    return {
+        valores[i]: float(sumas[i] / conteos[i]) for i in np.flatnonzero(conteos)
+    }
+
+
+def _codigos_faceta(df: pd.DataFrame, columna: str, bitmap: IndiceBitmap = None):
+    """
+    Retorna los códigos enteros (0 = faltante) y la lista de valores de una columna
+    """
+    if columna not in df.columns:
+        raise ValueError(f"La columna '{columna}' no existe en el dataset")
+    if bitmap is not None and columna in bitmap.codigos:
+        return bitmap.codigos[columna], bitmap.valores[columna]
+
+    codigos, valores = pd.factorize(df[columna])
+    return codigos + 1, valores.tolist()
+
+
+@lru_cache(maxsize=None)
+def _pool_hilos(n_hilos: int) -> ThreadPoolExecutor:
+    """
+    Pool de hilos compartido por todas las búsquedas con el mismo número de hilos
+    """
+    return ThreadPoolExecutor(max_workers=n_hilos, thread_name_prefix='busqueda')
+
+
+def desempaquetar(bits: np.ndarray, n_filas: int) -> np.ndarray:
+    """
+    Convierte un bitset empaquetado en una máscara booleana de n_filas
+    """
+    return np.unpackbits(bits, count=n_filas).view(bool)
+
+
+def popcount(bits: np.ndarray) -> int:
+    """
+    Cuenta los bits encendidos de un bitset empaquetado
+    """
+    return int(_POPCOUNT_BYTE[bits].sum(dtype=np.int64))
+
+
+def _es_indexable(serie: pd.Series) -> bool:
+    """
+    Indica si la columna admite índice de bitmaps (no flotantes ni fechas)
+    """
+    dtype = serie.dtype
+    if isinstance(dtype, np.dtype):
+        return dtype.kind in 'biuOSU'
+    return isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)) or pd.api.types.is_bool_dtype(dtype)
+
+
+def _valores_columna(serie: pd.Series):
+    """
+    Retorna el arreglo NumPy de columnas numéricas o booleanas; las demás
+    se comparan como Series para conservar la semántica de pandas
+    """
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biuf':
+        return serie.to_numpy()
+    return serie
@@ -5,7 +5,17 @@ Verifica que todas las funcionalidades básicas funcionan correctamente
 
 from modelo_inmuebles import ModeloInmuebles
 from generar_dataset import generar_dataset_inmuebles
+from inferencia_arboles import BosqueAplanado
+from coalescedor import Coalescedor
+from motor_busqueda import IndiceHistogramas
+from entrenamiento_flujo import EstadisticasFlujo, MuestraEstratificada, leer_trozos
+from sklearn.preprocessing import StandardScaler
+import contextlib
+import io
 import os
+import tempfile
+import numpy as np
+import pandas as pd
 
 
 def prueba_rapida():
@@ -96,6 +106,556 @@ def prueba_rapida():
         return False
 
 
+def _comprobar(condicion: bool, mensaje: str):
+    """
+    Falla la verificación con el mensaje si la condición no se cumple
+    """
+    if not condicion:
+        raise AssertionError(mensaje)
+
+
+def _modelo_verificacion(n_inmuebles: int = 3000, **opciones) -> ModeloInmuebles:
+    """
+    Modelo preprocesado y con categorías de precio sobre un dataset sintético,
+    sin mensajes en pantalla
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        np.random.seed(7)
+        df = generar_dataset_inmuebles(n_inmuebles=n_inmuebles, guardar=False)
+        modelo = ModeloInmuebles(**opciones)
+        modelo.cargar_dataset(dataframe=df)
+        modelo.preprocesar_datos()
+        modelo.crear_categorias_precio('precio')
+    return modelo
+
+
+def verificar_indices_tras_reentrenar():
+    """
+    Los índices reflejan las columnas que el modelo sobrescribe ('cluster')
+    """
+    modelo = _modelo_verificacion()
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_clustering(n_clusters=3)
+        modelo.reconstruir_indices()
+        modelo.construir_indice_rango()
+        modelo.entrenar_clustering(n_clusters=5)
+        resultado = modelo.categorizar_inmuebles({'cluster': 1})
+        rango = modelo.categorizar_inmuebles({'cluster_min': 3, 'cluster_max': 4})
+    
+    esperado = modelo.df.index[modelo.df['cluster'] == 1]
+    _comprobar(resultado.index.sort_values().equals(esperado), "búsqueda por cluster tras reentrenar")
+    _comprobar(len(rango) == int(modelo.df['cluster'].between(3, 4).sum()), "rango por cluster tras reentrenar")
+    facetas = modelo.calcular_facetas(['cluster'])['cluster']
+    _comprobar(facetas == modelo.df['cluster'].value_counts().to_dict(), "facetas por cluster tras reentrenar")
+
+
+def verificar_what_if():
+    """
+    Cada variante coincide con predecir() y las columnas que el clasificador
+    no usa se rechazan
+    """
+    modelo = _modelo_verificacion(1000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_modelo_clasificacion('categoria_precio')
+    
+    variaciones = {'area_m2': [80.0, 200.0], 'estado': ['Excelente', 'A Remodelar']}
+    resultado = modelo.analisis_what_if(5, variaciones)
+    variantes = pd.DataFrame([modelo.df.iloc[5].to_dict()] * len(resultado))
+    for columna in variaciones:
+        variantes.loc[1:, columna] = resultado.loc[1:, columna].to_numpy()
+    variantes = variantes.drop(columns=[col for col in variantes.columns if col.endswith('_encoded')])
+    esperado = modelo.predecir(variantes)['categoria_predicha']
+    _comprobar((resultado['categoria_predicha'].to_numpy() == esperado.to_numpy()).all(),
+               "what-if distinto de predecir()")
+    
+    try:
+        modelo.analisis_what_if(5, {'tiene_piscina': [True]})
+    except ValueError:
+        return
+    raise AssertionError("what-if aceptó una columna que el clasificador no usa")
+
+
+def verificar_prediccion_datos_nuevos():
+    """
+    predecir() codifica las categorías no vistas como -1 e imputa con la
+    media del scaler las columnas ausentes, igual que una codificación manual
+    """
+    modelo = _modelo_verificacion(1000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_modelo_clasificacion('categoria_precio')
+        modelo.entrenar_clustering(n_clusters=3)
+    
+    originales = modelo._datos_originales().iloc[:5]
+    casos = {
+        'categoría no vista': originales.assign(tipo='Castillo', ubicacion=['Centro', 'Luna'] * 2 + ['Norte']),
+        'columna ausente': originales.drop(columns=['area_m2', 'estado'])
+    }
+    for caso, datos in casos.items():
+        escaladas = modelo._escalar_datos(datos, ['clasificacion', 'clustering'])
+        for nombre, scaler, columnas in [('clasificacion', modelo.scaler_clasificacion, modelo.columnas_clasificacion),
+                                         ('clustering', modelo.scaler_clustering, modelo.columnas_clustering)]:
+            esperado = np.empty((len(datos), len(columnas)))
+            for j, col in enumerate(columnas):
+                base = col[:-len('_encoded')] if col.endswith('_encoded') else col
+                if base not in datos.columns:
+                    esperado[:, j] = scaler.mean_[j] if base == col else -1
+                elif base != col:
+                    clases = list(modelo.label_encoders[base].classes_)
+                    esperado[:, j] = [clases.index(v) if v in clases else -1 for v in datos[base]]
+                else:
+                    esperado[:, j] = datos[col].astype(float)
+            esperado = scaler.transform(esperado.astype(np.float32))
+            _comprobar(np.allclose(escaladas[nombre], esperado, atol=1e-5),
+                       f"escalado de '{nombre}' distinto de la codificación manual ({caso})")
+    
+        prediccion = modelo.predecir(datos)
+        _comprobar(prediccion['cluster'].tolist() == modelo.modelo_clustering.predict(escaladas['clustering']).tolist(),
+                   f"clusters predichos ({caso})")
+        probabilidades = modelo.modelo_clasificacion.predict_proba(escaladas['clasificacion'])
+        columnas_prob = [col for col in prediccion.columns if col.startswith('prob_')]
+        _comprobar(np.allclose(prediccion[columnas_prob].to_numpy(), probabilidades),
+                   f"probabilidades predichas ({caso})")
+
+
+def verificar_similitud_aproximada():
+    """
+    El índice IVF no conserva la matriz escalada densa y recupera casi todos
+    los vecinos exactos
+    """
+    modelo = _modelo_verificacion(similitud_aproximada=True, n_sondas=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_clustering(n_clusters=4)
+    _comprobar(modelo.almacen_caracteristicas().escalada('clustering') is None,
+               "el modo aproximado conserva la matriz escalada densa")
+    
+    X = modelo.matriz_escalada('clustering').astype(np.float64)
+    aciertos = []
+    for inmueble_id in range(0, len(X), 150):
+        distancias = ((X - X[inmueble_id]) ** 2).sum(axis=1)
+        distancias[inmueble_id] = np.inf
+        exactos = set(np.argsort(distancias, kind='stable')[:10])
+        aproximados = modelo.df.index.get_indexer(modelo.buscar_similares(inmueble_id, 10).index)
+        aciertos.append(len(exactos & set(aproximados)) / 10)
+    _comprobar(np.mean(aciertos) >= 0.9, f"recall del índice IVF: {np.mean(aciertos):.2f}")
+
+
+def verificar_deriva_misma_distribucion():
+    """
+    Un lote nuevo de la misma distribución (con ids mayores) no pide reentrenar
+    """
+    np.random.seed(11)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = generar_dataset_inmuebles(n_inmuebles=6000, guardar=False)
+        modelo = ModeloInmuebles()
+        modelo.cargar_dataset(dataframe=df.iloc[:4000])
+        modelo.preprocesar_datos()
+        modelo.entrenar_clustering(n_clusters=4, incremental=True)
+        modelo.actualizar_clustering(df.iloc[4000:])
+    
+    _comprobar('id' not in modelo.columnas_clustering, "el identificador es una característica del clustering")
+    deriva = modelo.metricas_deriva()
+    _comprobar(not deriva['reentrenar'], f"deriva sin cambio de distribución: {deriva['motivos']}")
+
+
+def verificar_bosque_aplanado():
+    """
+    BosqueAplanado da las mismas probabilidades que sklearn, también con
+    hojas que guardan conteos (scikit-learn < 1.4)
+    """
+    modelo = _modelo_verificacion(1000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_modelo_clasificacion('categoria_precio')
+    _comprobar(modelo.bosque_aplanado is not None, "el clasificador no se exportó")
+    
+    X = modelo._escalar_datos(modelo.df.head(200), ['clasificacion'])['clasificacion']
+    esperado = modelo.modelo_clasificacion.predict_proba(X)
+    _comprobar(np.array_equal(modelo.bosque_aplanado.predict_proba(X), esperado),
+               "probabilidades distintas de predict_proba")
+    
+    tree = modelo.modelo_clasificacion.estimators_[0].tree_
+    fracciones = tree.value[:, 0, :]
+    conteos = fracciones * tree.weighted_n_node_samples[:, np.newaxis]
+    _comprobar(np.allclose(BosqueAplanado._probabilidades_hojas(conteos), fracciones),
+               "hojas con conteos no normalizadas")
+
+
+def verificar_coalescedor_errores():
+    """
+    Un lote con una solicitud inválida solo hace fallar esa solicitud
+    """
+    def duplicar(filas: pd.DataFrame) -> pd.DataFrame:
+        if (filas['area_m2'] <= 0).any():
+            raise ValueError("area_m2 debe ser positiva")
+        return filas * 2
+    
+    coalescedor = Coalescedor(duplicar, espera_max_ms=200, lote_max=256)
+    areas = [[80.0, 90.0], [-1.0], [120.0]]
+    futuros = [coalescedor.enviar_async(pd.DataFrame({'area_m2': valores})) for valores in areas]
+    coalescedor.cerrar()
+    
+    _comprobar(coalescedor.metricas()['lotes'] == 1, "las solicitudes no se agruparon en un lote")
+    _comprobar(isinstance(futuros[1].exception(), ValueError), "la solicitud inválida no falló")
+    for futuro, valores in zip([futuros[0], futuros[2]], [areas[0], areas[2]]):
+        _comprobar(futuro.exception() is None and futuro.result()['area_m2'].tolist() == [v * 2 for v in valores],
+                   "una solicitud válida falló por otra del mismo lote")
+    _comprobar(coalescedor.metricas()['errores'] == 1, "conteo de errores incorrecto")
+
+
+def verificar_coalescedor_resiliente():
+    """
+    Un resultado con filas de menos o una solicitud cancelada no detienen el
+    hilo del coalescedor
+    """
+    def recortar(filas: pd.DataFrame) -> pd.DataFrame:
+        # Pierde una fila si recibe un área negativa
+        return filas[filas['area_m2'] >= 0] if (filas['area_m2'] < 0).any() else filas
+    
+    coalescedor = Coalescedor(recortar, espera_max_ms=200, lote_max=256)
+    cancelada = coalescedor.enviar_async(pd.DataFrame({'area_m2': [50.0]}))
+    invalida = coalescedor.enviar_async(pd.DataFrame({'area_m2': [-1.0, 70.0]}))
+    valida = coalescedor.enviar_async(pd.DataFrame({'area_m2': [90.0]}))
+    _comprobar(cancelada.cancel(), "no se pudo cancelar una solicitud en cola")
+    
+    _comprobar(isinstance(invalida.exception(timeout=5), ValueError), "un resultado incompleto no falló")
+    _comprobar(valida.result(timeout=5)['area_m2'].tolist() == [90.0], "una solicitud válida falló")
+    siguiente = coalescedor.enviar(pd.DataFrame({'area_m2': [110.0]}), timeout=5)
+    _comprobar(siguiente['area_m2'].tolist() == [110.0], "el coalescedor dejó de atender solicitudes")
+    coalescedor.cerrar()
+
+
+def verificar_skyline():
+    """
+    El skyline coincide con la comparación de todos los pares de inmuebles
+    """
+    modelo = _modelo_verificacion()
+    criterios = {'tipo': 'Casa', 'precio_max': 500000}
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = modelo.skyline(criterios=criterios, ordenar_por='precio', limite=20)
+        completo = modelo.skyline(criterios=criterios)
+    
+    df = modelo.df
+    filtrados = df[(df['tipo'] == 'Casa') & (df['precio'] <= 500000)]
+    valores = np.column_stack([
+        filtrados['precio'], -filtrados['area_m2'], filtrados['antiguedad_anos'],
+        -modelo.score_amenidades().loc[filtrados.index]
+    ]).astype(np.float64)
+    dominados = np.array([
+        ((valores <= fila).all(axis=1) & (valores < fila).any(axis=1)).any() for fila in valores
+    ])
+    esperado = filtrados.index[~dominados]
+    _comprobar(completo.index.sort_values().equals(esperado.sort_values()), "skyline distinto de fuerza bruta")
+    _comprobar(resultado.index.equals(df.loc[esperado].sort_values('precio', kind='stable').index[:20]),
+               "orden o límite del skyline")
+    _comprobar((resultado['score_amenidades'] == modelo.score_amenidades().loc[resultado.index]).all(),
+               "score_amenidades del skyline")
+
+
+def verificar_estadisticas_flujo():
+    """
+    Los encoders y el scaler calculados por trozos coinciden con los de
+    preprocesar_datos sobre el archivo completo en memoria
+    """
+    np.random.seed(7)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = generar_dataset_inmuebles(n_inmuebles=2000, guardar=False)
+    df.loc[df.sample(frac=0.05, random_state=1).index, 'area_m2'] = np.nan
+    df.loc[df.sample(frac=0.05, random_state=2).index, 'estado'] = np.nan
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'inmuebles.csv')
+        df.to_csv(ruta, index=False)
+        estadisticas = EstadisticasFlujo()
+        for trozo in leer_trozos(ruta, 300):
+            estadisticas.agregar(trozo)
+        
+        modelo = ModeloInmuebles()
+        with contextlib.redirect_stdout(io.StringIO()):
+            modelo.cargar_dataset(dataframe=pd.read_csv(ruta))
+            modelo.preprocesar_datos()
+    
+    _comprobar(estadisticas.caracteristicas_categoricas == modelo.caracteristicas_categoricas,
+               "columnas categóricas distintas")
+    encoders = estadisticas.label_encoders()
+    for col, encoder in modelo.label_encoders.items():
+        _comprobar(list(encoders[col].classes_) == list(encoder.classes_), f"clases distintas en '{col}'")
+    
+    columnas = modelo.caracteristicas_numericas + [col + '_encoded' for col in modelo.caracteristicas_categoricas]
+    scaler = estadisticas.scaler(columnas)
+    esperado = StandardScaler().fit(modelo.df[columnas].to_numpy(dtype=np.float64))
+    _comprobar(np.allclose(scaler.mean_, esperado.mean_) and np.allclose(scaler.scale_, esperado.scale_),
+               "scaler por trozos distinto del scaler en memoria")
+
+
+def verificar_muestra_estratificada():
+    """
+    Las muestras están anidadas, el conjunto separado no comparte filas con
+    ellas y curva_aprendizaje no modifica el modelo
+    """
+    modelo = _modelo_verificacion()
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_modelo_clasificacion('categoria_precio')
+    df, clasificador = modelo.df, modelo.modelo_clasificacion
+    
+    reserva = MuestraEstratificada(2000, ['categoria_precio', 'tipo'], semilla=3)
+    for inicio in range(0, len(df), 400):
+        reserva.agregar(df.iloc[inicio:inicio + 400])
+    prueba = reserva.separar(400)
+    _comprobar(reserva.n_filas == len(df) - len(prueba) and reserva.conteos.sum() == reserva.n_filas,
+               "los conteos de los estratos incluyen el conjunto separado")
+    muestras = [reserva.muestra(tamano)['id'] for tamano in (200, 800, 1600)]
+    for menor, mayor in zip(muestras, muestras[1:]):
+        _comprobar(menor.isin(mayor).all(), "las muestras no están anidadas")
+    _comprobar(not prueba['id'].isin(muestras[-1]).any(), "el conjunto de prueba comparte filas con la muestra")
+    
+    proporciones = df.groupby(['categoria_precio', 'tipo'], observed=True).size() / len(df)
+    obtenidas = muestras[-1].map(df.set_index('id')['tipo']).value_counts(normalize=True)
+    _comprobar(np.allclose(obtenidas.sort_index(), proporciones.groupby(level='tipo').sum().sort_index(), atol=0.01),
+               "la muestra no respeta las proporciones de los estratos")
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.curva_aprendizaje(tamanos=[500, 1000], columna_objetivo='tipo')
+    _comprobar(modelo.df is df and modelo.modelo_clasificacion is clasificador,
+               "curva_aprendizaje modificó el modelo")
+
+
+def verificar_curva_sin_fugas():
+    """
+    Con self.df como fuente, las muestras de curva_aprendizaje no arrastran
+    las columnas derivadas: ni el objetivo ni su codificación ni columnas
+    repetidas entran en las características
+    """
+    modelo = _modelo_verificacion()
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_clustering(n_clusters=3)
+    
+    usadas = []
+    entrenar = modelo.entrenar_modelo_clasificacion
+    def registrar(*args, **kwargs):
+        precision = entrenar(*args, **kwargs)
+        usadas.append(list(modelo.columnas_clasificacion))
+        return precision
+    modelo.entrenar_modelo_clasificacion = registrar
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            modelo.curva_aprendizaje(tamanos=[500, 1000], columna_objetivo='tipo')
+    finally:
+        del modelo.entrenar_modelo_clasificacion
+    
+    _comprobar(len(usadas) == 2, "curva_aprendizaje no entrenó cada tamaño")
+    for columnas in usadas:
+        _comprobar(not {'tipo', 'tipo_encoded', 'cluster'} & set(columnas),
+                   f"el objetivo o una columna derivada está entre las características: {columnas}")
+        _comprobar(len(columnas) == len(set(columnas)), f"características repetidas: {columnas}")
+
+
+# Búsquedas de verificación y su equivalente directo en pandas
+BUSQUEDAS_VERIFICACION = [
+    ({'tipo': 'Casa', 'habitaciones': 3},
+     lambda df: (df['tipo'] == 'Casa') & (df['habitaciones'] == 3)),
+    ({'precio_min': 150000, 'precio_max': 300000, 'ubicacion': 'Centro'},
+     lambda df: df['precio'].between(150000, 300000) & (df['ubicacion'] == 'Centro')),
+    ({'o': [{'tipo': 'Casa', 'ubicacion': 'Norte'}, {'tipo': 'Apartamento', 'ubicacion': 'Centro'}],
+      'precio': {'entre': [100000, 300000]}},
+     lambda df: (((df['tipo'] == 'Casa') & (df['ubicacion'] == 'Norte'))
+                 | ((df['tipo'] == 'Apartamento') & (df['ubicacion'] == 'Centro')))
+                & df['precio'].between(100000, 300000)),
+    ({'no': {'estado': {'en': ['Excelente', 'Bueno']}}, 'tiene_jardin': True},
+     lambda df: ~df['estado'].isin(['Excelente', 'Bueno']) & df['tiene_jardin']),
+    ({'area_m2_min': 100, 'banos': [2, 3]},
+     lambda df: (df['area_m2'] >= 100) & df['banos'].isin([2, 3])),
+]
+
+
+def _modelo_busqueda() -> ModeloInmuebles:
+    """
+    Modelo con más filas que un bloque de búsqueda (para repartir entre
+    hilos) y con el índice de rango construido
+    """
+    modelo = _modelo_verificacion(70000, n_hilos_busqueda=4)
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.construir_indice_rango()
+    return modelo
+
+
+def verificar_busqueda_hilos():
+    """
+    La búsqueda con índices, serial o por hilos, coincide con el filtro de pandas
+    """
+    modelo = _modelo_busqueda()
+    for criterios, mascara in BUSQUEDAS_VERIFICACION:
+        esperado = np.flatnonzero(mascara(modelo.df).to_numpy())
+        for n_hilos in (1, 4):
+            posiciones = modelo.filtrar_posiciones(criterios, n_hilos=n_hilos)
+            _comprobar(np.array_equal(np.sort(posiciones), esperado),
+                       f"búsqueda con {n_hilos} hilos distinta del filtro de pandas: {criterios}")
+
+
+def verificar_top_k():
+    """
+    El orden y el límite de la búsqueda coinciden con sort_values estable y head
+    """
+    modelo = _modelo_busqueda()
+    for criterios, mascara in BUSQUEDAS_VERIFICACION:
+        filtrados = modelo.df[mascara(modelo.df)]
+        for columna, ascendente in (('precio', True), ('area_m2', False), ('habitaciones', True)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado = modelo.categorizar_inmuebles(criterios, ordenar_por=columna,
+                                                         ascendente=ascendente, limite=25)
+            esperado = filtrados.sort_values(columna, ascending=ascendente, kind='stable').head(25)
+            _comprobar(resultado.index.equals(esperado.index),
+                       f"top-k por '{columna}' distinto de sort_values: {criterios}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = modelo.categorizar_inmuebles(criterios, limite=25)
+        _comprobar(resultado.index.equals(filtrados.head(25).index), f"límite sin orden: {criterios}")
+
+
+def verificar_facetas():
+    """
+    Las facetas y sus promedios coinciden con value_counts y groupby de pandas
+    """
+    modelo = _modelo_busqueda()
+    columnas = ['tipo', 'ubicacion', 'estado', 'habitaciones']
+    for criterios, mascara in [({}, lambda df: pd.Series(True, index=df.index))] + BUSQUEDAS_VERIFICACION:
+        filtrados = modelo.df[mascara(modelo.df)]
+        posiciones = modelo.filtrar_posiciones(criterios) if criterios else None
+        facetas = modelo.calcular_facetas(columnas, posiciones)
+        for columna in columnas:
+            esperado = filtrados[columna].value_counts()
+            _comprobar(facetas[columna] == esperado.to_dict(), f"facetas de '{columna}': {criterios}")
+            orden = [valor for valor in modelo.df[columna].unique() if valor in esperado.index]
+            _comprobar(list(facetas[columna]) == orden, f"orden de las facetas de '{columna}'")
+        
+        promedios = modelo.promedios_faceta('ubicacion', 'precio', posiciones)
+        esperado = filtrados.groupby('ubicacion')['precio'].mean()
+        _comprobar(set(promedios) == set(esperado.index)
+                   and np.allclose([promedios[valor] for valor in esperado.index], esperado.to_numpy()),
+                   f"promedios por faceta distintos de groupby: {criterios}")
+
+
+def verificar_histogramas():
+    """
+    Los histogramas precalculados coinciden con np.histogram sobre las filas
+    filtradas, con los intervalos fijados sobre todo el dataset
+    """
+    modelo = _modelo_busqueda()
+    columnas = modelo.columnas_histograma + ['habitaciones']
+    for criterios, mascara in [({}, lambda df: pd.Series(True, index=df.index))] + BUSQUEDAS_VERIFICACION:
+        filtrados = modelo.df[mascara(modelo.df)]
+        histogramas = modelo.histogramas(criterios, columnas)
+        for columna in columnas:
+            bordes = np.histogram_bin_edges(modelo.df[columna], bins=32)
+            conteos, _ = np.histogram(filtrados[columna], bins=bordes)
+            histograma = histogramas[columna]
+            _comprobar(np.allclose(histograma['bordes'], bordes)
+                       and histograma['conteos'] == conteos.tolist()
+                       and histograma['total'] == len(filtrados),
+                       f"histograma de '{columna}' distinto de np.histogram: {criterios}")
+            _comprobar(histograma['minimo'] == filtrados[columna].min()
+                       and histograma['maximo'] == filtrados[columna].max(),
+                       f"mínimo y máximo de '{columna}': {criterios}")
+    
+    # Los faltantes quedan fuera de los conteos, igual que con dropna
+    df = modelo.df[['precio']].copy()
+    df.loc[df.index[::7], 'precio'] = np.nan
+    histograma = IndiceHistogramas(df, ['precio']).histograma('precio')
+    conteos, bordes = np.histogram(df['precio'].dropna(), bins=32)
+    _comprobar(np.allclose(histograma['bordes'], bordes) and histograma['conteos'] == conteos.tolist()
+               and histograma['total'] == df['precio'].count(),
+               "histograma con faltantes distinto de np.histogram")
+
+
+def verificar_busqueda_lote():
+    """
+    Cada búsqueda del lote coincide con el filtro de pandas, con y sin hilos
+    """
+    modelo = _modelo_busqueda()
+    lista_criterios = [criterios for criterios, _ in BUSQUEDAS_VERIFICACION]
+    esperados = [np.flatnonzero(mascara(modelo.df).to_numpy()) for _, mascara in BUSQUEDAS_VERIFICACION]
+    for n_hilos in (1, 4):
+        lote = modelo.filtrar_posiciones_lote(lista_criterios, n_hilos=n_hilos)
+        for criterios, posiciones, esperado in zip(lista_criterios, lote, esperados):
+            _comprobar(np.array_equal(np.sort(posiciones), esperado),
+                       f"búsqueda del lote con {n_hilos} hilos distinta del filtro de pandas: {criterios}")
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        conteos = modelo.categorizar_lote(lista_criterios, solo_conteo=True)
+        resultados = modelo.categorizar_lote(lista_criterios, limite=10)
+    _comprobar(conteos == [len(esperado) for esperado in esperados], "conteos del lote")
+    for resultado, esperado in zip(resultados, esperados):
+        _comprobar(resultado.index.equals(modelo.df.index[esperado[:10]]), "resultados limitados del lote")
+
+
+def verificar_similitud_exacta():
+    """
+    buscar_similares retorna los vecinos exactos de la búsqueda por fuerza bruta
+    """
+    modelo = _modelo_verificacion()
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelo.entrenar_clustering(n_clusters=4)
+    
+    X = modelo.matriz_escalada('clustering').astype(np.float64)
+    clusters = modelo.df['cluster'].to_numpy()
+    for inmueble_id in range(0, len(X), 100):
+        distancias = np.sqrt(((X - X[inmueble_id]) ** 2).sum(axis=1))
+        distancias[inmueble_id] = np.inf
+        for mismo_cluster in (False, True):
+            candidatas = distancias if not mismo_cluster else \
+                np.where(clusters == clusters[inmueble_id], distancias, np.inf)
+            resultado = modelo.buscar_similares(inmueble_id, 10, mismo_cluster=mismo_cluster)
+            posiciones = modelo.df.index.get_indexer(resultado.index)
+            _comprobar(np.allclose(resultado['distancia'].to_numpy(), np.sort(candidatas)[:10])
+                       and np.allclose(candidatas[posiciones], resultado['distancia'].to_numpy()),
+                       f"vecinos de {inmueble_id} distintos de la fuerza bruta")
+
+
+# Verificaciones contra implementaciones directas (fuerza bruta)
+VERIFICACIONES = [
+    ('Índices tras reentrenar el clustering', verificar_indices_tras_reentrenar),
+    ('Análisis what-if', verificar_what_if),
+    ('Predicción con categorías no vistas y columnas ausentes', verificar_prediccion_datos_nuevos),
+    ('Similitud aproximada (IVF)', verificar_similitud_aproximada),
+    ('Deriva con datos de la misma distribución', verificar_deriva_misma_distribucion),
+    ('Bosque aplanado frente a predict_proba', verificar_bosque_aplanado),
+    ('Coalescedor con una solicitud inválida', verificar_coalescedor_errores),
+    ('Coalescedor ante resultados incompletos y cancelaciones', verificar_coalescedor_resiliente),
+    ('Skyline frente a fuerza bruta', verificar_skyline),
+    ('Estadísticas por trozos frente a preprocesar_datos', verificar_estadisticas_flujo),
+    ('Muestra estratificada y curva de aprendizaje', verificar_muestra_estratificada),
+    ('Curva de aprendizaje sin fugas del objetivo', verificar_curva_sin_fugas),
+    ('Búsqueda por hilos frente al filtro de pandas', verificar_busqueda_hilos),
+    ('Top-k frente a sort_values', verificar_top_k),
+    ('Facetas frente a value_counts', verificar_facetas),
+    ('Histogramas frente a np.histogram', verificar_histogramas),
+    ('Búsqueda por lotes frente al filtro de pandas', verificar_busqueda_lote),
+    ('Similitud exacta frente a fuerza bruta', verificar_similitud_exacta),
+]
+
+
+def verificaciones() -> bool:
+    """
+    Ejecuta las verificaciones de consistencia y retorna True si todas pasan
+    """
+    print("\n" + "="*70)
+    print("VERIFICACIONES DE CONSISTENCIA")
+    print("="*70)
+    
+    fallidas = 0
+    for nombre, verificacion in VERIFICACIONES:
+        try:
+            verificacion()
+            print(f"✓ {nombre}")
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ {nombre}: {e}")
+    
+    if fallidas:
+        print(f"\n❌ {fallidas} de {len(VERIFICACIONES)} verificaciones fallaron")
+    else:
+        print(f"\n✅ {len(VERIFICACIONES)} verificaciones correctas")
+    return fallidas == 0
+
+
 if __name__ == "__main__":
     exito = prueba_rapida()
+    exito = verificaciones() and exito
     exit(0 if exito else 1)